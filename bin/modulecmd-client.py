@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Thin client for the persistent modulecmd server (see pymod/server.py).
+
+Sends the command line, shell name, working directory, environment and the
+standard file descriptors of this process to the server and exits with the
+server's return code.  The server writes the shell code directly to this
+process's stdout.  If the server cannot be reached, modulecmd.py is executed
+directly.
+
+Only the standard library is imported so that start up is as fast as possible.
+"""
+import os
+import sys
+import json
+import array
+import socket
+import struct
+
+header = struct.Struct("!I")
+
+
+def socket_file():
+    # Keep in sync with pymod.paths.user_cache_path and
+    # pymod.names.server_socket_basename
+    dirname = os.getenv("PYMOD_USER_CACHE_PATH", os.path.expanduser("~/.pymod/cache"))
+    return os.path.join(dirname, "modulecmd.sock")
+
+
+def fallback(argv):
+    modulecmd = os.path.join(os.path.dirname(os.path.realpath(__file__)), "modulecmd.py")
+    os.execv(sys.executable, [sys.executable, "-E", modulecmd] + argv)
+
+
+def main(argv):
+    if not argv or not hasattr(socket.socket, "sendmsg"):
+        fallback(argv)
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_file())
+    except socket.error:
+        conn.close()
+        fallback(argv)
+
+    payload = {
+        "argv": argv[1:],
+        "shell": argv[0],
+        "env": dict(os.environ),
+        "cwd": os.getcwd(),
+    }
+    data = json.dumps(payload).encode("utf-8")
+    fds = array.array("i", [0, 1, 2])
+    conn.sendmsg(
+        [header.pack(len(data)) + data],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)],
+    )
+
+    data = b""
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    conn.close()
+    if len(data) < header.size:
+        return 1
+    (length,) = header.unpack(data[: header.size])
+    reply = json.loads(data[header.size : header.size + length].decode("utf-8"))
+    return reply.get("returncode", 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
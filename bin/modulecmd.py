@@ -35,6 +35,11 @@ if 'ruamel.yaml' in sys.modules:
 if 'ruamel' in sys.modules:
     del sys.modules['ruamel']
 
+# Time the imports of the command as early as possible
+if '--import-profile' in sys.argv:
+    import pymod.util.importprofile
+    pymod.util.importprofile.start()
+
 # Once we've set up the system path, run the pymod main method
 import pymod.main  # noqa
 sys.exit(pymod.main.main())
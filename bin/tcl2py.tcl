@@ -837,9 +837,10 @@ proc main { modfile } {
     popMode
 }
 
-global g_loadT g_help
+proc tcl2py { argList } {
+    global env g_loadT g_help g_fullName g_usrName g_shellName g_mode
 
-set options {
+    set options {
             {l.arg   ""     "loaded list"}
             {h              "print ModulesHelp command"}
             {f.arg   "???"  "module full name"}
@@ -848,24 +849,101 @@ set options {
             {L.arg   "???"  "LD_LIBRARY_PATH"}
             {P.arg   "???"  "LD_PRELOAD"}
             {u.arg   "???"  "module specified name"}
-}
+    }
 
-set usage ": tcl2py.tcl \[options] filename ...\noptions:"
-array set params [::cmdline::getoptions argv $options $usage]
+    set usage ": tcl2py.tcl \[options] filename ...\noptions:"
+    array set params [::cmdline::getoptions argList $options $usage]
+
+    set g_help $params(h)
+    array unset g_loadT
+    foreach m [split $params(l) ":"] {
+        set g_loadT($m) 1
+    }
 
-set g_help $params(h)
-foreach m [split $params(l) ":"] {
-    set g_loadT($m) 1
+    set g_fullName  $params(f)
+    set g_usrName   $params(u)
+    set g_shellName $params(s)
+    set g_mode      $params(m)
+    if {[lsearch $argList "-L"] >= 0} {
+        set env("LD_LIBRARY_PATH")  $params(L)
+    }
+    if {[lsearch $argList "-P"] >= 0} {
+        set env("LD_PRELOAD")  $params(P)
+    }
+    eval main $argList
 }
 
-set g_fullName  $params(f)
-set g_usrName   $params(u)
-set g_shellName $params(s)
-set g_mode      $params(m)
-if {[lsearch $argv "-L"] >= 0} {
-    set env("LD_LIBRARY_PATH")  $params(L)
+#------------------------------------------------------------------------
+# Server mode (tcl2py.tcl -server): translate modulefiles on request so that
+# one tclsh translates every modulefile of a modulecmd.py command.
+#
+# A request is a line "nargs nenv" followed by nargs arguments and nenv
+# environment variable names and values.  Each field is a line holding its
+# length in bytes followed by its utf-8 encoded bytes.  The reply is a line
+# "status length" followed by length bytes: the output of the translation if
+# status is 0, or the error message if status is 1.
+#------------------------------------------------------------------------
+proc readField {} {
+    if {[gets stdin length] < 0} {
+        error "unexpected end of request"
+    }
+    return [encoding convertfrom utf-8 [read stdin $length]]
+}
+
+proc serve {} {
+    global env g_output g_modeStack
+
+    fconfigure stdin -translation binary
+    fconfigure stdout -translation binary
+
+    # Capture the translation written to stdout
+    rename puts tcl2pyPuts
+    proc puts { args } {
+        global g_output
+        set newline "\n"
+        if {[lindex $args 0] eq "-nonewline"} {
+            set newline ""
+            set args [lrange $args 1 end]
+        }
+        if {[llength $args] == 1 || [lindex $args 0] eq "stdout"} {
+            append g_output [lindex $args end] $newline
+        } elseif {$newline eq ""} {
+            tcl2pyPuts -nonewline [lindex $args 0] [lindex $args 1]
+        } else {
+            tcl2pyPuts [lindex $args 0] [lindex $args 1]
+        }
+    }
+
+    while {[gets stdin header] >= 0} {
+        lassign $header nargs nenv
+        set argList {}
+        for {set i 0} {$i < $nargs} {incr i} {
+            lappend argList [readField]
+        }
+        foreach name [array names env] {
+            unset env($name)
+        }
+        for {set i 0} {$i < $nenv} {incr i} {
+            set name [readField]
+            set env($name) [readField]
+        }
+        set g_output ""
+        set g_modeStack {}
+        if {[catch {tcl2py $argList} errorMsg]} {
+            set status 1
+            set data [encoding convertto utf-8 $errorMsg]
+        } else {
+            set status 0
+            set data [encoding convertto utf-8 $g_output]
+        }
+        tcl2pyPuts -nonewline stdout "$status [string length $data]\n"
+        tcl2pyPuts -nonewline stdout $data
+        flush stdout
+    }
 }
-if {[lsearch $argv "-P"] >= 0} {
-    set env("LD_PRELOAD")  $params(P)
+
+if {[lindex $argv 0] eq "-server"} {
+    serve
+} else {
+    tcl2py $argv
 }
-eval main $argv
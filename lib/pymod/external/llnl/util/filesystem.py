@@ -22,7 +22,6 @@ from contextlib import contextmanager
 import six
 from llnl.util import tty
 from llnl.util.lang import dedupe
-from spack.util.executable import Executable
 
 __all__ = [
     'FileFilter',
@@ -407,6 +406,8 @@ def get_filetype(path_name):
     """
     Return the output of file path_name as a string to identify file type.
     """
+    from spack.util.executable import Executable
+
     file = Executable('file')
     file.add_default_env('LC_ALL', 'C')
     output = file('-b', '-h', '%s' % path_name,
@@ -756,6 +757,8 @@ def fix_darwin_install_name(path):
     Parameters:
         path (str): directory in which .dylib files are located
     """
+    from spack.util.executable import Executable
+
     libs = glob.glob(join_path(path, "*.dylib"))
     for lib in libs:
         # fix install name first:
@@ -24,7 +24,6 @@ import os
 import re
 import functools
 import collections
-import inspect
 from datetime import datetime, timedelta
 from six import string_types
 import sys
@@ -110,6 +109,8 @@ def caller_locals():
        scope.  Yes, this is some black magic, and yes it's useful
        for implementing things like depends_on and provides.
     """
+    import inspect
+
     # Passing zero here skips line context for speed.
     stack = inspect.stack(0)
     try:
@@ -122,6 +123,8 @@ def get_calling_module_name():
     """Make sure that the caller is a class definition, and return the
        enclosing module's name.
     """
+    import inspect
+
     # Passing zero here skips line context for speed.
     stack = inspect.stack(0)
     try:
@@ -155,7 +158,13 @@ def attr_setdefault(obj, name, value):
 
 
 def has_method(cls, name):
-    for base in inspect.getmro(cls):
+    # Runs when classes using key_ordering are defined: avoid importing inspect
+    mro = getattr(cls, "__mro__", None)
+    if mro is None:  # old-style class on Python 2
+        import inspect
+
+        mro = inspect.getmro(cls)
+    for base in mro:
         if base is object:
             continue
         if name in base.__dict__:
@@ -306,6 +315,8 @@ class HashableMap(collections.MutableMapping):
 def in_function(function_name):
     """True if the caller was called from some function with
        the supplied Name, False otherwise."""
+    import inspect
+
     stack = inspect.stack()
     try:
         for elt in stack[2:]:
@@ -1,5 +1,4 @@
 import os
-import ruamel.yaml as yaml
 from six import StringIO
 
 import pymod.names
@@ -42,6 +41,8 @@ class Aliases(object):
 
     def read(self, filename):
         if os.path.isfile(filename):  # pragma: no cover
+            import ruamel.yaml as yaml
+
             data = yaml.load(open(filename))
             aliases = data.pop("aliases", dict())
             if data:
@@ -52,6 +53,8 @@ class Aliases(object):
         return dict()
 
     def write(self, aliases, filename):
+        import ruamel.yaml as yaml
+
         with open(filename, "w") as fh:
             yaml.dump({"aliases": aliases}, fh, default_flow_style=False)
 
@@ -0,0 +1,328 @@
+"""Benchmarks of module operations on synthetic MODULEPATH trees.
+
+`Tree` writes a MODULEPATH tree of generated modulefiles and `run` times the
+operations of Modulecmd.py on it: discovering the modules on MODULEPATH,
+looking them up, assigning defaults, loading, swapping a compiler that other
+modules depend on, restoring a collection, and formatting the shell output.
+The operations are run in an isolated state, so that the benchmarks neither
+read nor modify the user's environment, caches, or collections.
+"""
+import os
+import sys
+import time
+import shutil
+import platform
+from ordereddict_backport import OrderedDict
+from contextlib import contextmanager
+
+import pymod
+import pymod.mc
+import pymod.cache
+import pymod.names
+import pymod.paths
+import pymod.environ
+import pymod.modulepath
+from llnl.util.lang import Singleton
+
+
+#: Phases timed by `run`, in order
+phases = (
+    "discover",
+    "discover_cached",
+    "get",
+    "assign_defaults",
+    "load_impl",
+    "format_output",
+    "swap_impl",
+    "restore_impl",
+)
+
+#: Versions of the modules in the flat directories of the tree
+versions = ("1.0", "2.0")
+
+#: Compilers in the compiler family of the tree
+compilers = ("gcc", "intel")
+
+
+class Tree(object):
+    """A synthetic MODULEPATH tree rooted at `root`.
+
+    The tree has
+
+    - `dirs` directories ``d<i>``, each with `modules` modules ``m<i>_<j>`` in
+      the versions ``versions``.  Every `tcl`-th module is a TCL module (none,
+      if `tcl` is 0);
+    - a hierarchy of `depth` directories ``chain<k>``.  The module ``c<k>`` in
+      ``chain<k>`` uses ``chain<k+1>``; and
+    - the directory ``compilers`` with a module for each of ``compilers``, in
+      the family ``compiler``.  Each compiler uses a directory of `libs`
+      modules ``lib<l>`` built with that compiler.
+
+    """
+
+    def __init__(self, root, dirs=10, modules=20, tcl=4, depth=5, libs=10):
+        self.root = root
+        self.dirs = dirs
+        self.modules = modules
+        self.tcl = tcl
+        self.depth = depth
+        self.libs = libs
+
+    @property
+    def parameters(self):
+        return {
+            "dirs": self.dirs,
+            "modules": self.modules,
+            "tcl": self.tcl,
+            "depth": self.depth,
+            "libs": self.libs,
+        }
+
+    def join(self, *paths):
+        return os.path.join(self.root, *paths)
+
+    def modulepath(self):
+        """The directories on MODULEPATH, before any module is loaded"""
+        dirnames = [self.join("d{0}".format(i)) for i in range(self.dirs)]
+        dirnames.append(self.join("chain0"))
+        dirnames.append(self.join("compilers"))
+        return dirnames
+
+    def names(self):
+        """Names and full names of the modules on `modulepath`"""
+        names = ["c0", "c0/1.0"] + list(compilers)
+        for i in range(self.dirs):
+            for j in range(self.modules):
+                name = "m{0}_{1}".format(i, j)
+                names.append(name)
+                names.extend(["{0}/{1}".format(name, v) for v in versions])
+        return names
+
+    def load_names(self):
+        """Modules loaded by the load benchmark: the first directory's modules
+        and the hierarchy of ``c<k>`` modules"""
+        names = ["m0_{0}".format(j) for j in range(self.modules)]
+        names.extend(["c{0}".format(k) for k in range(self.depth)])
+        return names
+
+    def lib_names(self):
+        return ["lib{0}".format(k) for k in range(self.libs)]
+
+    def write(self):
+        for i in range(self.dirs):
+            for j in range(self.modules):
+                name = "m{0}_{1}".format(i, j)
+                tcl = self.tcl and (i * self.modules + j) % self.tcl == 0
+                dirname = self.join("d{0}".format(i), name)
+                for version in versions:
+                    prefix = os.path.join("/opt", name, version)
+                    if tcl:
+                        text, basename = tcl_module(name, prefix), version
+                    else:
+                        text, basename = py_module(name, prefix), version + ".py"
+                    self.write_module(dirname, basename, text)
+        for k in range(self.depth):
+            name = "c{0}".format(k)
+            text = py_module(name, os.path.join("/opt", name))
+            if k + 1 < self.depth:
+                text += 'use("{0}")\n'.format(self.join("chain{0}".format(k + 1)))
+            self.write_module(self.join("chain{0}".format(k), name), "1.0.py", text)
+        for compiler in compilers:
+            libdir = self.join(compiler)
+            text = 'family("compiler")\n' + 'use("{0}")\n'.format(libdir)
+            text += py_module(compiler, os.path.join("/opt", compiler))
+            self.write_module(self.join("compilers", compiler), "1.0.py", text)
+            for lib in self.lib_names():
+                text = py_module(lib, os.path.join("/opt", compiler, lib))
+                self.write_module(os.path.join(libdir, lib), "1.0.py", text)
+
+    @staticmethod
+    def write_module(dirname, basename, text):
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(os.path.join(dirname, basename), "w") as fh:
+            fh.write(text)
+
+    def remove(self):
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+
+def py_module(name, prefix):
+    var = name.upper()
+    return (
+        'setenv("{0}_ROOT", "{1}")\n'
+        'prepend_path("PATH", "{1}/bin")\n'
+        'prepend_path("LD_LIBRARY_PATH", "{1}/lib")\n'
+        'set_alias("{2}-info", "echo {2}")\n'.format(var, prefix, name)
+    )
+
+
+def tcl_module(name, prefix):
+    var = name.upper()
+    return (
+        "#%Module1.0\n"
+        "setenv {0}_ROOT {1}\n"
+        "prepend-path PATH {1}/bin\n"
+        "prepend-path LD_LIBRARY_PATH {1}/lib\n"
+        'set-alias {2}-info "echo {2}"\n'.format(var, prefix, name)
+    )
+
+
+@contextmanager
+def isolated(cache_dir):
+    """Run the benchmarks without the user's environment and caches"""
+    mc = pymod.mc._mc
+    saved_os_environ = dict(os.environ)
+    saved = (
+        pymod.environ.environ,
+        pymod.modulepath._path,
+        pymod.cache.cache,
+        pymod.paths.user_cache_path,
+        mc._loaded_modules,
+        mc._loaded_modules_by_filename,
+    )
+    prefixes = (
+        pymod.names.modulepath,
+        pymod.names.loaded_modules,
+        pymod.names.loaded_module_files,
+        pymod.names.initial_env,
+        pymod.names.loaded_module_cellar,
+        pymod.names.loaded_module_meta(""),
+        pymod.names.family_name(""),
+    )
+    for key in list(os.environ.keys()):
+        if key.startswith(prefixes) or "pymod" in key.lower():
+            os.environ.pop(key, None)
+    pymod.paths.user_cache_path = cache_dir
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_os_environ)
+        pymod.environ.set_env(saved[0])
+        pymod.modulepath.set_path(saved[1])
+        pymod.cache.cache = saved[2]
+        pymod.paths.user_cache_path = saved[3]
+        mc._loaded_modules, mc._loaded_modules_by_filename = saved[4:]
+        reset_swapped()
+
+
+def reset_swapped():
+    mc = pymod.mc._mc
+    mc._swapped_explicitly = []
+    mc._swapped_on_version_change = []
+    mc._swapped_on_family_update = []
+    mc._swapped_on_mp_change = []
+    mc._unloaded_on_mp_change = []
+
+
+def reset_state(modulepath):
+    """Start from an empty environment with `modulepath` and no modules
+    loaded"""
+    pymod.environ.set_env(pymod.environ.Environ())
+    pymod.modulepath.set_path(modulepath)
+    pymod.mc._mc._loaded_modules = None
+    pymod.mc._mc._loaded_modules_by_filename = None
+    reset_swapped()
+
+
+def reset_cache():
+    filename = pymod.paths.join_user(pymod.names.cache_file_basename, cache=True)
+    if os.path.exists(filename):
+        os.remove(filename)
+    pymod.cache.cache = Singleton(pymod.cache.factory)
+
+
+def load(names):
+    for name in names:
+        pymod.mc.load_impl(pymod.modulepath.get(name))
+
+
+class Timer(object):
+    def __init__(self):
+        self.times = dict((phase, []) for phase in phases)
+
+    @contextmanager
+    def __call__(self, phase):
+        start = time.time()
+        yield
+        self.times[phase].append(time.time() - start)
+
+
+def run(tree, repeat=3):
+    """Time the operations in `phases` on `tree`, `repeat` times each"""
+    timer = Timer()
+    dirnames = tree.modulepath()
+    names = tree.names()
+    lib_names = tree.lib_names()
+    cache_dir = os.path.join(tree.root, ".cache")
+    with isolated(cache_dir):
+        for _ in range(repeat):
+            reset_cache()
+            with timer("discover"):
+                modulepath = pymod.modulepath.Modulepath(dirnames)
+            with timer("discover_cached"):
+                modulepath = pymod.modulepath.Modulepath(dirnames)
+            reset_state(modulepath)
+
+            with timer("get"):
+                for name in names:
+                    modulepath.get(name)
+            with timer("assign_defaults"):
+                modulepath.assign_defaults()
+
+            with timer("load_impl"):
+                load(tree.load_names())
+            with timer("format_output"):
+                pymod.environ.format_output()
+
+            # Swap the compiler that the libraries were built with
+            reset_state(pymod.modulepath.Modulepath(dirnames))
+            load([compilers[0]] + lib_names)
+            old = pymod.modulepath.get(compilers[0])
+            new = pymod.modulepath.get(compilers[1])
+            with timer("swap_impl"):
+                pymod.mc.swap_impl(old, new)
+
+            # Restore the loaded modules as a collection
+            collection = OrderedDict()
+            for module in pymod.mc.get_loaded_modules():
+                ar = pymod.mc.archive_module(module)
+                ar["refcount"] = 0
+                collection.setdefault(module.modulepath, []).append(ar)
+            collection = list(collection.items())
+            reset_state(pymod.modulepath.Modulepath(dirnames))
+            with timer("restore_impl"):
+                pymod.mc.collection.restore_impl("bench", collection)
+
+    return {
+        "version": pymod.pymod_version,
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "time": time.time(),
+        "repeat": repeat,
+        "parameters": tree.parameters,
+        "phases": dict((phase, summarize(timer.times[phase])) for phase in phases),
+    }
+
+
+def summarize(times):
+    return {
+        "min": min(times),
+        "max": max(times),
+        "mean": sum(times) / len(times),
+        "times": times,
+    }
+
+
+def format_results(results):
+    lines = ["{0:<16} {1:>12} {2:>12} {3:>12}".format("phase", "min", "mean", "max")]
+    for phase in phases:
+        t = results["phases"][phase]
+        lines.append(
+            "{0:<16} {1:>10.2f}ms {2:>10.2f}ms {3:>10.2f}ms".format(
+                phase, t["min"] * 1e3, t["mean"] * 1e3, t["max"] * 1e3
+            )
+        )
+    return "\n".join(lines) + "\n"
@@ -1,15 +1,61 @@
+"""Cache of modules found on the MODULEPATH.
+
+The cache is stored in a compact binary file that is read through ``mmap`` so
+that a lookup only touches the parts of the file it needs.  The file is laid
+out as::
+
+    header      magic, cache_version_info, and the offset and count of each
+                of the tables below
+    strings     string table: (n + 1) uint32 offsets followed by the utf-8
+                encoded strings
+    paths       fixed-size path records (key, first dir, number of dirs),
+                sorted by key so that a path is found with a binary search
+    dirs        fixed-size directory records (name, mtime, explicit default,
+                first module, number of modules, first subdir, number of
+                subdirs)
+    subdirs     uint32 string ids of the subdirectories of each directory
+    modules     fixed-size module records (type, file, modulepath, mtime)
+
+All strings (file names, directories, etc.) are stored once in the string
+table and referenced by index.  Cached items that do not fit the ``MODULEPATH``
+schema are stored as a JSON document in the string table.
+"""
 import os
 import json
+import mmap
 import atexit
+import struct
 
 import pymod.names
 import pymod.modulepath
+import pymod.timer
 
 import llnl.util.tty as tty
 from llnl.util.lang import Singleton
 
 
-cache_version_info = (0, 1, 0)
+cache_version_info = (0, 3, 0)
+
+magic = b"PYMODC\0\0"
+
+#: magic, version (major, minor, micro), and offset, count of each table
+header = struct.Struct("<8sHHHxx11I")
+string_offset = struct.Struct("<I")
+path_record = struct.Struct("<III")
+dir_record = struct.Struct("<IdIIIII")
+subdir_record = struct.Struct("<I")
+module_record = struct.Struct("<BIId")
+
+#: Index used for a missing string
+null = 0xFFFFFFFF
+
+module_types = ("PyModule", "TclModule")
+
+#: The JSON cache written by earlier versions, removed when the cache is written
+legacy_basename = "cache.json"
+
+#: Errors raised reading a damaged cache
+read_errors = (struct.error, IndexError, ValueError, UnicodeDecodeError)
 
 
 def modifies_cache(fun):
@@ -28,19 +74,46 @@ class Cache:
     def __init__(self, filename):
         self._modified = False
         self.filename = filename
+        self._reader = None
         self._data = None
+        self._popped = None
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            with pymod.timer.span("cache.read"):
+                self._reader = CacheReader.open(self.filename)
+            if self._reader is None and os.path.isfile(self.filename):
+                # Old version, or unreadable, forget it
+                self._modified = True
+        return self._reader
+
+    def damaged(self, e):
+        """The cache file cannot be read, forget it"""
+        tty.debug("Ignoring damaged cache {0}: {1}".format(self.filename, e))
+        self._reader.close()
+        self._reader = CacheReader.empty()
+        self._modified = True
 
     @property
     def data(self):
+        """All cached items, including those not yet written"""
         if self._data is None:
-            self._data = self.load()
-            version = tuple(self._data.get("version", []))
-            if self._data and version != cache_version_info:  # pragma: no cover
-                # Old version, forget it
-                self._data = {}
-                self._modified = True
-            self._data["version"] = cache_version_info
-        return self._data
+            self._data = {}
+            self._popped = {}
+        data = {}
+        if self.reader is not None:
+            try:
+                for (section, key) in self.reader.keys():
+                    if key not in self._popped.get(section, ()):
+                        item = self.reader.get(section, key)
+                        data.setdefault(section, {})[key] = item
+            except read_errors as e:
+                self.damaged(e)
+                data = {}
+        for (section, items) in self._data.items():
+            data.setdefault(section, {}).update(items)
+        return data
 
     @property
     def modified(self):
@@ -51,44 +124,86 @@ class Cache:
         self._modified = bool(arg)
 
     def load(self):
-        data = dict()
-        if os.path.isfile(self.filename):
-            try:
-                data.update(dict(json.load(open(self.filename))))
-            except json.decoder.JSONDecodeError:  # pragma: no cover
-                self.remove()
-        return data
+        return self.data
 
+    @pymod.timer.timed("cache.write")
     def write(self):
-        with open(self.filename, "w") as fh:
-            json.dump(self.data, fh, indent=2)
+        encoded = encode(self.data)
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):  # pragma: no cover
+            os.makedirs(dirname)
+        # Other processes may have the cache mapped, so the file is replaced
+        # instead of being overwritten
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".cache")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(encoded)
+            os.rename(tmp, self.filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        legacy = os.path.join(dirname, legacy_basename)
+        if os.path.isfile(legacy):
+            os.remove(legacy)
+
+    def reset(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = None
+        self._data = {}
+        self._popped = {}
 
     @modifies_cache
     def remove(self):
         tty.info("Removing the MODULEPATH cache")
         if os.path.isfile(self.filename):
             os.remove(self.filename)
-        self._data = dict()
+        self.reset()
+        self._reader = CacheReader.empty()
 
     def get(self, section, key, default=None):
-        return self.data.setdefault(section, {}).get(key, default)
+        if self._data is None:
+            self._data = {}
+            self._popped = {}
+        items = self._data.get(section, {})
+        if key in items:
+            return items[key]
+        if key in self._popped.get(section, ()):
+            return default
+        if self.reader is None:
+            return default
+        try:
+            item = self.reader.get(section, key)
+        except read_errors as e:
+            self.damaged(e)
+            return default
+        if item is None:
+            return default
+        self._data.setdefault(section, {})[key] = item
+        return item
 
     @modifies_cache
     def pop(self, section, key, default=None):
-        section_data = self.data.setdefault(section, {})
-        items = section_data.pop(key, default)
-        return items
+        item = self.get(section, key, default)
+        self._data.setdefault(section, {}).pop(key, None)
+        self._popped.setdefault(section, {})[key] = True
+        return item
 
     @modifies_cache
     def set(self, section, key, item):
-        section_data = self.data.setdefault(section, {})
-        section_data[key] = item
+        if self._data is None:
+            self._data = {}
+            self._popped = {}
+        self._data.setdefault(section, {})[key] = item
+        self._popped.get(section, {}).pop(key, None)
 
     def build(self):
         """Build the cache"""
         tty.info("Building the MODULEPATH cache")
-        self._data = {}
-        self._data["version"] = cache_version_info
+        self.reset()
+        self._reader = CacheReader.empty()
 
         # Build the modulepath cache
         for path in pymod.modulepath.walk():
@@ -96,6 +211,247 @@ class Cache:
         self.write()
 
 
+class CacheReader(object):
+    """Read the binary cache through mmap"""
+
+    def __init__(self, buf, counts):
+        self.buf = buf
+        (
+            self.strings_offset,
+            self.num_strings,
+            self.paths_offset,
+            self.num_paths,
+            self.dirs_offset,
+            self.num_dirs,
+            self.subdirs_offset,
+            self.num_subdirs,
+            self.modules_offset,
+            self.num_modules,
+            self.extra,
+        ) = counts
+        self.blob_offset = self.strings_offset + string_offset.size * (
+            self.num_strings + 1
+        )
+        self._extra = None
+
+    @classmethod
+    def empty(cls):
+        return cls(b"", [0] * 10 + [null])
+
+    @classmethod
+    def open(cls, filename):
+        if not os.path.isfile(filename):
+            return None
+        with open(filename, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < header.size:
+                return None
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = header.unpack_from(buf, 0)
+        if fields[0] != magic or tuple(fields[1:4]) != cache_version_info:
+            buf.close()
+            return None
+        reader = cls(buf, fields[4:])
+        if not reader.is_complete(size):
+            # Truncated, by an interrupted copy or a full disk
+            buf.close()
+            return None
+        return reader
+
+    def is_complete(self, size):
+        """Do the tables fit in the `size` bytes of the file?"""
+        tables = (
+            (self.strings_offset, self.num_strings + 1, string_offset.size),
+            (self.paths_offset, self.num_paths, path_record.size),
+            (self.dirs_offset, self.num_dirs, dir_record.size),
+            (self.subdirs_offset, self.num_subdirs, subdir_record.size),
+            (self.modules_offset, self.num_modules, module_record.size),
+        )
+        for (offset, count, record_size) in tables:
+            if offset + count * record_size > size:
+                return False
+        if self.extra != null and self.extra >= self.num_strings:
+            return False
+        offset = self.strings_offset + string_offset.size * self.num_strings
+        blob_size = string_offset.unpack_from(self.buf, offset)[0]
+        return self.blob_offset + blob_size <= size
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+
+    def string(self, i):
+        if i == null:
+            return None
+        offset = self.strings_offset + string_offset.size * i
+        start, end = struct.unpack_from("<II", self.buf, offset)
+        raw = self.buf[self.blob_offset + start : self.blob_offset + end]
+        return raw.decode("utf-8")
+
+    def path(self, i):
+        offset = self.paths_offset + path_record.size * i
+        return path_record.unpack_from(self.buf, offset)
+
+    def find_path(self, key):
+        lo, hi = 0, self.num_paths
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self.string(self.path(mid)[0])
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def extra_items(self):
+        if self._extra is None:
+            extra = self.string(self.extra)
+            self._extra = {} if extra is None else json.loads(extra)
+        return self._extra
+
+    def keys(self):
+        keys = []
+        for i in range(self.num_paths):
+            keys.append((pymod.names.modulepath, self.string(self.path(i)[0])))
+        for (section, items) in self.extra_items().items():
+            keys.extend([(section, key) for key in items])
+        return keys
+
+    def get(self, section, key):
+        extra = self.extra_items().get(section, {})
+        if key in extra:
+            return extra[key]
+        if section != pymod.names.modulepath:
+            return None
+        i = self.find_path(key)
+        if i is None:
+            return None
+        _, first_dir, num_dirs = self.path(i)
+        directories = {}
+        for j in range(first_dir, first_dir + num_dirs):
+            offset = self.dirs_offset + dir_record.size * j
+            (
+                name,
+                mtime,
+                default,
+                first_module,
+                num_modules,
+                first_subdir,
+                num_subdirs,
+            ) = dir_record.unpack_from(self.buf, offset)
+            modules = []
+            for k in range(first_module, first_module + num_modules):
+                offset = self.modules_offset + module_record.size * k
+                type, file, modulepath, file_mtime = module_record.unpack_from(
+                    self.buf, offset
+                )
+                modules.append(
+                    {
+                        "type": module_types[type],
+                        "file": self.string(file),
+                        "modulepath": self.string(modulepath),
+                        "mtime": file_mtime,
+                    }
+                )
+            dirs = []
+            for k in range(first_subdir, first_subdir + num_subdirs):
+                offset = self.subdirs_offset + subdir_record.size * k
+                dirs.append(self.string(subdir_record.unpack_from(self.buf, offset)[0]))
+            directories[self.string(name)] = {
+                "mtime": mtime,
+                "default": self.string(default),
+                "modules": modules,
+                "dirs": dirs,
+            }
+        return directories
+
+
+def fits_schema(directories):
+    """Does the item match the schema of cached MODULEPATH directories?"""
+    try:
+        for (name, entry) in directories.items():
+            float(entry["mtime"])
+            list(entry["dirs"])
+            for module in entry["modules"]:
+                if module["type"] not in module_types:
+                    return False
+                float(module["mtime"])
+                module["file"], module["modulepath"]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def encode(data):
+    """Encode the cached `data` in the binary format"""
+    strings, string_ids = [], {}
+
+    def string_id(s):
+        if s is None:
+            return null
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s.encode("utf-8"))
+        return string_ids[s]
+
+    paths, dirs, subdirs, modules = [], [], [], []
+    extra = {}
+    for (section, items) in data.items():
+        for (key, item) in items.items():
+            if section != pymod.names.modulepath or not fits_schema(item):
+                extra.setdefault(section, {})[key] = item
+                continue
+            paths.append((key, len(dirs), len(item)))
+            for (name, entry) in sorted(item.items()):
+                dirs.append(
+                    (
+                        string_id(name),
+                        entry["mtime"],
+                        string_id(entry["default"]),
+                        len(modules),
+                        len(entry["modules"]),
+                        len(subdirs),
+                        len(entry["dirs"]),
+                    )
+                )
+                subdirs.extend([string_id(d) for d in entry["dirs"]])
+                for m in entry["modules"]:
+                    modules.append(
+                        (
+                            module_types.index(m["type"]),
+                            string_id(m["file"]),
+                            string_id(m["modulepath"]),
+                            m["mtime"],
+                        )
+                    )
+    paths = [(string_id(key), first, n) for (key, first, n) in sorted(paths)]
+    extra_id = string_id(json.dumps(extra)) if extra else null
+
+    offsets, n = [], 0
+    for s in strings:
+        offsets.append(n)
+        n += len(s)
+    offsets.append(n)
+
+    tables = [
+        (b"".join([string_offset.pack(o) for o in offsets]) + b"".join(strings)),
+        b"".join([path_record.pack(*p) for p in paths]),
+        b"".join([dir_record.pack(*d) for d in dirs]),
+        b"".join([subdir_record.pack(s) for s in subdirs]),
+        b"".join([module_record.pack(*m) for m in modules]),
+    ]
+    counts = [len(strings), len(paths), len(dirs), len(subdirs), len(modules)]
+    fields, offset = [], header.size
+    for (table, count) in zip(tables, counts):
+        fields.extend([offset, count])
+        offset += len(table)
+    fields.append(extra_id)
+    head = header.pack(magic, *(list(cache_version_info) + fields))
+    return head + b"".join(tables)
+
+
 def factory():
     basename = pymod.names.cache_file_basename
     filename = pymod.paths.join_user(basename, cache=True)
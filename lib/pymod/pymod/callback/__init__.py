@@ -39,6 +39,7 @@ from __future__ import print_function
 import os
 import re
 import sys
+from contextlib import contextmanager
 from six import StringIO
 
 import pymod.modes
@@ -57,6 +58,10 @@ CATEGORY = "category"
 #: global, cached list of all callbacks -- access through all_callbacks()
 _all_callbacks = None
 
+#: (module, recording) of the modules being executed, innermost last -- access
+#: through executing()
+_executing = []
+
 
 def log_callback(func_name, *args, **kwargs):
     signature = StringIO()
@@ -127,7 +132,32 @@ def callback(func_name, module, mode, when=None, **kwds):
     return callback_impl(func, module, mode, when=when, **kwds)
 
 
+def bound_callback(func_name, mode, when=None, **kwds):
+    """Create a callback function like `callback`, but for any module
+
+    The module sent to `func` is the innermost module being executed (see
+    `executing`), so that the wrapped function can be made once and shared by
+    all modules executed in `mode`.
+
+    """
+    func = get_callback(func_name)
+    return callback_impl(func, None, mode, when=when, **kwds)
+
+
+@contextmanager
+def executing(module, recording=None):
+    """Make `module` the module sent to callbacks made by `bound_callback`.  If
+    `recording` is given, the calls to those callbacks are recorded in it (see
+    `pymod.mc.replay`)"""
+    _executing.append((module, recording))
+    try:
+        yield
+    finally:
+        _executing.pop()
+
+
 def callback_impl(func, module, mode, when=None, **kwds):
+    name = func.__name__
     if when is None:
         when = (
             mode != pymod.modes.load_partial and mode not in pymod.modes.informational
@@ -140,8 +170,20 @@ def callback_impl(func, module, mode, when=None, **kwds):
             log_callback(func.__name__, *args, **kwargs)
             if not getattr(func, "eval_on_show", False):
                 return
-        kwargs.update(kwds)
-        return func(module, mode, *args, **kwargs)
+        if module is None:
+            the_module, recording = _executing[-1]
+        else:
+            the_module, recording = module, None
+        if recording is None:
+            kwargs.update(kwds)
+            return func(the_module, mode, *args, **kwargs)
+        try:
+            result = func(the_module, mode, *args, **dict(kwargs, **kwds))
+        except BaseException:
+            recording.invalidate()
+            raise
+        recording.record(name, args, kwargs, result)
+        return result
 
     return wrapper
 
@@ -0,0 +1,89 @@
+import sys
+import json
+import tempfile
+
+import pymod.bench
+import llnl.util.tty as tty
+
+description = "Time module operations on a synthetic MODULEPATH tree"
+level = "long"
+section = "developer"
+
+
+def setup_parser(subparser):
+    subparser.add_argument(
+        "--dirs",
+        type=int,
+        default=10,
+        help="Number of MODULEPATH directories [default: %(default)s]",
+    )
+    subparser.add_argument(
+        "--modules",
+        type=int,
+        default=20,
+        help="Number of modules per directory [default: %(default)s]",
+    )
+    subparser.add_argument(
+        "--tcl",
+        type=int,
+        default=4,
+        help="Make every TCL-th module a TCL module, 0 for none "
+        "[default: %(default)s]",
+    )
+    subparser.add_argument(
+        "--depth",
+        type=int,
+        default=5,
+        help="Depth of the hierarchy of modules using other MODULEPATH "
+        "directories [default: %(default)s]",
+    )
+    subparser.add_argument(
+        "--libs",
+        type=int,
+        default=10,
+        help="Number of modules depending on the swapped compiler "
+        "[default: %(default)s]",
+    )
+    subparser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to time each operation [default: %(default)s]",
+    )
+    subparser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="Write the results, in JSON, to this file",
+    )
+    subparser.add_argument(
+        "--keep",
+        action="store_true",
+        default=False,
+        help="Do not remove the generated MODULEPATH tree",
+    )
+
+
+def bench(parser, args):
+    root = tempfile.mkdtemp(prefix="pymod-bench-")
+    tree = pymod.bench.Tree(
+        root,
+        dirs=args.dirs,
+        modules=args.modules,
+        tcl=args.tcl,
+        depth=args.depth,
+        libs=args.libs,
+    )
+    try:
+        tree.write()
+        results = pymod.bench.run(tree, repeat=args.repeat)
+    finally:
+        if args.keep:
+            tty.info("MODULEPATH tree written to {0}".format(root))
+        else:
+            tree.remove()
+    sys.stderr.write(pymod.bench.format_results(results))
+    if args.output is not None:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
@@ -0,0 +1,56 @@
+import sys
+import pymod.server
+
+description = "Manage the persistent modulecmd server"
+level = "long"
+section = "developer"
+
+
+_subcommands = {}
+
+
+def add_start_command(parser):
+    def start(args):
+        pymod.server.start(foreground=args.foreground)
+
+    p = parser.add_parser("start", help="Start the modulecmd server")
+    p.add_argument(
+        "-f",
+        "--foreground",
+        action="store_true",
+        default=False,
+        help="Do not detach from the terminal",
+    )
+    _subcommands["start"] = start
+
+
+def add_stop_command(parser):
+    def stop(args):
+        pymod.server.stop()
+
+    parser.add_parser("stop", help="Stop the modulecmd server")
+    _subcommands["stop"] = stop
+
+
+def add_status_command(parser):
+    def status(args):
+        if pymod.server.is_running():
+            sys.stderr.write("running ({0})\n".format(pymod.server.socket_file()))
+        else:
+            sys.stderr.write("not running\n")
+
+    parser.add_parser("status", help="Show whether the modulecmd server is running")
+    _subcommands["status"] = status
+
+
+def setup_parser(subparser):
+    """Parser is only constructed so that this prints a nice help
+       message with -h. """
+    sp = subparser.add_subparsers(metavar="SUBCOMMAND", dest="subcommand")
+    add_start_command(sp)
+    add_stop_command(sp)
+    add_status_command(sp)
+
+
+def server(parser, args):
+    _subcommands[args.subcommand](args)
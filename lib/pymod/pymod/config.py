@@ -1,18 +1,35 @@
 import os
-import ruamel.yaml as yaml
+import sys
+import marshal
+from six import string_types, text_type
+
 import pymod.paths
 import pymod.names
+import pymod.timer
 from pymod.util.lang import split
+from pymod.util.filesystem import write_atomic
 from llnl.util.lang import Singleton
-from spack.util.executable import which
+import llnl.util.tty as tty
 
 
 def load_config(filename):
+    import ruamel.yaml as yaml
+
     dict = yaml.load(open(filename))
     return dict.get("config")
 
 
-has_tclsh = which("tclsh") is not None
+_has_tclsh = None
+
+
+def has_tclsh():
+    """Is tclsh on PATH?  Looked up on first use, not at import"""
+    global _has_tclsh
+    if _has_tclsh is None:
+        from spack.util.executable import which
+
+        _has_tclsh = which("tclsh") is not None
+    return _has_tclsh
 
 
 class Configuration(object):
@@ -80,6 +97,94 @@ class Configuration(object):
                 self.scopes.setdefault(scope_name, {}).update({key: value})
 
 
+def config_files():
+    """The default, admin, and user configuration files"""
+    basename = pymod.names.config_file_basename
+    return [
+        os.path.join(pymod.paths.etc_path, "defaults", basename),
+        os.path.join(pymod.paths.etc_path, basename),
+        os.path.join(pymod.paths.user_config_path, basename),
+    ]
+
+
+def read_config_files(filenames):
+    """Read and verify the scopes defined by the configuration files"""
+    cfg = Configuration()
+    cfg.push_scope("defaults", load_config(filenames[0]))
+    for filename in filenames[1:]:
+        if os.path.isfile(filename):
+            cfg.push_scope("user", load_config(filename))
+    return cfg.scopes
+
+
+@pymod.timer.timed("config")
+def load_scopes():
+    """Scopes defined by the configuration files.
+
+    Reading the YAML configuration files (and importing ruamel.yaml to do so)
+    is expensive compared to the commands that need the configuration.  The
+    verified scopes are instead saved to a snapshot in the user cache
+    directory and read from there until the size or modification time of
+    any of the configuration files changes.
+
+    """
+    filenames = config_files()
+    sources = []
+    for filename in filenames:
+        try:
+            st = os.stat(filename)
+            sources.append((filename, st.st_size, st.st_mtime))
+        except OSError:
+            sources.append((filename, None, None))
+    # The cache directory is only created (by write_atomic) to write the
+    # snapshot
+    snapshot = os.path.join(pymod.paths.user_cache_path, snapshot_basename)
+    scopes = read_snapshot(snapshot, sources)
+    if scopes is None:
+        scopes = read_config_files(filenames)
+        try:
+            data = marshal.dumps({"sources": sources, "scopes": plain(scopes)})
+        except ValueError as e:  # pragma: no cover
+            tty.debug("Cannot snapshot the configuration: {0}".format(e))
+        else:
+            write_atomic(snapshot, data)
+    return scopes
+
+
+#: The format of marshal depends on the version of Python
+snapshot_basename = "{0}.python-{1}{2}".format(
+    pymod.names.config_snapshot_basename, *sys.version_info[:2]
+)
+
+
+def read_snapshot(filename, sources):
+    try:
+        with open(filename, "rb") as fh:
+            data = marshal.load(fh)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get("sources") != sources:
+        return None
+    return data.get("scopes")
+
+
+def plain(obj):
+    """Convert the containers and scalars returned by ruamel.yaml to the
+    builtin types they derive from, which marshal can write"""
+    if isinstance(obj, dict):
+        return dict((plain(k), plain(v)) for (k, v) in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [plain(x) for x in obj]
+    if isinstance(obj, bool):
+        return bool(obj)
+    if isinstance(obj, string_types):
+        return text_type(obj) if isinstance(obj, text_type) else str(obj)
+    for cls in (int, float):
+        if isinstance(obj, cls):
+            return cls(obj)
+    return obj
+
+
 def factory():
     """Singleton Configuration instance.
 
@@ -95,23 +200,9 @@ def factory():
     """
     cfg = Configuration()
 
-    config_basename = pymod.names.config_file_basename
-
-    default_config_file = os.path.join(
-        pymod.paths.etc_path, "defaults", config_basename
-    )
-    defaults = load_config(default_config_file)
-    cfg.push_scope("defaults", defaults)
-
-    admin_config_file = os.path.join(pymod.paths.etc_path, config_basename)
-    if os.path.isfile(admin_config_file):
-        admin = load_config(admin_config_file)
-        cfg.push_scope("user", admin)
-
-    user_config_file = os.path.join(pymod.paths.user_config_path, config_basename)
-    if os.path.exists(user_config_file):
-        user = load_config(user_config_file)
-        cfg.push_scope("user", user)
+    # The scopes were verified when they were read from the config files
+    cfg.scopes.update(load_scopes())
+    defaults = cfg.scopes["defaults"]
 
     # Environment variable
     env = {}
@@ -1,19 +1,83 @@
 import os
 import sys
 from argparse import Namespace
+from collections import deque
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # pragma: no cover
+    from collections import MutableMapping
 
 import pymod.names
 import pymod.shell
+import pymod.timer
 import pymod.modulepath
 
 from pymod.serialize import serialize, deserialize
 from pymod.serialize import serialize_chunked, deserialize_chunked
-from pymod.util.lang import join, split, pop, get_system_manpath
+from pymod.util.lang import join, split, get_system_manpath
 
 import llnl.util.tty as tty
 from llnl.util.lang import Singleton
 
 
+class PathList(object):
+    """Ordered list of the entries of a path variable.
+
+    Each entry is stored with a position that is smaller (prepended) or larger
+    (appended) than all others, and each value maps to the positions at which
+    it occurs, in order.  Membership, counting, appending, prepending and
+    removing the first occurrence of a value do not scan the list.  The
+    entries are sorted once, when the list is iterated.
+
+    """
+
+    def __init__(self, items=None):
+        self.positions = {}
+        self.first = 0
+        self.last = -1
+        for item in items or []:
+            self.append(item)
+
+    def __contains__(self, value):
+        return value in self.positions
+
+    def __len__(self):
+        return sum([len(p) for p in self.positions.values()])
+
+    def __bool__(self):
+        return bool(self.positions)
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        items = [(i, v) for (v, p) in self.positions.items() for i in p]
+        return iter([v for (_, v) in sorted(items)])
+
+    def __repr__(self):
+        return "PathList({0!r})".format(list(self))
+
+    def count(self, value):
+        return len(self.positions.get(value, ()))
+
+    def append(self, value):
+        self.last += 1
+        self.positions.setdefault(value, deque()).append(self.last)
+
+    def prepend(self, value):
+        self.first -= 1
+        self.positions.setdefault(value, deque()).appendleft(self.first)
+
+    def remove(self, value):
+        """Remove the first occurrence of `value`, if any"""
+        positions = self.positions.get(value)
+        if positions is None:
+            return
+        positions.popleft()
+        if not positions:
+            del self.positions[value]
+
+
 class Environ(dict):
     def __init__(self):
         self.aliases = {}
@@ -22,16 +86,60 @@ class Environ(dict):
         self._sys_manpath = None
         self.files_to_source = []
         self.raw_shell_commands = []
+        self._deferred = {}
+        # Decoded path variables, see `get_path`
+        self._paths = {}
 
     def __getitem__(self, key):
         """Overload Environ[] to first check me, then os.environ"""
+        if self._deferred:
+            self.flush(key)
         if key in self:
             return super(Environ, self).__getitem__(key)
         return os.environ[key]
 
+    def __setitem__(self, key, value):
+        if self._deferred:
+            self.flush(key)
+        if self._paths:
+            # The variable is being set directly, forget its decoded path
+            if key.startswith(self.meta_key_prefix):
+                key_ = key[len(self.meta_key_prefix) :]
+                self._paths.pop(key_, None)
+            self._paths.pop(key, None)
+        super(Environ, self).__setitem__(key, value)
+
+    def defer(self, name, fun, keys):
+        """Defer setting variables until they are needed.
+
+        Parameters
+        ----------
+        name : str
+            Name of the deferred update.  A later update with the same name
+            replaces this one.
+        fun : callable
+            ``fun(self)`` sets the variables
+        keys : tuple of str
+            The names (or prefixes of the names) of the variables set by `fun`.
+            `fun` is called when any of them is read or set, or when the
+            environment is copied for output.
+
+        """
+        self._deferred[name] = (tuple(keys), fun)
+
+    def flush(self, key=None):
+        """Perform the deferred updates of `key` (all, if `key` is None)"""
+        for name in list(self._deferred.keys()):
+            keys, fun = self._deferred[name]
+            if key is None or key.startswith(keys):
+                del self._deferred[name]
+                fun(self)
+
     def is_empty(self):
+        self.flush()
         return not len(self) and not len(self.aliases) and not len(self.shell_functions)
 
+    @pymod.timer.timed("format_output")
     def format_output(self):
         env = self.copy()
         output = pymod.shell.format_output(
@@ -52,9 +160,13 @@ class Environ(dict):
 
     def get(self, key, default=None, type=None):
         """Overload Environ.get to first check me, then os.environ"""
+        if self._deferred:
+            self.flush(key)
         val = super(Environ, self).get(key, os.getenv(key, default))
         return val if type is None else type(val)
 
+    meta_key_prefix = pymod.names.loaded_module_meta("")
+
     def get_path(self, key, sep=os.pathsep):
         """Get the path given by `key`
 
@@ -65,23 +177,41 @@ class Environ(dict):
         The meta data are saved in a dictionary in the environment variable
         `loaded_module_meta(key)`
 
+        The path is decoded once and kept until the variable is set directly
+        (not through `set_path`), so a path can be modified many times without
+        decoding and encoding its meta data each time.
+
         """
+        p = self._paths.get(self.fix_ld_library_path(key))
+        if p is not None and p.sep == sep:
+            return p
         p = Namespace()
         p.key = self.fix_ld_library_path(key)
         p.meta_key = pymod.names.loaded_module_meta(key)
         p.sep = sep
-        p.value = split(self.get(key), sep=sep)
+        p.value = PathList(split(self.get(key), sep=sep))
         serialized = self.get(p.meta_key)
         p.meta = {} if serialized is None else deserialize(serialized)
+        self._paths[p.key] = p
         return p
 
     def set_path(self, path):
+        """Set the path.  The variables are written when they are needed."""
         if not path.value:
-            self[path.key] = None
-            self[path.meta_key] = None
+            path.value = PathList()
+        self._paths[path.key] = path
+        keys = (path.key, path.meta_key, "__{0}__".format(path.key))
+        writer = lambda env: env.write_path(path)
+        self.defer(path.meta_key, writer, keys)
+
+    def write_path(self, path):
+        setitem = super(Environ, self).__setitem__
+        if not path.value:
+            setitem(path.key, None)
+            setitem(path.meta_key, None)
         else:
-            self[path.key] = join(path.value, path.sep)
-            self[path.meta_key] = serialize(path.meta)
+            setitem(path.key, join(path.value, path.sep))
+            setitem(path.meta_key, serialize(path.meta))
         self.save_ld_library_path(path.key)
 
     def filtered(self, include_os=False):
@@ -97,11 +227,19 @@ class Environ(dict):
     def restore(self, clone):
         self.aliases = clone["aliases"]
         self.shell_functions = clone["shell_functions"]
+        self._deferred = {}
+        self._paths = {}
         for key in list(self.keys()):
             del self[key]
         self.update(clone["env"])
 
+    def snapshot(self):
+        """Shallow copy of the variables set in this session"""
+        self.flush()
+        return dict(self)
+
     def copy(self, include_os=False, filter_None=False):
+        self.flush()
         env = dict(os.environ) if include_os else dict()
         if filter_None:
             env.update(dict([item for item in self.items() if item[1] is not None]))
@@ -222,8 +360,8 @@ class Environ(dict):
             d["count"] = current_path.value.count(value)
         d["count"] += 1
         if not allow_dups:
-            pop(current_path.value, value)
-        current_path.value.insert(0, value)
+            current_path.value.remove(value)
+        current_path.value.prepend(value)
         current_path.meta[value] = d
         self.set_path(current_path)
 
@@ -244,7 +382,7 @@ class Environ(dict):
                 raise Exception("Inconsistent refcount state")
         d["count"] -= 1
         if (allow_dups and d["count"] > 0) or d["count"] <= 0:
-            pop(current_path.value, value)
+            current_path.value.remove(value)
         if d["count"] > 0:
             current_path.meta[value] = d
         if key == pymod.names.manpath:  # pragma: no cover
@@ -258,6 +396,86 @@ class Environ(dict):
         self.raw_shell_commands.append(command)
 
 
+class SandboxEnviron(MutableMapping):
+    """The environment as seen by modulefiles, sent to them as ``env``.
+
+    ``env`` holds the environment as it was before the modulefile was
+    executed.  The snapshot is taken by `snapshot`, only for modulefiles that
+    use ``env``, and is a shallow copy of the variables set in this session:
+    variables of the calling shell are read from ``os.environ`` when they are
+    looked up.  Values set or deleted by the modulefile are kept here and do
+    not modify the environment.  Values read from the environment are recorded
+    in `recording`, if given.
+
+    """
+
+    _missing = object()
+
+    def __init__(self, recording=None):
+        self._local = {}
+        self._recording = recording
+        self._environ = None
+        self._modulepath = None
+
+    def snapshot(self):
+        """Take the snapshot of the environment read by this object"""
+        self._environ = environ.snapshot()
+        self._modulepath = pymod.modulepath._path.value
+
+    def __getitem__(self, key):
+        if key in self._local:
+            value = self._local[key]
+        else:
+            value = self.read(key)
+        if value is self._missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local[key] = self._missing
+
+    def __iter__(self):
+        if self._recording is not None:
+            # The keys read cannot be recorded
+            self._recording.invalidate()
+        if self._environ is None:
+            self.snapshot()
+        env = dict(os.environ)
+        env.update(self._environ)
+        env[pymod.names.modulepath] = self._modulepath
+        env.update(self._local)
+        keys = [k for (k, v) in env.items() if v is not self._missing]
+        return iter([k for k in keys if not pymod.shell.filter_key(k)])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def read(self, key):
+        """The value of `key` in the snapshot of the environment, or
+        `_missing`.  Values set on this object are ignored"""
+        if self._environ is None:
+            self.snapshot()
+        if pymod.shell.filter_key(key):
+            value = self._missing
+        elif key == pymod.names.modulepath:
+            value = self._modulepath
+        elif key in self._environ:
+            value = self._environ[key]
+        else:
+            value = os.environ.get(key, self._missing)
+        if self._recording is not None:
+            self._recording.read(key, value)
+        return value
+
+
 def factory():
     return Environ()
 
@@ -284,6 +502,10 @@ def get(key, default=None, serialized=False, type=None):
     return environ.get(key, default, type=type)
 
 
+def defer(name, fun, keys):
+    return environ.defer(name, fun, keys)
+
+
 def set(key, value, serialize=False):
     if serialize:
         return _serialize_and_set(environ, key, value)
@@ -8,28 +8,21 @@ from __future__ import print_function
 import re
 import os
 import sys
-import inspect
-import pstats
 import argparse
 from six import StringIO
 
 
 import pymod.paths
 import pymod.config
-import pymod.modulepath
-import pymod.environ
+import pymod.timer
 import pymod.command
 import pymod.shell
 
 import llnl.util.tty as tty
 import llnl.util.tty.color as color
-from llnl.util.tty.log import log_output
 from pymod.util.tty import redirect_stdout
 
 
-#: names of profile statistics
-stat_names = pstats.Stats.sort_arg_dict_default
-
 #: top-level aliases for pymod commands
 aliases = {
     "av": "avail",
@@ -340,7 +333,10 @@ def make_argument_parser(**kwargs):
         help="show help for all commands (same as pymod help --all)",
     )
     parser.add_argument(
-        "--time", action="store_true", default=False, help="time execution of command"
+        "--time",
+        action="store_true",
+        default=False,
+        help="time execution of command and print the time of each phase",
     )
     parser.add_argument(
         "--verbose", action="store_true", default=False, help="print additional output"
@@ -365,7 +361,16 @@ def make_argument_parser(**kwargs):
         help="run execution through pdb debugger",
     )
     parser.add_argument(
-        "--trace", action="store_true", default=False, help="trace execution of command"
+        "--trace",
+        action="store_true",
+        default=False,
+        help="trace execution of command to a Chrome trace file",
+    )
+    parser.add_argument(
+        "--import-profile",
+        action="store_true",
+        default=False,
+        help="report the time spent importing each module on exit",
     )
     parser.add_argument(
         "-V", "--version", action="store_true", help="show version number and exit"
@@ -427,6 +432,8 @@ class PymodCommand(object):
 
         fail_on_error = kwargs.get("fail_on_error", True)
 
+        from llnl.util.tty.log import log_output
+
         out = StringIO()
         try:
             with log_output(out):
@@ -485,9 +492,8 @@ def allows_unknown_args(command):
     indicate they can handle unknonwn args, and we'll pass the unknown
     args in.
     """
-    info = dict(inspect.getmembers(command))
-    varnames = info["__code__"].co_varnames
-    argcount = info["__code__"].co_argcount
+    varnames = command.__code__.co_varnames
+    argcount = command.__code__.co_argcount
     return argcount == 3 and varnames[2] == "unknown_args"
 
 
@@ -504,6 +510,19 @@ def _invoke_command(command, parser, args, unknown_args):
     return 0 if return_val is None else return_val
 
 
+def report_timing(args):
+    """Report the spans recorded by pymod.timer for --time and --trace"""
+    if args.time:
+        sys.stderr.write(pymod.timer.format_breakdown())
+    if args.trace:
+        import tempfile
+
+        basename = "modulecmd-{0}.trace.json".format(os.getpid())
+        filename = os.path.join(tempfile.gettempdir(), basename)
+        pymod.timer.write_trace(filename)
+        tty.info("Trace written to {0}".format(filename))
+
+
 def main(argv=None):
     """This is the entry point for the pymod command.
 
@@ -554,6 +573,9 @@ def main(argv=None):
         return 1
 
     try:
+        if args.time or args.trace:
+            pymod.timer.enable()
+
         # ensure options on pymod command come before everything
         setup_main_options(args)
 
@@ -584,7 +606,11 @@ def main(argv=None):
             )
             return 0
         else:
-            return _invoke_command(command, parser, args, unknown)
+            try:
+                with pymod.timer.span(cmd_name, category="command"):
+                    return _invoke_command(command, parser, args, unknown)
+            finally:
+                report_timing(args)
 
     except Exception as e:
         if pymod.config.get("debug"):
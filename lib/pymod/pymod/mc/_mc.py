@@ -8,10 +8,13 @@ import pymod.module
 import pymod.environ
 import pymod.modulepath
 
+from pymod.util.lang import join
+
 import llnl.util.tty as tty
 
 
 _loaded_modules = None
+_loaded_modules_by_filename = None
 _initial_loaded_modules = None
 _swapped_explicitly = []
 _swapped_on_version_change = []
@@ -33,6 +36,7 @@ __all__ = [
     "register_module",
     "unregister_module",
     "module_is_loaded",
+    "filename_is_loaded",
     "archive_module",
     "unarchive_module",
 ]
@@ -40,17 +44,41 @@ __all__ = [
 
 def module_is_loaded(key):
     if isinstance(key, pymod.module.Module):
-        return key in get_loaded_modules()
+        return loaded_modules_by_filename().get(key.filename) is key
     elif os.path.isfile(key):
-        return key in [m.filename for m in get_loaded_modules()]
+        return filename_is_loaded(key)
     else:
-        for module in get_loaded_modules():
+        for module in _get_loaded_modules():
             if module.name == key or module.fullname == key:
                 return True
     return False
 
 
+def filename_is_loaded(filename):
+    return filename in loaded_modules_by_filename()
+
+
+def loaded_modules_by_filename():
+    """Mapping of filename to loaded module.  The mapping is updated by
+    `register_module` and `unregister_module` and rebuilt if the list of
+    loaded modules is replaced"""
+    global _loaded_modules_by_filename
+    loaded_modules = _get_loaded_modules()
+    if (
+        _loaded_modules_by_filename is None
+        or _loaded_modules_by_filename[0] is not loaded_modules
+    ):
+        mapping = dict([(m.filename, m) for m in loaded_modules])
+        _loaded_modules_by_filename = (loaded_modules, mapping)
+    return _loaded_modules_by_filename[1]
+
+
 def get_loaded_modules():
+    # return copy so that no one else can modify the loaded modules
+    return list(_get_loaded_modules())
+
+
+def _get_loaded_modules():
     global _loaded_modules
     if _loaded_modules is None:
         tty.debug("Reading loaded modules")
@@ -63,8 +91,7 @@ def get_loaded_modules():
             _loaded_modules.append(module)
         global _initial_loaded_modules
         _initial_loaded_modules = [m.fullname for m in _loaded_modules]
-    # return copy so that no one else can modify the loaded modules
-    return list(_loaded_modules)
+    return _loaded_modules
 
 
 def archive_module(module):
@@ -96,20 +123,38 @@ def unarchive_module(ar):
 
 
 def set_loaded_modules(modules):
-    """Set environment variables for loaded module names and files"""
+    """Set the loaded modules.
+
+    The environment variables for loaded module names and files, and the
+    serialized loaded modules, are written only when they are needed (when
+    read, or when the environment is output).  Until then, loading and
+    unloading modules only modifies `modules`.
+
+    """
     global _loaded_modules
     _loaded_modules = modules
 
     assert all([m.acquired_as is not None for m in _loaded_modules])
-    lm = [archive_module(m) for m in _loaded_modules]
-    pymod.environ.set(pymod.names.loaded_module_cellar, lm, serialize=True)
+    keys = (
+        pymod.names.loaded_module_cellar,
+        pymod.names.loaded_modules,
+        pymod.names.loaded_module_files,
+    )
+    writer = lambda env: write_loaded_modules(env, modules)
+    pymod.environ.defer(pymod.names.loaded_module_cellar, writer, keys)
+
+
+def write_loaded_modules(env, modules):
+    """Set environment variables for loaded module names and files"""
+    lm = [archive_module(m) for m in modules]
+    pymod.environ._serialize_and_set(env, pymod.names.loaded_module_cellar, lm)
 
     # The following are for compatibility with other module programs
-    lm_names = [m.fullname for m in _loaded_modules]
-    pymod.environ.set_path(pymod.names.loaded_modules, lm_names)
+    lm_names = [m.fullname for m in modules]
+    env.set(pymod.names.loaded_modules, join(lm_names, os.pathsep))
 
-    lm_files = [m.filename for m in _loaded_modules]
-    pymod.environ.set_path(pymod.names.loaded_module_files, lm_files)
+    lm_files = [m.filename for m in modules]
+    env.set(pymod.names.loaded_module_files, join(lm_files, os.pathsep))
 
 
 def increment_refcount(module):
@@ -129,13 +174,13 @@ def register_module(module):
         ("sems-devpack", "devpack")
     ):
         return
-    loaded_modules = get_loaded_modules()
-    if module not in loaded_modules:
-        increment_refcount(module)
-        loaded_modules.append(module)
-        set_loaded_modules(loaded_modules)
-    else:
+    if module_is_loaded(module):
         raise ModuleRegisteredError(module)
+    increment_refcount(module)
+    loaded_modules = _get_loaded_modules()
+    loaded_modules_by_filename()[module.filename] = module
+    loaded_modules.append(module)
+    set_loaded_modules(loaded_modules)
 
 
 def unregister_module(module):
@@ -146,14 +191,12 @@ def unregister_module(module):
     # "unusing" a directory on the MODULEPATH which has loaded modules.
     # Those modules are automaically unloaded since they are no longer
     # available.
-    loaded_modules = get_loaded_modules()
-    for (i, loaded) in enumerate(loaded_modules):
-        if loaded.filename == module.filename:
-            break
-    else:
+    loaded = loaded_modules_by_filename().pop(module.filename, None)
+    if loaded is None:
         raise ModuleNotRegisteredError(module)
     module.refcount = 0
-    loaded_modules.pop(i)
+    loaded_modules = _get_loaded_modules()
+    loaded_modules.remove(loaded)
     set_loaded_modules(loaded_modules)
 
 
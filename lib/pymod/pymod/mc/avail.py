@@ -1,8 +1,10 @@
 import pymod.alias
 import pymod.modulepath
 import pymod.collection
+import pymod.timer
 
 
+@pymod.timer.timed("mc.avail")
 def avail(terse=False, regex=None, show_all=False, long_format=False):
     avail = pymod.modulepath.avail(terse=terse, regex=regex, long_format=long_format)
     if show_all:
@@ -5,6 +5,7 @@ import pymod.names
 import pymod.error
 import pymod.environ
 import pymod.collection
+import pymod.timer
 import llnl.util.tty as tty
 
 
@@ -21,6 +22,7 @@ def show(name):
     return 0
 
 
+@pymod.timer.timed("mc.collection.restore")
 def restore(name):
     """Restore a collection of modules previously saved"""
     the_collection = pymod.collection.get(name)
@@ -44,6 +46,7 @@ def add_to_loaded_collection(name):
     pymod.collection.add_to_loaded_collection(name)
 
 
+@pymod.timer.timed("mc.collection.restore_impl")
 def restore_impl(name, the_collection):
     # First unload all loaded modules
     pymod.environ.unset(pymod.names.loaded_collection)
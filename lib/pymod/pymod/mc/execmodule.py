@@ -1,18 +1,27 @@
 import os
 import sys
+import types
+import struct
+import marshal
+import hashlib
 
 import pymod.mc
+import pymod.paths
+import pymod.config
 import pymod.user
 import pymod.modes
 import pymod.module
 import pymod.environ
 import pymod.callback
+import pymod.mc.replay
+import pymod.timer
 import llnl.util.tty as tty
 from llnl.util.filesystem import working_dir
 from llnl.util.lang import Singleton
 
 from six import exec_, StringIO
 from pymod.error import FamilyLoadedError
+from pymod.util.filesystem import write_atomic
 
 
 # ----------------------------- MODULE EXECUTION FUNCTIONS
@@ -49,38 +58,126 @@ def execmodule_in_sandbox(module, mode):
 
     # Execute the environment
     tty.debug("Executing module {0} with mode {1}".format(module, mode))
-    module.prepare()
-    ns = module_exec_sandbox(module, mode)
-    code = compile(module.read(mode), module.filename, "exec")
-    with working_dir(os.path.dirname(module.filename)):
-        try:
-            if isinstance(module, pymod.module.TclModule):
-                clone = pymod.environ.clone()
-            exec_(code, ns, {})
-        except pymod.error.StopLoadingModuleError:
-            pass
-        except pymod.error.TclModuleBreakError:
-            # `break` command encountered.  we need to roll back changes to the
-            # environment and tell whoever called not to register this module
-            pymod.environ.restore(clone)
-            module.exec_failed_do_not_register = True
-
-
-def module_exec_sandbox(module, mode):
-    callback = lambda cb, **kwds: pymod.callback.callback(cb, module, mode, **kwds)
-    ns = {
+    with pymod.timer.span(
+        "execmodule", module=module.fullname, mode=pymod.modes.as_string(mode)
+    ):
+        module.prepare()
+        recording = pymod.mc.replay.start(module, mode)
+        with pymod.timer.span("sandbox"):
+            ns = module_exec_sandbox(module, mode, recording=recording)
+        dirname = os.path.dirname(module.filename)
+        with working_dir(dirname), pymod.callback.executing(module, recording):
+            if recording is not None and pymod.mc.replay.replay(module, ns, recording):
+                return
+            with pymod.timer.span("compile", module=module.fullname):
+                code = compile_module(module, mode)
+            if uses_name(code, "env"):
+                ns["env"].snapshot()
+            try:
+                if isinstance(module, pymod.module.TclModule):
+                    clone = pymod.environ.clone()
+                with pymod.timer.span("exec", module=module.fullname):
+                    exec_(code, ns, {})
+            except pymod.error.StopLoadingModuleError:
+                pass
+            except pymod.error.TclModuleBreakError:
+                # `break` command encountered.  we need to roll back changes to
+                # the environment and tell whoever called not to register this
+                # module
+                pymod.environ.restore(clone)
+                module.exec_failed_do_not_register = True
+        if recording is not None:
+            pymod.mc.replay.save(module, recording)
+
+
+#: Code objects of Python modulefiles, by (filename, size, mtime)
+_code_cache = {}
+
+#: Header of cached code: the size and modification time of the modulefile
+code_header = struct.Struct("<qd")
+
+#: Tag of the interpreter that compiled the cached code
+code_tag = getattr(
+    getattr(sys, "implementation", None),
+    "cache_tag",
+    "python-{0}{1}".format(*sys.version_info[:2]),
+)
+
+
+def compile_module(module, mode):
+    """Compile the module's source.  The code of Python modulefiles is cached
+    in memory and, if ``module_bytecode_cache`` is set, in the user cache
+    directory, until the modulefile's size or modification time change."""
+    if not isinstance(module, pymod.module.PyModule):
+        return compile(module.read(mode), module.filename, "exec")
+    try:
+        st = os.stat(module.filename)
+    except OSError:  # pragma: no cover
+        return compile(module.read(mode), module.filename, "exec")
+    key = (module.filename, st.st_size, st.st_mtime)
+    code = _code_cache.get(key)
+    if code is not None:
+        return code
+
+    use_disk = pymod.config.get("module_bytecode_cache")
+    if use_disk:
+        basename = "{0}.{1}".format(
+            hashlib.sha1(module.filename.encode("utf-8")).hexdigest(), code_tag
+        )
+        filename = pymod.paths.join_user(os.path.join("bytecode", basename), cache=True)
+        code = read_code(filename, st.st_size, st.st_mtime)
+
+    if code is None:
+        code = compile(module.read(mode), module.filename, "exec")
+        if use_disk:
+            header = code_header.pack(st.st_size, st.st_mtime)
+            write_atomic(filename, header + marshal.dumps(code))
+
+    _code_cache[key] = code
+    return code
+
+
+def read_code(filename, size, mtime):
+    try:
+        with open(filename, "rb") as fh:
+            header = fh.read(code_header.size)
+            if len(header) != code_header.size:
+                return None
+            if code_header.unpack(header) != (size, mtime):
+                return None
+            return marshal.loads(fh.read())
+    except (IOError, OSError, ValueError, EOFError, TypeError):
+        return None
+
+
+def uses_name(code, name):
+    """Whether the `code` of a modulefile, or the code it defines, uses the
+    global `name`"""
+    if name in code.co_names:
+        return True
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType) and uses_name(const, name):
+            return True
+    return False
+
+
+#: Names sent to modulefiles executed in a given mode, by mode
+_sandbox_templates = {}
+
+
+def sandbox_template(mode):
+    """Names sent to every modulefile executed in `mode`.  The callbacks are
+    wrapped once per mode and find the module being executed through
+    ``pymod.callback.executing``"""
+    template = _sandbox_templates.get(mode)
+    if template is not None:
+        return template
+    template = {
         "os": os,
         "sys": sys,
-        "env": pymod.environ.copy(include_os=True),
-        "self": module,
-        "user_env": pymod.user.env,
         "is_darwin": "darwin" in sys.platform,
         "IS_DARWIN": "darwin" in sys.platform,
-        #
-        "add_option": module.add_option,
-        "opts": Singleton(module.parse_opts),
     }
-
     for fun in pymod.callback.all_callbacks():
         kwds = {}
         if fun.endswith(("set_alias", "set_shell_function", "getenv")):
@@ -98,5 +195,21 @@ def module_exec_sandbox(module, mode):
         else:
             # Let the function know nothing was explicitly set
             kwds["when"] = None
-        ns[fun] = callback(fun, **kwds)
+        template[fun] = pymod.callback.bound_callback(fun, mode, **kwds)
+    _sandbox_templates[mode] = template
+    return template
+
+
+def module_exec_sandbox(module, mode, recording=None):
+    ns = dict(sandbox_template(mode))
+    ns.update(
+        {
+            "env": pymod.environ.SandboxEnviron(recording=recording),
+            "self": module,
+            "user_env": pymod.user.env,
+            #
+            "add_option": module.add_option,
+            "opts": Singleton(module.parse_opts),
+        }
+    )
     return ns
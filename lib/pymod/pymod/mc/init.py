@@ -1,5 +1,16 @@
+import os
+import random
+import hashlib
+
 import pymod.mc
+import pymod.names
+import pymod.paths
+import pymod.config
 import pymod.environ
+from pymod.serialize import serialize, deserialize
+from pymod.util.filesystem import write_atomic
+
+import llnl.util.tty as tty
 
 
 def init(dirnames):
@@ -10,5 +21,64 @@ def init(dirnames):
         pymod.mc.collection.restore(pymod.names.default_user_collection)
     for dirname in dirnames:
         pymod.mc.use(dirname, append=True)
-    pymod.environ.set(pymod.names.initial_env, initial_env, serialize=True)
+    save_initial_env(initial_env)
     return
+
+
+def save_initial_env(initial_env):
+    """Save the environment snapshot restored by ``module reset``.
+
+    The snapshot is serialized to the environment unless ``initial_env_in_file``
+    is set, in which case it is written to a file named by its digest in a
+    directory of the user cache specific to this session and only the digest
+    is exported.  If the file cannot be written, the snapshot is serialized to
+    the environment.
+
+    """
+    if pymod.config.get("initial_env_in_file"):
+        session_id = pymod.environ.get(pymod.names.session_id)
+        if session_id is None:
+            session_id = "{0}.{1}".format(os.getpid(), random.randint(10000, 99999))
+            pymod.environ.set(pymod.names.session_id, session_id)
+        serialized = serialize(initial_env)
+        digest = hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+        filename = initial_env_file(session_id, digest)
+        # The file is named by its content, so an existing file is current
+        if os.path.isfile(filename) or write_atomic(filename, serialized):
+            remove_initial_envs(os.path.dirname(filename), keep=digest)
+            pymod.environ.set(pymod.names.initial_env, None, serialize=True)
+            pymod.environ.set(pymod.names.initial_env_digest, digest)
+            return
+    pymod.environ.set(pymod.names.initial_env_digest, None)
+    pymod.environ.set(pymod.names.initial_env, initial_env, serialize=True)
+
+
+def load_initial_env():
+    """Load the environment snapshot saved by ``save_initial_env``"""
+    digest = pymod.environ.get(pymod.names.initial_env_digest)
+    session_id = pymod.environ.get(pymod.names.session_id)
+    if digest and session_id:
+        filename = initial_env_file(session_id, digest)
+        try:
+            with open(filename) as fh:
+                return deserialize(fh.read())
+        except (IOError, OSError, ValueError) as e:
+            tty.debug("Failed to read {0}: {1}".format(filename, e))
+    return pymod.environ.get(pymod.names.initial_env, serialized=True)
+
+
+def initial_env_file(session_id, digest):
+    dirname = pymod.names.initial_env_dirname
+    return pymod.paths.join_user(os.path.join(dirname, session_id, digest), cache=True)
+
+
+def remove_initial_envs(dirname, keep=None):
+    """Remove the snapshots in `dirname` other than `keep`, saved by earlier
+    calls to ``save_initial_env`` in this session"""
+    for basename in os.listdir(dirname):
+        if basename == keep:
+            continue
+        try:
+            os.remove(os.path.join(dirname, basename))
+        except OSError as e:  # pragma: no cover
+            tty.debug("Failed to remove {0}: {1}".format(basename, e))
@@ -1,15 +1,18 @@
 import pymod.mc
+import pymod.mc.replay
 import pymod.modes
 import pymod.names
 import pymod.environ
 import pymod.modulepath
 import pymod.collection
+import pymod.timer
 
 from pymod.mc.execmodule import execmodule
 from pymod.error import ModuleNotFoundError, ModuleLoadError
 import llnl.util.tty as tty
 
 
+@pymod.timer.timed("mc.load")
 def load(name, opts=None, insert_at=None, caller="command_line"):
     """Load the module given by `name`
 
@@ -82,6 +85,7 @@ def load(name, opts=None, insert_at=None, caller="command_line"):
     return module
 
 
+@pymod.timer.timed("mc.load_impl")
 def load_impl(module):
     """Implementation of load.
 
@@ -132,27 +136,29 @@ def load_inserted_impl(module, insert_at):
     loaded_modules = pymod.mc.get_loaded_modules()
     to_unload_and_reload = loaded_modules[insertion_loc:]
     opts = [m.opts for m in to_unload_and_reload]
-    for other in to_unload_and_reload[::-1]:
-        pymod.mc.unload_impl(other)
-
-    load_impl(module)
-
-    # Reload any that need to be unloaded first
-    for (i, other) in enumerate(to_unload_and_reload):
-        assert not other.is_loaded
-        other_module = pymod.modulepath.get(other.acquired_as)
-        if other_module is None:
-            # The only way this_module is None is if inserting caused a change
-            # to MODULEPATH making this module unavailable.
-            pymod.mc.unloaded_on_mp_change(other)
-            continue
-
-        if other_module.filename != other.filename:
-            pymod.mc.swapped_on_mp_change(other, other_module)
-        else:
-            other_module.opts = opts[i]
+    with pymod.mc.replay.reloading():
+        for other in to_unload_and_reload[::-1]:
+            pymod.mc.unload_impl(other)
+
+        pymod.mc.replay.forget(module)
+        load_impl(module)
 
-        load_impl(other_module)
+        # Reload any that need to be unloaded first
+        for (i, other) in enumerate(to_unload_and_reload):
+            assert not other.is_loaded
+            other_module = pymod.modulepath.get(other.acquired_as)
+            if other_module is None:
+                # The only way this_module is None is if inserting caused a change
+                # to MODULEPATH making this module unavailable.
+                pymod.mc.unloaded_on_mp_change(other)
+                continue
+
+            if other_module.filename != other.filename:
+                pymod.mc.swapped_on_mp_change(other, other_module)
+            else:
+                other_module.opts = opts[i]
+
+            load_impl(other_module)
 
     return
 
@@ -1,8 +1,10 @@
 import pymod.mc
 import pymod.modes
+import pymod.timer
 import llnl.util.tty as tty
 
 
+@pymod.timer.timed("mc.purge")
 def purge(load_after_purge=True):
     """Purge all modules from environment"""
     loaded_modules = pymod.mc.get_loaded_modules()
@@ -1,7 +1,9 @@
 import pymod.mc
+import pymod.timer
 import llnl.util.tty as tty
 
 
+@pymod.timer.timed("mc.refresh")
 def refresh():
     """Unload all modules from environment and reload them"""
     loaded_modules = pymod.mc.get_loaded_modules()
@@ -1,9 +1,11 @@
 import pymod.mc
 import pymod.modulepath
+import pymod.timer
 import llnl.util.tty as tty
 from pymod.error import ModuleNotFoundError
 
 
+@pymod.timer.timed("mc.reload")
 def reload(name):
     """Reload the module given by `modulename`"""
     module = pymod.modulepath.get(name)
@@ -0,0 +1,205 @@
+"""Replay, rather than execute, modules that are unloaded and loaded again.
+
+Swapping a module unloads the modules loaded after it and then loads them
+again; ``load --insert-at`` and ``reload`` do the same.  Most of these modules
+make the same calls to the callbacks when they are loaded again as when they
+were unloaded: their effects do not depend on the module swapped.  In the
+block of ``reloading``, ``execmodule`` records the calls each module makes
+and, when a module is executed again, calls the callbacks it recorded rather
+than executing the modulefile, which for TCL modules means translating it
+again.
+
+Only recordings of modules whose calls are confined to the environment are
+replayed.  The inputs of a module are the results of the queries it makes
+(``getenv``, ``is_loaded``, ``is_used``, ``get_family_info``, ``mode``, ...)
+and the variables it reads from ``env``, including ``MODULEPATH``; these are
+compared with the recorded ones as the calls are replayed.  If any input
+changed, the changes made to the environment by the replay are rolled back
+and the module is executed.  The module is also executed if its modulefile
+or options changed since it was recorded.
+
+Replaying a call made in unload mode in load mode (or the reverse) has the
+effect of executing the module in that mode: the calls made by a module
+depend only on its inputs, and the callbacks implement the mode.
+
+"""
+import os
+from contextlib import contextmanager
+
+import pymod.names
+import pymod.modes
+import pymod.config
+import pymod.module
+import pymod.environ
+import pymod.timer
+import llnl.util.tty as tty
+
+
+#: Callbacks whose only effects are on the environment
+effects = frozenset(
+    (
+        "append_path",
+        "conflict",
+        "family",
+        "help",
+        "log_error",
+        "log_info",
+        "log_warning",
+        "prepend_path",
+        "prereq",
+        "prereq_any",
+        "remove_path",
+        "set_alias",
+        "set_shell_function",
+        "setenv",
+        "unset_alias",
+        "unset_shell_function",
+        "unsetenv",
+        "whatis",
+    )
+)
+
+#: Callbacks whose results are inputs of the module
+queries = frozenset(
+    (
+        "colorize",
+        "get_family_info",
+        "get_hostname",
+        "getenv",
+        "is_loaded",
+        "is_used",
+        "listdir",
+        "mode",
+        "which",
+    )
+)
+
+#: Callbacks changing MODULEPATH when sent MODULEPATH
+path_effects = frozenset(("append_path", "prepend_path", "remove_path"))
+
+#: Recordings of the modules executed in the block of `reloading`, by filename
+_recordings = {}
+
+_depth = 0
+
+
+@contextmanager
+def reloading():
+    """Replay the modules unloaded and loaded again in this block"""
+    global _depth
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if not _depth:
+            _recordings.clear()
+
+
+def forget(module):
+    """Execute `module` the next time it is loaded in the block of
+    `reloading`"""
+    _recordings.pop(module.filename, None)
+
+
+class Recording(object):
+    """The calls made by `module` to the callbacks, and the values it read
+    from the environment, in order"""
+
+    def __init__(self, module):
+        self.key = replay_key(module)
+        self.opts = dict(module.opts)
+        self.calls = []
+        self.replayable = self.key is not None
+
+    def invalidate(self):
+        self.replayable = False
+
+    def record(self, name, args, kwargs, result):
+        if not self.replayable:
+            return
+        if name in path_effects:
+            var = args[0] if args else kwargs.get("name")
+            if var == pymod.names.modulepath:
+                self.invalidate()
+                return
+        elif name not in effects and name not in queries:
+            self.invalidate()
+            return
+        self.calls.append((name, args, kwargs, result))
+
+    def read(self, key, value):
+        if self.replayable:
+            self.calls.append((None, (key,), None, value))
+
+    def reset(self):
+        self.calls = []
+        self.replayable = self.key is not None
+
+
+def replay_key(module):
+    """Key of the modulefile of `module`, or None if its recordings cannot be
+    replayed"""
+    if isinstance(module, pymod.module.TclModule):
+        from pymod.module.tcl2py import replay_key as tcl_replay_key
+
+        return tcl_replay_key(module)
+    try:
+        st = os.stat(module.filename)
+    except OSError:  # pragma: no cover
+        return None
+    return (st.st_size, st.st_mtime)
+
+
+def start(module, mode):
+    """The recording of `module` executed in `mode`, or None if modules are
+    not being recorded"""
+    if not _depth or not pymod.config.get("replay_modules"):
+        return None
+    if mode not in (pymod.modes.load, pymod.modes.unload):
+        return None
+    return Recording(module)
+
+
+def save(module, recording):
+    if recording.replayable:
+        _recordings[module.filename] = recording
+    else:
+        _recordings.pop(module.filename, None)
+
+
+def replay(module, ns, recording):
+    """Replay the calls recorded the last time `module` was executed, using
+    the callbacks in the sandbox `ns`.  The calls are recorded again in
+    `recording`.
+
+    Returns
+    -------
+    replayed : bool
+        Whether the calls were replayed.  If not, the environment is left
+        unchanged and the module must be executed.
+
+    """
+    previous = _recordings.pop(module.filename, None)
+    if previous is None or not previous.replayable:
+        return False
+    if previous.key != recording.key or previous.opts != recording.opts:
+        return False
+    if any(name is None for (name, _, _, _) in previous.calls):
+        ns["env"].snapshot()
+    clone = pymod.environ.clone()
+    with pymod.timer.span("replay", module=module.fullname):
+        for (name, args, kwargs, result) in previous.calls:
+            if name is None:
+                value = ns["env"].read(args[0])
+            else:
+                value = ns[name](*args, **kwargs)
+            if (name is None or name in queries) and value != result:
+                break
+        else:
+            save(module, recording)
+            return True
+    tty.debug("Executing {0}: its inputs changed".format(module.fullname))
+    pymod.environ.restore(clone)
+    recording.reset()
+    return False
@@ -1,8 +1,11 @@
 import pymod.mc
 import pymod.environ
+import pymod.timer
+from pymod.mc.init import load_initial_env
 
 
+@pymod.timer.timed("mc.reset")
 def reset():
-    initial_env = pymod.environ.get(pymod.names.initial_env, serialized=True)
+    initial_env = load_initial_env()
     pymod.mc.clone.restore_impl(initial_env)
     return initial_env
@@ -1,10 +1,13 @@
 import pymod.mc
+import pymod.mc.replay
 import pymod.modes
 import pymod.modulepath
+import pymod.timer
 import llnl.util.tty as tty
 from pymod.error import ModuleNotFoundError
 
 
+@pymod.timer.timed("mc.swap")
 def swap(module_a_name, module_b_name, caller="command_line"):
     """Swap modules a and b"""
     module_a = pymod.modulepath.get(module_a_name)
@@ -28,6 +31,7 @@ def swap(module_a_name, module_b_name, caller="command_line"):
     return module_b
 
 
+@pymod.timer.timed("mc.swap_impl")
 def swap_impl(module_a, module_b, maintain_state=False, caller="command_line"):
     """The general strategy of swapping is to unload all modules in reverse
     order back to the module to be swapped.  That module is then unloaded
@@ -62,33 +66,38 @@ def swap_impl(module_a, module_b, maintain_state=False, caller="command_line"):
     else:  # pragma: no cover
         raise NoModulesToSwapError
 
-    # Unload any that need to be unloaded first
-    for other in to_unload_and_reload[::-1]:
-        pymod.mc.unload_impl(other, caller=caller)
-    assert other.name == module_a.name
-
-    # Now load it
-    pymod.mc.load_impl(module_b)
-
-    # Reload any that need to be unloaded first
-    for other in to_unload_and_reload[1:]:
-        if maintain_state:
-            this_module = pymod.modulepath.get(other.filename)
-        else:
-            this_module = pymod.modulepath.get(other.acquired_as)
-        if this_module is None:
-            # The only way this_module is None is if a swap of modules
-            # caused a change to MODULEPATH making this module
-            # unavailable.
-            pymod.mc.unloaded_on_mp_change(other)
-            continue
-
-        if this_module.filename != other.filename:
-            pymod.mc.swapped_on_mp_change(other, this_module)
-
-        # Now load the thing
-        this_module.opts = opts.get(this_module.name, this_module.opts)
-        pymod.mc.load_impl(this_module)
+    # Modules unloaded and loaded again are replayed, see pymod.mc.replay
+    with pymod.mc.replay.reloading():
+        # Unload any that need to be unloaded first
+        for other in to_unload_and_reload[::-1]:
+            pymod.mc.unload_impl(other, caller=caller)
+        assert other.name == module_a.name
+
+        # Now load it.  The swapped modules are executed, the others are
+        # replayed if their inputs did not change
+        pymod.mc.replay.forget(module_a)
+        pymod.mc.replay.forget(module_b)
+        pymod.mc.load_impl(module_b)
+
+        # Reload any that need to be unloaded first
+        for other in to_unload_and_reload[1:]:
+            if maintain_state:
+                this_module = pymod.modulepath.get(other.filename)
+            else:
+                this_module = pymod.modulepath.get(other.acquired_as)
+            if this_module is None:
+                # The only way this_module is None is if a swap of modules
+                # caused a change to MODULEPATH making this module
+                # unavailable.
+                pymod.mc.unloaded_on_mp_change(other)
+                continue
+
+            if this_module.filename != other.filename:
+                pymod.mc.swapped_on_mp_change(other, this_module)
+
+            # Now load the thing
+            this_module.opts = opts.get(this_module.name, this_module.opts)
+            pymod.mc.load_impl(this_module)
 
     return module_b
 
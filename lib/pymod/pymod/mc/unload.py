@@ -2,10 +2,12 @@ import pymod.mc
 import pymod.modes
 import pymod.environ
 import pymod.modulepath
+import pymod.timer
 import llnl.util.tty as tty
 from pymod.error import ModuleNotFoundError, ModuleNotLoadedError
 
 
+@pymod.timer.timed("mc.unload")
 def unload(name, tolerant=False, caller="command_line"):
     """Unload the module given by `name`"""
     module = pymod.modulepath.get(name)
@@ -36,6 +38,7 @@ def unload(name, tolerant=False, caller="command_line"):
     return loaded
 
 
+@pymod.timer.timed("mc.unload_impl")
 def unload_impl(module, caller="command_line"):
     """Implementation of unload
 
@@ -2,8 +2,10 @@ import os
 import pymod.mc
 import pymod.modes
 import pymod.modulepath
+import pymod.timer
 
 
+@pymod.timer.timed("mc.unuse")
 def unuse(dirname):
     """Remove dirname from MODULEPATH"""
 
@@ -39,7 +41,7 @@ def determine_swaps_due_to_removal(popped_modules):
 
     Parameters
     ----------
-    popped_modules : list of Module
+    popped_modules : list of ModuleEntry
         Modules no longer available due to their modulepath being removed
 
     Return
@@ -53,7 +55,8 @@ def determine_swaps_due_to_removal(popped_modules):
     # Determine which modules may have moved up in priority due to removal
     # of directory from path. If they have the same name as an orphan, it
     # will be loaded in the orphans place
-    orphaned = [m for m in popped_modules if m.is_loaded]
+    loaded_modules = dict([(m.filename, m) for m in pymod.mc.get_loaded_modules()])
+    orphaned = [loaded_modules[m.filename] for m in popped_modules if m.is_loaded]
     for (i, orphan) in enumerate(orphaned):
         for attr in ("fullname", "name"):
             other = pymod.modulepath.get(getattr(orphan, attr))
@@ -1,9 +1,11 @@
 import os
 import pymod.mc
 import pymod.modulepath
+import pymod.timer
 import llnl.util.tty as tty
 
 
+@pymod.timer.timed("mc.use")
 def use(dirname, append=False, delete=False):
     """Add dirname to MODULEPATH"""
     dirname = os.path.abspath(os.path.expanduser(dirname))
@@ -23,6 +25,8 @@ def use(dirname, append=False, delete=False):
         bumped = determine_swaps_due_to_prepend(prepended_modules)
         for (old, new) in bumped:
             assert old.is_loaded
+            # The prepended modules are catalog entries, get the full module
+            new = pymod.modulepath.get(new.filename)
             if new.fullname == old.acquired_as:
                 new.acquired_as = old.acquired_as
             else:
@@ -37,15 +41,16 @@ def determine_swaps_due_to_prepend(prepended_modules):
 
     Parameters
     ----------
-    prepended_modules : list of Module
+    prepended_modules : list of ModuleEntry
         These are modules that are now available from prepending their
         modulepath to pymod.modulepath
 
     Returns
     -------
-    bumped : list of Module
-        List of loaded modules that have lower precedence than a module of the
-        same name in prepended_modules. These should be swapped
+    bumped : list of tuple
+        bumped[i][0] is a loaded module that has lower precedence than
+        bumped[i][1], the module of the same name in prepended_modules.
+        These should be swapped
 
     """
     # Determine which modules changed in priority due to insertion of new
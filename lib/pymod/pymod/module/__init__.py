@@ -2,6 +2,7 @@ import os
 
 import pymod.config
 from pymod.module.module import *
+from pymod.module.entry import ModuleEntry
 
 import llnl.util.tty as tty
 
@@ -46,17 +47,17 @@ def from_dict(dikt):
     assert filename.startswith(root)
     path = filename.replace(root+os.path.sep, "")
     module_type = {"PyModule": PyModule, "TclModule": TclModule}[dikt["type"]]
-    try:
-        module = module_type(root, path)
-    except IOError:
-        return None
+    # The type is known and the cache is validated against the directory's
+    # modification time, so the modulefile is not touched
+    module = module_type(root, path, check_file=False)
     assert module.filename == filename
     return module
 
 
 def is_tcl_module(filename):
-    tcl_header = "#%Module"
+    tcl_header = b"#%Module"
     try:
-        return open(filename).readline().startswith(tcl_header)
-    except (IOError, UnicodeDecodeError):  # pragma: no cover
+        with open(filename, "rb") as fh:
+            return fh.read(len(tcl_header)) == tcl_header
+    except IOError:  # pragma: no cover
         return False
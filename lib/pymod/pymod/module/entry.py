@@ -0,0 +1,121 @@
+"""Compact, immutable records of the modules found on the MODULEPATH.
+
+A MODULEPATH can contain tens of thousands of modulefiles, but a command
+executes only a handful of them.  Discovery therefore creates a
+``ModuleEntry`` for each modulefile: a slotted record with interned strings
+and ``Version`` objects shared by all entries with the same version.  An
+entry is promoted to a full ``Module`` only when the module is requested
+from the ``Modulepath``.
+"""
+import os
+from six.moves import intern
+
+import pymod.mc
+import pymod.module
+from pymod.module.meta import MetaData
+from pymod.module.version import Version
+
+
+def module_type(type):
+    """The Module class named `type`.  Looked up when needed, since
+    pymod.module.module imports this module indirectly"""
+    return getattr(pymod.module.module, type)
+
+
+def intern_string(string):
+    """Intern `string`.  Python 2 interns only byte strings, so unicode strings
+    are returned as they are"""
+    if isinstance(string, str):
+        return intern(string)
+    return string
+
+
+_versions = {}
+
+
+def shared_version(string):
+    """Version objects are not modified, so one is shared by all entries with
+    the same version string"""
+    version = _versions.get(string)
+    if version is None:
+        version = _versions[string] = Version(string)
+    return version
+
+
+_metadata = {}
+
+
+def is_enabled(filename):
+    """Whether the python module in `filename` is enabled.  The metadata is
+    read at most once per modification of the file."""
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:  # pragma: no cover
+        mtime = None
+    cached = _metadata.get(filename)
+    if cached is None or cached[0] != mtime:
+        metadata = MetaData()
+        metadata.parse(filename)
+        cached = _metadata[filename] = (mtime, metadata.is_enabled)
+    return cached[1]
+
+
+class ModuleEntry(object):
+    __slots__ = (
+        "type",
+        "filename",
+        "modulepath",
+        "name",
+        "version",
+        "variant",
+        "fullname",
+        "marked_as_default",
+    )
+
+    def __init__(self, type, filename, modulepath, marked_as_default=False):
+        assert filename.startswith(modulepath)
+        path = filename[len(modulepath) :].lstrip(os.path.sep)
+        ext = module_type(type).ext
+        name, version, variant = pymod.module.module.split_path(path, ext)
+        fullname = os.path.sep.join([x for x in (name, version, variant) if x])
+        setattr_ = super(ModuleEntry, self).__setattr__
+        setattr_("type", intern_string(type))
+        setattr_("filename", filename)
+        setattr_("modulepath", intern_string(modulepath))
+        setattr_("name", intern_string(name))
+        setattr_("version", shared_version(version))
+        setattr_("variant", shared_version(variant))
+        setattr_("fullname", intern_string(fullname))
+        setattr_("marked_as_default", bool(marked_as_default))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModuleEntry objects are immutable")
+
+    def __repr__(self):
+        return "ModuleEntry(name={0})".format(self.fullname)
+
+    @property
+    def path(self):
+        ext = module_type(self.type).ext
+        return self.filename if ext is None else os.path.splitext(self.filename)[0]
+
+    def endswith(self, string):
+        return len(string) > len(self.fullname) and self.path.endswith(string)
+
+    @property
+    def is_loaded(self):
+        return pymod.mc.filename_is_loaded(self.filename)
+
+    @property
+    def is_enabled(self):
+        if self.type != "PyModule":
+            return True
+        return is_enabled(self.filename)
+
+    def promote(self):
+        """Create the full Module for this entry"""
+        path = self.filename[len(self.modulepath) :].lstrip(os.path.sep)
+        cls = module_type(self.type)
+        module = cls(self.modulepath, path, check_file=False)
+        module.marked_as_default = self.marked_as_default
+        return module
@@ -5,7 +5,6 @@ from textwrap import fill
 import pymod.mc
 import pymod.config
 from pymod.module.meta import MetaData
-from pymod.module.tcl2py import tcl2py
 from pymod.module.version import Version
 
 from pymod.util.lang import textfill
@@ -18,28 +17,15 @@ __all__ = ["Namespace", "Module", "PyModule", "TclModule"]
 class Module(object):
     ext = None
 
-    def __init__(self, root, path):
+    def __init__(self, root, path, check_file=True):
 
         self.filename = os.path.join(root, path)
 
-        if not os.path.isfile(self.filename):
+        # Modules created from the cache are known to exist
+        if check_file and not os.path.isfile(self.filename):
             raise IOError("{0} is not a file".format(self.filename))
 
-        parts = path.split(os.path.sep)
-        if self.ext:
-            parts[-1], ext = os.path.splitext(parts[-1])
-            assert ext == self.ext, "ext={0!r}!={1!r}".format(ext, self.ext)
-
-        version = variant = None
-        if len(parts) == 1:
-            name = parts[0]
-        elif len(parts) == 2:
-            name, version = parts
-        elif len(parts) == 3:
-            name, version, variant = parts
-        else:
-            name = os.path.join(*parts)
-
+        name, version, variant = split_path(path, self.ext)
         self.name = name
         self.version = Version(version)
         self.variant = Version(variant)
@@ -68,8 +54,7 @@ class Module(object):
 
     @property
     def is_loaded(self):
-        lm_files = [m.filename for m in pymod.mc.get_loaded_modules()]
-        return self.filename in lm_files
+        return pymod.mc.filename_is_loaded(self.filename)
 
     @property
     def is_enabled(self):
@@ -292,14 +277,49 @@ class Module(object):
         return help_string.getvalue().rstrip()
 
 
+def split_path(path, ext=None):
+    """Split the `path` of a modulefile (relative to its MODULEPATH directory)
+    into the module's name, version, and variant"""
+    parts = path.split(os.path.sep)
+    if ext:
+        parts[-1], file_ext = os.path.splitext(parts[-1])
+        assert file_ext == ext, "ext={0!r}!={1!r}".format(file_ext, ext)
+
+    version = variant = None
+    if len(parts) == 1:
+        name = parts[0]
+    elif len(parts) == 2:
+        name, version = parts
+    elif len(parts) == 3:
+        name, version, variant = parts
+    else:
+        name = os.path.join(*parts)
+    return name, version, variant
+
+
 class PyModule(Module):
     ext = ".py"
 
-    def __init__(self, modulepath, *parts):
+    def __init__(self, modulepath, *parts, **kwargs):
         # strip the file extension off the last part and call class initializer
-        super(PyModule, self).__init__(modulepath, *parts)
-        self.metadata = MetaData()
-        self.metadata.parse(self.filename)
+        super(PyModule, self).__init__(modulepath, *parts, **kwargs)
+        self._metadata = None
+        self._metadata_mtime = None
+
+    @property
+    def metadata(self):
+        """The module's meta data, read on first access and again if the
+        modulefile has been modified since"""
+        try:
+            mtime = os.path.getmtime(self.filename)
+        except OSError:  # pragma: no cover
+            mtime = None
+        if self._metadata is None or mtime != self._metadata_mtime:
+            metadata = MetaData()
+            metadata.parse(self.filename)
+            self._metadata = metadata
+            self._metadata_mtime = mtime
+        return self._metadata
 
     @property
     def is_enabled(self):
@@ -312,10 +332,14 @@ class PyModule(Module):
 class TclModule(Module):
 
     def read(self, mode):
-        if not pymod.config.has_tclsh:  # pragma: no cover
-            raise TCLSHNotFoundError
+        # The TCL translators are only imported by commands executing TCL
+        # modules
+        from pymod.module.tcl2py import tcl2py, TCLSHNotFoundError
+
         try:
             return tcl2py(self, mode)
+        except TCLSHNotFoundError:  # pragma: no cover
+            raise
         except Exception as e:  # pragma: no cover
             tty.die(e.args[0])
             return ""
@@ -362,6 +386,3 @@ def Boolean(value):
         value = None
     return value
 
-
-class TCLSHNotFoundError(Exception):
-    pass
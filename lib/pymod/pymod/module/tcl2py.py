@@ -1,26 +1,75 @@
 import os
+import re
+import json
+import time
+import hashlib
 
 import pymod.mc
 import pymod.modes
 import pymod.paths
 import pymod.names
+import pymod.config
+import pymod.timer
 import pymod.environ
+import pymod.module.tclworker
+from pymod.module.tclinterp import translate, TclUnsupportedError
+from pymod.module.tclworker import TclshWorkerError
+from pymod.util.filesystem import write_atomic
 from spack.util.executable import Executable
 
+import llnl.util.tty as tty
 
-def tcl2py(module, mode):
-    tcl2py_exe = os.path.join(pymod.paths.bin_path, "tcl2py.tcl")
-    tcl2py = Executable(tcl2py_exe)
 
+@pymod.timer.timed("tcl2py")
+def tcl2py(module, mode):
     env = pymod.environ.filtered(include_os=True)
 
     mode = pymod.modes.as_string(mode)
     mode = {"show": "display"}.get(mode, mode)
 
-    args = []
     # loaded modules
     loaded_modules = pymod.mc.get_loaded_modules()
     lm_names = list(set([x for m in loaded_modules for x in [m.name, m.fullname]]))
+
+    if pymod.config.get("native_tcl"):
+        try:
+            with pymod.timer.span("tcl2py.native", module=module.fullname):
+                return translate(
+                    module.filename, mode, module.fullname, module.name, lm_names, env
+                )
+        except TclUnsupportedError as e:
+            tty.debug("Translating {0} with tclsh: {1}".format(module.filename, e))
+
+    if not pymod.config.has_tclsh():  # pragma: no cover
+        raise TCLSHNotFoundError
+
+    key = None
+    if pymod.config.get("tcl_translation_cache"):
+        key = translation_key(module, mode, lm_names, env)
+    if key is not None:
+        filename = pymod.paths.join_user(os.path.join("tcl2py", key), cache=True)
+        if os.path.isfile(filename):
+            with open(filename) as fh:
+                output = fh.read()
+            try:
+                # Mark the translation as used, see `prune_translations`
+                os.utime(filename, None)
+            except OSError:  # pragma: no cover
+                pass
+            return output
+
+    output = tclsh_tcl2py(module, mode, lm_names, env)
+    if key is not None and write_atomic(filename, output):
+        prune_translations(os.path.dirname(filename))
+    return output
+
+
+@pymod.timer.timed("tcl2py.tclsh")
+def tclsh_tcl2py(module, mode, lm_names, env):
+    tcl2py_exe = os.path.join(pymod.paths.bin_path, "tcl2py.tcl")
+    tcl2py = Executable(tcl2py_exe)
+
+    args = []
     args.extend(("-l", ":".join(lm_names)))
     args.extend(("-f", module.fullname))
     args.extend(("-m", mode))
@@ -37,19 +86,153 @@ def tcl2py(module, mode):
 
     args.append(module.filename)
 
+    if pymod.config.get("tclsh_worker"):
+        try:
+            return pymod.module.tclworker.translate(args, env)
+        except TclshWorkerError as e:
+            # Errors are reported by running tcl2py.tcl directly
+            tty.debug("Translating {0}: {1}".format(module.filename, e))
+
     kwargs = {"env": env, "output": str}
-    output = tcl2py(*args, **kwargs)
-    #  name = module.name
-    #  family = None
-    #  if name.endswith('python'):
-    #      family = 'python'
-    #  elif name.startswith(('gcc', 'intel', 'pgi')):
-    #      family = 'compiler'
-    #  elif name.startswith(('openmpi', 'mpich', )):
-    #      family = 'mpi'
-    #  else:
-    #      family = None
-    #
-    #  if family is not None:
-    #      output = 'family("{0}")\n'.format(family) + output
-    return output
+    return tcl2py(*args, **kwargs)
+
+
+#: Commands whose results depend on more than the inputs of the translation
+uncacheable = re.compile(
+    r"(^|[\[;{])\s*(exec|glob|file|open|read|gets|clock|pwd|cd|source|uname"
+    r"|socket|after|upvar|uplevel|array|eval|subst|interp|info\s+hostname)\b"
+    r"|\btcl_platform\b",
+    re.MULTILINE,
+)
+env_reference = re.compile(r"\benv\(([A-Za-z0-9_]+)\)")
+env_other = re.compile(r"\benv\b(?!\([A-Za-z0-9_]+\))")
+global_command = re.compile(r"\bglobal\b[^\n;]*")
+
+
+class Scan(object):
+    """What the translation of a modulefile depends on, found by scanning it.
+
+    Attributes
+    ----------
+    digest : str
+        The SHA1 digest of the modulefile's contents
+    cacheable : bool
+        False if the modulefile runs commands, reads files, or reads the
+        environment other than through ``env(NAME)``
+    env_names : list of str
+        The environment variables read through ``env(NAME)``
+    uses_is_loaded, uses_module_info : bool
+        Whether ``is-loaded`` and ``module-info`` are used
+
+    """
+
+    def __init__(self, contents):
+        text = contents.decode("utf-8", "replace")
+        self.digest = hashlib.sha1(contents).hexdigest()
+        self.cacheable = not (
+            uncacheable.search(text)
+            # env is used other than as env(NAME), eg env($name)
+            or env_other.search(global_command.sub("", text))
+        )
+        self.env_names = sorted(set(env_reference.findall(text)))
+        self.uses_is_loaded = "is-loaded" in text
+        self.uses_module_info = "module-info" in text
+
+
+#: Scans of modulefiles by (filename, size, mtime)
+_scans = {}
+
+
+def scan(filename):
+    """The `Scan` of the modulefile `filename`, or None if it cannot be read.
+    A modulefile is scanned once per modification."""
+    try:
+        st = os.stat(filename)
+    except OSError:  # pragma: no cover
+        return None
+    key = (filename, st.st_size, st.st_mtime)
+    if key not in _scans:
+        try:
+            with open(filename, "rb") as fh:
+                _scans[key] = Scan(fh.read())
+        except IOError:  # pragma: no cover
+            return None
+    return _scans[key]
+
+
+def hash_inputs(scan, module, *inputs):
+    tcl2py_exe = os.path.join(pymod.paths.bin_path, "tcl2py.tcl")
+    inputs = [
+        scan.digest,
+        os.path.getmtime(tcl2py_exe),
+        module.filename,
+        module.fullname,
+        module.name,
+    ] + list(inputs)
+    return hashlib.sha1(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+
+def translation_key(module, mode, lm_names, env):
+    """Key of the cached translation of `module`, or None if its translation
+    cannot be cached.
+
+    The key is computed from the contents of the modulefile and the inputs the
+    translation depends on: the mode, the module's names, the names of loaded
+    modules (only if ``is-loaded`` is used), the environment variables the
+    modulefile reads, and the ``-L`` and ``-P`` arguments to ``tcl2py.tcl``.
+    Modulefiles that run commands, read files, or read the environment other
+    than through ``env(NAME)`` are not cached.
+
+    """
+    s = scan(module.filename)
+    if s is None or not s.cacheable:
+        return None
+    return hash_inputs(
+        s,
+        module,
+        mode,
+        sorted(lm_names) if s.uses_is_loaded else None,
+        env.get(pymod.names.platform_ld_library_path),
+        env.get(pymod.names.ld_preload),
+        [(name, env.get(name)) for name in s.env_names],
+    )
+
+
+def replay_key(module):
+    """Key of the translation of `module` in any mode, or None if the
+    translation may depend on more than the modulefile.
+
+    Translations of modulefiles that use ``module-info`` or ``is-loaded``, or
+    read the environment, can differ from one mode to another, or as modules
+    are loaded, and have no key.  See `pymod.mc.replay`.
+
+    """
+    s = scan(module.filename)
+    if s is None or not s.cacheable or s.env_names:
+        return None
+    if s.uses_module_info or s.uses_is_loaded:
+        return None
+    return hash_inputs(s, module)
+
+
+def prune_translations(dirname):
+    """Remove the cached translations in `dirname` not used in the last
+    ``tcl_translation_cache_days`` days.  Every change to a modulefile, to the
+    environment variables it reads or, if it uses ``is-loaded``, to the loaded
+    modules gives its translation a new key, so translations that are no
+    longer used would otherwise accumulate."""
+    days = pymod.config.get("tcl_translation_cache_days")
+    if not days:
+        return
+    cutoff = time.time() - days * 86400
+    for basename in os.listdir(dirname):
+        filename = os.path.join(dirname, basename)
+        try:
+            if os.path.getmtime(filename) < cutoff:
+                os.remove(filename)
+        except OSError as e:  # pragma: no cover
+            tty.debug("Failed to remove {0}: {1}".format(filename, e))
+
+
+class TCLSHNotFoundError(Exception):
+    pass
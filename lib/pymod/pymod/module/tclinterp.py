@@ -0,0 +1,1023 @@
+"""In-process translation of TCL modulefiles.
+
+``bin/tcl2py.tcl`` sources a TCL modulefile in ``tclsh`` and writes the Python
+equivalent of each modulefile command to stdout.  Starting ``tclsh`` for every
+modulefile is expensive, so the subset of TCL commonly found in modulefiles is
+evaluated here, producing the same Python as ``tcl2py.tcl``.
+
+Anything outside of that subset raises a ``TclUnsupportedError`` and the caller
+falls back to ``tcl2py.tcl``.  Errors in the modulefile are treated the same
+way, so that the error messages reported are those of ``tclsh``.  Evaluation
+has no side effects outside of the interpreter, so falling back is always
+safe.
+"""
+import io
+import re
+import fnmatch
+
+whitespace = " \t\v\f\r"
+
+_name = re.compile(r"(?:[A-Za-z0-9_]|::)+")
+_array = re.compile(r"^([^(]+)\((.*)\)$", re.DOTALL)
+_int = re.compile(
+    r"^\s*[+-]?(0[xX][0-9a-fA-F]+|0[bB][01]+|0[oO][0-7]+|[1-9][0-9]*|0)\s*$"
+)
+_octal = re.compile(r"^\s*[+-]?0[0-9]+\s*$")
+_float = re.compile(r"^\s*[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?\s*$")
+_special = re.compile(r"^\s*[+-]?(inf|infinity|nan)\s*$", re.IGNORECASE)
+
+_escapes = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+}
+
+_booleans = {
+    "1": True,
+    "0": False,
+    "true": True,
+    "false": False,
+    "yes": True,
+    "no": False,
+    "on": True,
+    "off": False,
+}
+
+
+def translate(filename, mode, fullname, name, loaded, env, shell="bash"):
+    """Translate the TCL modulefile `filename` to Python
+
+    The arguments mirror the options of ``tcl2py.tcl``.  ``TclUnsupportedError``
+    is raised if the modulefile cannot be translated in process.
+
+    """
+    try:
+        with io.open(filename, encoding="utf-8") as fh:
+            text = fh.read()
+    except UnicodeDecodeError:
+        raise TclUnsupportedError("{0} is not utf-8 encoded".format(filename))
+    interp = Interpreter(filename, mode, fullname, name, loaded, env, shell)
+    return interp.source(text)
+
+
+class Interpreter(object):
+    """Evaluate a modulefile as the ``__modname`` interpreter created by
+    ``tcl2py.tcl`` would, collecting its output"""
+
+    def __init__(self, filename, mode, fullname, name, loaded, env, shell):
+        self.mode = mode
+        self.fullname = fullname
+        self.name = name
+        self.loaded = dict([(x, True) for x in loaded])
+        self.env = dict(env)
+        # Variables removed from env by unsetenv.  tcl2py.tcl unsets them in
+        # its own interpreter, not in the modulefile's, where `info exists`
+        # still finds them although they cannot be read
+        self.unset_env = set()
+        self.shell = shell
+        self.put_mode = "normal"
+        self.output = []
+        self.procs = {}
+        self.frames = [{"env": self.env, "ModulesCurrentModulefile": filename}]
+        self.frames[0]["g_help"] = "0"
+        self.links = [{}]
+        self.commands = {
+            # Commands aliased to tcl2py.tcl
+            "family": self.family,
+            "setenv": self.setenv,
+            "pushenv": self.pushenv,
+            "unsetenv": self.unsetenv,
+            "system": self.system,
+            "append-path": lambda args: self.path_command("append_path", args),
+            "prepend-path": lambda args: self.path_command("prepend_path", args),
+            "remove-path": lambda args: self.path_command("remove_path", args),
+            "prereq": lambda args: self.cmdargs("prereq_any", *args),
+            "prereq-any": lambda args: self.cmdargs("prereq_any", *args),
+            "conflict": lambda args: self.cmdargs("conflict", *args),
+            "is-loaded": self.is_loaded,
+            "module": self.module,
+            "setPutMode": self.set_put_mode,
+            "puts": self.puts,
+            "module-info": self.module_info,
+            "module-whatis": self.module_whatis,
+            "set-alias": lambda args: self.cmdargs("set_alias", *arity(args, 2)),
+            "unset-alias": lambda args: self.cmdargs("unset_alias", *arity(args, 1)),
+            "add-property": lambda args: self.cmdargs("add_property", *arity(args, 2)),
+            "remove-property": lambda args: self.cmdargs(
+                "remove_property", *arity(args, 2)
+            ),
+            # TCL builtins
+            "append": self.append,
+            "break": self.break_,
+            "continue": self.continue_,
+            "expr": lambda args: self.expr(" ".join(args), format=True),
+            "foreach": self.foreach,
+            "global": self.global_,
+            "if": self.if_,
+            "incr": self.incr,
+            "info": self.info,
+            "proc": self.proc,
+            "return": self.return_,
+            "set": self.set,
+            "string": self.string,
+            "unset": self.unset,
+        }
+
+    def source(self, text):
+        try:
+            self.eval(text)
+        except Return:
+            pass
+        except Break:
+            self.write("_break()\n")
+        except Continue:
+            self.write("_continue()\n")
+        return "".join(self.output)
+
+    def write(self, text):
+        self.output.append(text)
+
+    # --- Parsing and evaluation ------------------------------------------- #
+    def eval(self, script):
+        return self.script(script, 0, False, True)[0]
+
+    def script(self, s, i, bracket, evaluate):
+        """Evaluate the commands in `s`, starting at `i`.  If `bracket`, the
+        script is a command substitution and ends at the closing bracket.  If
+        not `evaluate`, the script is only parsed."""
+        n = len(s)
+        result = ""
+        while True:
+            while i < n:
+                if s[i] in whitespace or s[i] in "\n;":
+                    i += 1
+                elif s.startswith("\\\n", i):
+                    i = continuation(s, i)
+                else:
+                    break
+            if i >= n:
+                if bracket:
+                    raise TclUnsupportedError("missing close-bracket")
+                return result, i
+            if bracket and s[i] == "]":
+                return result, i + 1
+            if s[i] == "#":
+                i = comment(s, i)
+                continue
+            words, i = self.words(s, i, bracket, evaluate)
+            if evaluate and words:
+                result = self.invoke(words)
+
+    def words(self, s, i, bracket, evaluate):
+        n = len(s)
+        words = []
+        while i < n:
+            c = s[i]
+            if c in whitespace:
+                i += 1
+            elif s.startswith("\\\n", i):
+                i = continuation(s, i)
+            elif c in "\n;":
+                return words, i + 1
+            elif bracket and c == "]":
+                return words, i
+            else:
+                word, i = self.word(s, i, bracket, evaluate)
+                words.append(word)
+        return words, i
+
+    def word(self, s, i, bracket, evaluate):
+        if s[i] == "{":
+            if s.startswith("{*}", i):
+                raise TclUnsupportedError("argument expansion is not supported")
+            word, i = braced(s, i)
+        elif s[i] == '"':
+            word, i = self.quoted(s, i, evaluate)
+        else:
+            return self.bare(s, i, bracket, evaluate)
+        if i < len(s) and not (
+            s[i] in whitespace
+            or s[i] in "\n;"
+            or (bracket and s[i] == "]")
+            or s.startswith("\\\n", i)
+        ):
+            raise TclUnsupportedError("extra characters after close-quote")
+        return word, i
+
+    def quoted(self, s, i, evaluate):
+        n = len(s)
+        parts = []
+        i += 1
+        while i < n:
+            c = s[i]
+            if c == '"':
+                return "".join(parts), i + 1
+            part, i = self.substitution(s, i, evaluate)
+            parts.append(part)
+        raise TclUnsupportedError("missing close-quote")
+
+    def bare(self, s, i, bracket, evaluate):
+        n = len(s)
+        parts = []
+        while i < n:
+            c = s[i]
+            if (
+                c in whitespace
+                or c in "\n;"
+                or (bracket and c == "]")
+                or s.startswith("\\\n", i)
+            ):
+                break
+            part, i = self.substitution(s, i, evaluate)
+            parts.append(part)
+        return "".join(parts), i
+
+    def substitution(self, s, i, evaluate):
+        """Perform the substitution, if any, starting at s[i]"""
+        c = s[i]
+        if c == "\\":
+            return backslash(s, i)
+        elif c == "$":
+            return self.variable(s, i, evaluate)
+        elif c == "[":
+            return self.script(s, i + 1, True, evaluate)
+        return c, i + 1
+
+    def variable(self, s, i, evaluate):
+        n = len(s)
+        i += 1
+        if i < n and s[i] == "{":
+            end = s.find("}", i)
+            if end < 0:
+                raise TclUnsupportedError("missing close-brace for variable name")
+            name = s[i + 1 : end]
+            return (self.get(name) if evaluate else ""), end + 1
+        match = _name.match(s, i)
+        if match is None:
+            return "$", i
+        name, i = match.group(), match.end()
+        if i < n and s[i] == "(":
+            parts = []
+            i += 1
+            while i < n and s[i] != ")":
+                part, i = self.substitution(s, i, evaluate)
+                parts.append(part)
+            if i >= n:
+                raise TclUnsupportedError("missing )")
+            index = "".join(parts)
+            return (self.get(name, index) if evaluate else ""), i + 1
+        return (self.get(name) if evaluate else ""), i
+
+    def invoke(self, words):
+        name = words[0]
+        if name.startswith("::"):
+            name = name[2:]
+        if name in self.procs:
+            return self.call(name, words[1:])
+        command = self.commands.get(name)
+        if command is None:
+            raise TclUnsupportedError("{0}: unsupported command".format(name))
+        result = command(words[1:])
+        return "" if result is None else result
+
+    def split_list(self, s):
+        """Split the TCL list `s` in to its elements"""
+        n = len(s)
+        items = []
+        i = 0
+        while True:
+            while i < n and (s[i] in whitespace or s[i] == "\n"):
+                i += 1
+            if i >= n:
+                return items
+            if s[i] == "{":
+                item, i = braced(s, i)
+            elif s[i] == '"':
+                parts = []
+                i += 1
+                while i < n and s[i] != '"':
+                    part, i = backslash(s, i) if s[i] == "\\" else (s[i], i + 1)
+                    parts.append(part)
+                if i >= n:
+                    raise TclUnsupportedError("unmatched open quote in list")
+                item, i = "".join(parts), i + 1
+            else:
+                parts = []
+                while i < n and not (s[i] in whitespace or s[i] == "\n"):
+                    part, i = backslash(s, i) if s[i] == "\\" else (s[i], i + 1)
+                    parts.append(part)
+                items.append("".join(parts))
+                continue
+            if i < n and not (s[i] in whitespace or s[i] == "\n"):
+                raise TclUnsupportedError("list element followed by garbage")
+            items.append(item)
+
+    # --- Variables and procedures ----------------------------------------- #
+    def frame(self, name):
+        """The frame holding variable `name`, and the unqualified name"""
+        if name.startswith("::"):
+            frame, name = self.frames[0], name[2:]
+        elif name in self.links[-1]:
+            frame = self.frames[0]
+        else:
+            frame = self.frames[-1]
+        if "::" in name:
+            raise TclUnsupportedError("namespaces are not supported")
+        return frame, name
+
+    def get(self, name, index=None):
+        if index is None:
+            match = _array.match(name)
+            if match is not None:
+                name, index = match.groups()
+        frame, name = self.frame(name)
+        value = frame.get(name)
+        if index is not None:
+            value = value.get(index) if isinstance(value, dict) else None
+        if value is None or isinstance(value, dict):
+            raise TclUnsupportedError("can't read {0}".format(name))
+        return value
+
+    def exists(self, name):
+        index = None
+        match = _array.match(name)
+        if match is not None:
+            name, index = match.groups()
+        frame, name = self.frame(name)
+        value = frame.get(name)
+        if value is self.env and index in self.unset_env:
+            raise TclUnsupportedError("info exists of a variable unset by unsetenv")
+        if index is not None:
+            return isinstance(value, dict) and index in value
+        return value is not None
+
+    def set(self, args):
+        if len(args) == 1:
+            return self.get(args[0])
+        name, value = arity(args, 2)
+        match = _array.match(name)
+        if match is not None:
+            name, index = match.groups()
+            frame, name = self.frame(name)
+            array = frame.setdefault(name, {})
+            if not isinstance(array, dict):
+                raise TclUnsupportedError("{0} is not an array".format(name))
+            array[index] = value
+        else:
+            frame, name = self.frame(name)
+            if isinstance(frame.get(name), dict):
+                raise TclUnsupportedError("{0} is an array".format(name))
+            frame[name] = value
+        return value
+
+    def unset(self, args):
+        nocomplain = False
+        if args and args[0] == "-nocomplain":
+            nocomplain, args = True, args[1:]
+        if args and args[0] == "--":
+            args = args[1:]
+        for name in args:
+            index = None
+            match = _array.match(name)
+            if match is not None:
+                name, index = match.groups()
+            frame, name = self.frame(name)
+            container = frame if index is None else frame.get(name)
+            key = name if index is None else index
+            if isinstance(container, dict) and key in container:
+                del container[key]
+            elif not nocomplain:
+                raise TclUnsupportedError("can't unset {0}".format(name))
+
+    def append(self, args):
+        if not args:
+            raise TclUnsupportedError("wrong # args: append")
+        value = self.get(args[0]) if self.exists(args[0]) else ""
+        return self.set([args[0], value + "".join(args[1:])])
+
+    def incr(self, args):
+        if len(args) not in (1, 2):
+            raise TclUnsupportedError("wrong # args: incr")
+        value = self.get(args[0]) if self.exists(args[0]) else "0"
+        increment = args[1] if len(args) == 2 else "1"
+        value, increment = integer(value), integer(increment)
+        if value is None or increment is None:
+            raise TclUnsupportedError("expected integer")
+        return self.set([args[0], str(value + increment)])
+
+    def global_(self, args):
+        if len(self.frames) > 1:
+            for name in args:
+                self.links[-1][name] = True
+
+    def proc(self, args):
+        name, params, body = arity(args, 3)
+        formals = []
+        for param in self.split_list(params):
+            param = self.split_list(param)
+            if len(param) not in (1, 2) or param[0] == "args":
+                raise TclUnsupportedError("unsupported proc arguments")
+            formals.append(param)
+        self.procs[name] = (formals, body)
+
+    def call(self, name, args):
+        formals, body = self.procs[name]
+        if len(args) > len(formals):
+            raise TclUnsupportedError("wrong # args: {0}".format(name))
+        frame = {}
+        for (i, formal) in enumerate(formals):
+            if i < len(args):
+                frame[formal[0]] = args[i]
+            elif len(formal) == 2:
+                frame[formal[0]] = formal[1]
+            else:
+                raise TclUnsupportedError("wrong # args: {0}".format(name))
+        self.frames.append(frame)
+        self.links.append({})
+        try:
+            return self.eval(body)
+        except Return as e:
+            return e.value
+        except (Break, Continue):
+            raise TclUnsupportedError("break or continue outside of a loop")
+        finally:
+            self.frames.pop()
+            self.links.pop()
+
+    # --- Control flow ----------------------------------------------------- #
+    def if_(self, args):
+        i, n = 0, len(args)
+        while True:
+            if i + 1 >= n:
+                raise TclUnsupportedError("wrong # args: if")
+            condition = args[i]
+            i += 1
+            if args[i] == "then":
+                i += 1
+                if i >= n:
+                    raise TclUnsupportedError("wrong # args: if")
+            body = args[i]
+            i += 1
+            if truth(self.expr(condition)):
+                return self.eval(body)
+            if i >= n:
+                return ""
+            if args[i] == "elseif":
+                i += 1
+                continue
+            if args[i] == "else":
+                i += 1
+            if i != n - 1:
+                raise TclUnsupportedError("wrong # args: if")
+            return self.eval(args[i])
+
+    def foreach(self, args):
+        name, items, body = arity(args, 3)
+        if len(self.split_list(name)) != 1:
+            raise TclUnsupportedError("foreach over multiple variables")
+        for item in self.split_list(items):
+            self.set([name, item])
+            try:
+                self.eval(body)
+            except Break:
+                break
+            except Continue:
+                continue
+        return ""
+
+    def break_(self, args):
+        arity(args, 0)
+        raise Break()
+
+    def continue_(self, args):
+        arity(args, 0)
+        raise Continue()
+
+    def return_(self, args):
+        if len(args) > 1:
+            raise TclUnsupportedError("return options are not supported")
+        raise Return(args[0] if args else "")
+
+    # --- Introspection and strings ---------------------------------------- #
+    def info(self, args):
+        if not args or args[0] != "exists":
+            raise TclUnsupportedError("unsupported info subcommand")
+        name = arity(args[1:], 1)[0]
+        return "1" if self.exists(name) else "0"
+
+    def string(self, args):
+        if not args:
+            raise TclUnsupportedError("wrong # args: string")
+        subcommand, args = args[0], args[1:]
+        if subcommand == "match":
+            pattern, string = arity(args, 2)
+            if "[" in pattern or "\\" in pattern:
+                raise TclUnsupportedError("unsupported string match pattern")
+            return "1" if fnmatch.fnmatchcase(string, pattern) else "0"
+        elif subcommand == "equal":
+            a, b = arity(args, 2)
+            return "1" if a == b else "0"
+        elif subcommand == "length":
+            return str(len(arity(args, 1)[0]))
+        elif subcommand == "tolower":
+            return arity(args, 1)[0].lower()
+        elif subcommand == "toupper":
+            return arity(args, 1)[0].upper()
+        raise TclUnsupportedError("unsupported string subcommand")
+
+    # --- Expressions ------------------------------------------------------ #
+    def expr(self, text, format=False):
+        parser = ExpressionParser(self, text)
+        value = parser.parse()
+        if not format:
+            return value
+        if isinstance(value, int):
+            return str(value)
+        number = numeric(value)
+        if number is not None and (
+            not isinstance(number, int) or str(number) != value.strip()
+        ):
+            raise TclUnsupportedError("unsupported numeric format")
+        return value
+
+    # --- Modulefile commands ---------------------------------------------- #
+    def cmdargs(self, cmd, *args):
+        args = ['"{0}"'.format(arg.replace('"', '\\"')) for arg in args if arg != ""]
+        self.write("{0}({1})\n".format(cmd, ",".join(args)))
+
+    def family(self, args):
+        self.cmdargs("family", *arity(args, 1))
+
+    def setenv(self, args):
+        if len(args) < 2:
+            raise TclUnsupportedError("wrong # args: setenv")
+        var, val, rest = args[0], args[1], args[2:]
+        if var in ("-respect", "-r", "--respect"):
+            var = rest[0] if rest else ""
+            val = rest[1] if len(rest) > 1 else ""
+            self.cmdargs("setenv", var, val, "true")
+            return
+        if self.mode == "load":
+            self.env[var] = val
+            self.unset_env.discard(var)
+        self.cmdargs("setenv", var, val)
+
+    def unsetenv(self, args):
+        if len(args) not in (1, 2):
+            raise TclUnsupportedError("wrong # args: unsetenv")
+        var = args[0]
+        val = args[1] if len(args) == 2 else ""
+        if self.mode == "load" and var in self.env:
+            self.env.pop(var)
+            self.unset_env.add(var)
+        elif self.mode == "remove" and val != "":
+            self.env[var] = val
+        self.cmdargs("unsetenv", var, val)
+
+    def pushenv(self, args):
+        var, val = arity(args, 2)
+        self.env[var] = val
+        self.unset_env.discard(var)
+        self.cmdargs("pushenv", var, val)
+
+    def path_command(self, cmd, args):
+        if len(args) < 2:
+            raise TclUnsupportedError("wrong # args: {0}".format(cmd))
+        var, val, rest = args[0], args[1], args[2:]
+        if var.startswith("--delim="):
+            separator = var[8:]
+            var, val = val, rest[0] if rest else ""
+        elif var in ("-delim", "-d", "--delim"):
+            separator = val
+            var = rest[0] if rest else ""
+            val = rest[1] if len(rest) > 1 else ""
+        else:
+            separator = ":"
+        self.write('{0}("{1}", "{2}", sep="{3}")\n'.format(cmd, var, val, separator))
+
+    def system(self, args):
+        if not args:
+            raise TclUnsupportedError("wrong # args: system")
+        self.write('execute("{0}")\n'.format(" ".join(args)))
+
+    def is_loaded(self, args):
+        return "1" if arity(args, 1)[0] in self.loaded else "0"
+
+    def set_put_mode(self, args):
+        self.put_mode = arity(args, 1)[0]
+
+    def puts(self, args):
+        nonewline = False
+        if len(args) == 1:
+            channel, text = "stdout", args[0]
+        elif len(args) == 2:
+            if args[0] == "-nonewline":
+                nonewline, channel = True, "stdout"
+            else:
+                channel = args[0]
+            text = args[1]
+        elif len(args) == 3 and "-nonewline" in args[:2]:
+            nonewline = True
+            channel = args[1] if args[0] == "-nonewline" else args[0]
+            text = args[2]
+        else:
+            raise TclUnsupportedError("wrong # args: puts")
+        if channel not in ("stdout", "stderr"):
+            raise TclUnsupportedError("writing to channels is not supported")
+        if self.put_mode != "to-console":
+            text = 'log_info("{0}")'.format(text)
+        self.write(text if nonewline else text + "\n")
+
+    def module_info(self, args):
+        if len(args) not in (1, 2):
+            raise TclUnsupportedError("wrong # args: module-info")
+        what = args[0]
+        more = args[1] if len(args) == 2 else ""
+        if what == "mode":
+            if more != "":
+                return "1" if self.mode == more else "0"
+            return self.mode
+        elif what in ("shell", "shelltype"):
+            return self.shell
+        elif what == "flags":
+            return "0"
+        elif what == "name":
+            return self.fullname
+        elif what == "specified":
+            return self.name
+        elif what == "version":
+            dir, rest = re.match(r"([^/]*)/?(.*)", more, re.DOTALL).groups()
+            return "{0}/{1}".format(dir, rest or "default")
+        raise TclUnsupportedError("module-info {0} not supported".format(what))
+
+    def module_whatis(self, args):
+        # tcl2py.tcl replaces newlines in a copy of the message it does not use
+        msg = "".join([arg + " " for arg in args])
+        self.write('whatis("""{0}""")\n'.format(msg))
+
+    def module(self, args):
+        if not args:
+            raise TclUnsupportedError("wrong # args: module")
+        command, args = args[0], args[1:]
+        if command in ("load", "add"):
+            self.cmdargs("load", *args)
+        elif command in ("switch", "swap"):
+            if len(args) not in (1, 2):
+                raise TclUnsupportedError("wrong # args: module swap")
+            old = args[0]
+            new = args[1] if len(args) == 2 and args[1] != "" else old
+            self.cmdargs("swap", *(reparsed(old) + reparsed(new)))
+        elif command == "try-add":
+            self.cmdargs("try_load", *args)
+        elif command in ("unload", "del", "rm"):
+            self.cmdargs("load" if self.mode == "remove" else "unload", *args)
+        elif command == "use":
+            path_cmd = "prepend_path"
+            for path in args:
+                if path == "":
+                    continue
+                elif path in ("--append", "-a", "-append"):
+                    path_cmd = "append_path"
+                elif path in ("--prepend", "-p", "-prepend"):
+                    path_cmd = "prepend_path"
+                else:
+                    self.cmdargs(path_cmd, "MODULEPATH", *reparsed(path))
+        elif command == "unuse":
+            for path in args:
+                self.cmdargs("remove_path", "MODULEPATH", *reparsed(path))
+
+
+class ExpressionParser(object):
+    """Recursive descent parser for the subset of ``expr`` used in
+    modulefiles.  Operands are substituted only when they are evaluated, so
+    that ``&&`` and ``||`` short circuit as they do in TCL."""
+
+    operators = ("&&", "||", "==", "!=", "<=", ">=", "<", ">", "+", "-", "*", "/")
+    operators += ("%", "!", "(", ")")
+
+    def __init__(self, interp, text):
+        self.interp = interp
+        self.tokens = self.tokenize(text)
+        self.pos = 0
+
+    def tokenize(self, s):
+        interp = self.interp
+        tokens = []
+        i, n = 0, len(s)
+        while i < n:
+            c = s[i]
+            if c in whitespace or c == "\n":
+                i += 1
+            elif c.isdigit() or (c == "." and s[i + 1 : i + 2].isdigit()):
+                match = re.compile(r"[0-9A-Za-z_.]+").match(s, i)
+                literal = match.group()
+                if numeric(literal) is None:
+                    raise TclUnsupportedError("invalid number {0}".format(literal))
+                tokens.append(("value", const(literal)))
+                i = match.end()
+            elif c == "$":
+                value, j = interp.variable(s, i, False)
+                if value == "$":
+                    raise TclUnsupportedError("invalid character $ in expression")
+                tokens.append(("value", delayed(interp.variable, s, i)))
+                i = j
+            elif c == "[":
+                _, j = interp.script(s, i + 1, True, False)
+                tokens.append(("value", delayed(interp.script, s, i + 1, True)))
+                i = j
+            elif c == '"':
+                _, j = interp.quoted(s, i, False)
+                tokens.append(("value", delayed(interp.quoted, s, i)))
+                i = j
+            elif c == "{":
+                literal, i = braced(s, i)
+                tokens.append(("value", const(literal)))
+            elif c.isalpha():
+                match = re.compile(r"[A-Za-z_]+").match(s, i)
+                word = match.group()
+                if word in ("eq", "ne"):
+                    tokens.append(("op", word))
+                elif word.lower() in _booleans:
+                    tokens.append(("value", const(word)))
+                else:
+                    raise TclUnsupportedError("unsupported expression {0}".format(word))
+                i = match.end()
+            else:
+                for op in self.operators:
+                    if s.startswith(op, i):
+                        break
+                else:
+                    raise TclUnsupportedError("unsupported operator {0}".format(c))
+                if s.startswith(("**", "<<", ">>", "&", "|"), i) and op not in (
+                    "&&",
+                    "||",
+                ):
+                    raise TclUnsupportedError("unsupported operator")
+                tokens.append(("op", op))
+                i += len(op)
+        return tokens
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def take(self, *ops):
+        kind, op = self.peek()
+        if kind == "op" and op in ops:
+            self.pos += 1
+            return op
+        return None
+
+    def parse(self):
+        node = self.or_()
+        if self.pos != len(self.tokens):
+            raise TclUnsupportedError("syntax error in expression")
+        return evaluate(node)
+
+    def or_(self):
+        node = self.and_()
+        while self.take("||"):
+            node = ("||", node, self.and_())
+        return node
+
+    def and_(self):
+        node = self.string_equality()
+        while self.take("&&"):
+            node = ("&&", node, self.string_equality())
+        return node
+
+    def string_equality(self):
+        node = self.equality()
+        op = self.take("eq", "ne")
+        while op:
+            node = (op, node, self.equality())
+            op = self.take("eq", "ne")
+        return node
+
+    def equality(self):
+        node = self.relational()
+        op = self.take("==", "!=")
+        while op:
+            node = (op, node, self.relational())
+            op = self.take("==", "!=")
+        return node
+
+    def relational(self):
+        node = self.additive()
+        op = self.take("<", ">", "<=", ">=")
+        while op:
+            node = (op, node, self.additive())
+            op = self.take("<", ">", "<=", ">=")
+        return node
+
+    def additive(self):
+        node = self.multiplicative()
+        op = self.take("+", "-")
+        while op:
+            node = (op, node, self.multiplicative())
+            op = self.take("+", "-")
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        op = self.take("*", "/", "%")
+        while op:
+            node = (op, node, self.unary())
+            op = self.take("*", "/", "%")
+        return node
+
+    def unary(self):
+        op = self.take("!", "-", "+")
+        if op:
+            return ("unary" + op, self.unary())
+        return self.primary()
+
+    def primary(self):
+        if self.take("("):
+            node = self.or_()
+            if not self.take(")"):
+                raise TclUnsupportedError("missing close parenthesis")
+            return node
+        kind, value = self.peek()
+        if kind != "value":
+            raise TclUnsupportedError("syntax error in expression")
+        self.pos += 1
+        return ("value", value)
+
+
+def evaluate(node):
+    op = node[0]
+    if op == "value":
+        return node[1]()
+    elif op == "unary!":
+        return 0 if truth(evaluate(node[1])) else 1
+    elif op in ("unary-", "unary+"):
+        value = integer(evaluate(node[1]))
+        if value is None:
+            raise TclUnsupportedError("unsupported operand")
+        return -value if op == "unary-" else value
+    elif op == "&&":
+        return 1 if truth(evaluate(node[1])) and truth(evaluate(node[2])) else 0
+    elif op == "||":
+        return 1 if truth(evaluate(node[1])) or truth(evaluate(node[2])) else 0
+    a, b = evaluate(node[1]), evaluate(node[2])
+    if op in ("eq", "ne"):
+        equal = str(a) == str(b)
+        return int(equal if op == "eq" else not equal)
+    elif op in ("==", "!=", "<", ">", "<=", ">="):
+        x, y = numeric(a), numeric(b)
+        if x is None or y is None:
+            x, y = str(a), str(b)
+        result = {
+            "==": x == y,
+            "!=": x != y,
+            "<": x < y,
+            ">": x > y,
+            "<=": x <= y,
+            ">=": x >= y,
+        }[op]
+        return int(result)
+    x, y = integer(a), integer(b)
+    if x is None or y is None:
+        raise TclUnsupportedError("unsupported operand")
+    if op == "+":
+        return x + y
+    elif op == "-":
+        return x - y
+    elif op == "*":
+        return x * y
+    if y == 0:
+        raise TclUnsupportedError("divide by zero")
+    return x // y if op == "/" else x % y
+
+
+def numeric(value):
+    """The number represented by `value`, or None if it is not a number"""
+    if isinstance(value, int):
+        return value
+    if _octal.match(value) or _special.match(value):
+        raise TclUnsupportedError("unsupported number {0}".format(value))
+    if _int.match(value):
+        return int(value.strip(), 0)
+    if _float.match(value):
+        return float(value)
+    return None
+
+
+def integer(value):
+    number = numeric(value)
+    if isinstance(number, float):
+        raise TclUnsupportedError("floating point arithmetic is not supported")
+    return number
+
+
+def truth(value):
+    number = numeric(value)
+    if number is not None:
+        return number != 0
+    boolean = _booleans.get(value.lower())
+    if boolean is None:
+        raise TclUnsupportedError("expected boolean value but got {0}".format(value))
+    return boolean
+
+
+def const(value):
+    return lambda: value
+
+
+def delayed(fun, *args):
+    return lambda: fun(*(args + (True,)))[0]
+
+
+def arity(args, n):
+    if len(args) != n:
+        raise TclUnsupportedError("wrong # args")
+    return args
+
+
+def reparsed(word):
+    """``tcl2py.tcl`` passes some arguments through ``eval``, which splits them
+    again.  Only words that are unchanged by doing so are supported"""
+    if re.search(r'[\s{}\[\]$"\\;#]', word):
+        raise TclUnsupportedError("unsupported characters in {0}".format(word))
+    return [word] if word else []
+
+
+def braced(s, i):
+    """The contents of the braced word starting at s[i]"""
+    n = len(s)
+    depth = 0
+    parts = []
+    start = j = i
+    while j < n:
+        c = s[j]
+        if c == "\\":
+            if s.startswith("\\\n", j):
+                parts.append(s[start:j] + " ")
+                start = j = continuation(s, j)
+                continue
+            j += 2
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                parts.append(s[start:j])
+                return "".join(parts)[1:], j + 1
+        j += 1
+    raise TclUnsupportedError("missing close-brace")
+
+
+def backslash(s, i):
+    if i + 1 >= len(s):
+        return "\\", i + 1
+    c = s[i + 1]
+    if c == "\n":
+        return " ", continuation(s, i)
+    if c in "xuU01234567":
+        raise TclUnsupportedError("unsupported backslash sequence")
+    return _escapes.get(c, c), i + 2
+
+
+def continuation(s, i):
+    """Skip the backslash-newline at s[i] and the whitespace following it"""
+    i += 2
+    while i < len(s) and s[i] in " \t":
+        i += 1
+    return i
+
+
+def comment(s, i):
+    n = len(s)
+    while i < n:
+        if s[i] == "\\":
+            i += 2
+        elif s[i] == "\n":
+            return i + 1
+        else:
+            i += 1
+    return i
+
+
+class Break(Exception):
+    pass
+
+
+class Continue(Exception):
+    pass
+
+
+class Return(Exception):
+    def __init__(self, value):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class TclUnsupportedError(Exception):
+    pass
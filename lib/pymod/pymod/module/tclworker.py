@@ -0,0 +1,88 @@
+"""Persistent ``tclsh`` translating TCL modulefiles.
+
+Translating a modulefile with ``tcl2py.tcl`` starts a new ``tclsh``.  Commands
+that translate many modulefiles (restoring a collection, ``refresh``,
+``purge``, ...) instead send each translation to one ``tclsh`` running
+``tcl2py.tcl -server``, started on first use and stopped when ``modulecmd.py``
+exits.  See ``bin/tcl2py.tcl`` for the protocol.
+"""
+import os
+import atexit
+import subprocess
+
+import pymod.paths
+
+
+class TclshWorker(object):
+    def __init__(self):
+        self.proc = None
+        self.pid = None
+
+    def start(self):
+        exe = os.path.join(pymod.paths.bin_path, "tcl2py.tcl")
+        self.proc = subprocess.Popen(
+            [exe, "-server"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.pid = os.getpid()
+
+    def running(self):
+        # A forked process cannot share the worker of its parent
+        return (
+            self.proc is not None
+            and self.pid == os.getpid()
+            and self.proc.poll() is None
+        )
+
+    def translate(self, args, env):
+        """Translate the modulefile as ``tcl2py.tcl args`` would with the
+        environment `env`"""
+        if not self.running():
+            self.start()
+        fields = list(args)
+        for (key, val) in env.items():
+            fields.extend((key, val))
+        request = ["{0} {1}\n".format(len(args), len(env)).encode("utf-8")]
+        for field in fields:
+            data = field.encode("utf-8")
+            request.append("{0}\n".format(len(data)).encode("utf-8"))
+            request.append(data)
+        try:
+            self.proc.stdin.write(b"".join(request))
+            self.proc.stdin.flush()
+            status, length = [int(x) for x in self.proc.stdout.readline().split()]
+            data = self.proc.stdout.read(length)
+            if len(data) != length:
+                raise ValueError("incomplete reply")
+        except (IOError, OSError, ValueError) as e:
+            self.stop()
+            raise TclshWorkerError("tclsh worker failed: {0}".format(e))
+        if status != 0:
+            raise TclshWorkerError(data.decode("utf-8"))
+        return data.decode("utf-8")
+
+    def stop(self):
+        if self.proc is not None and self.pid == os.getpid():
+            try:
+                self.proc.stdin.close()
+                self.proc.wait()
+            except (IOError, OSError):  # pragma: no cover
+                pass
+        self.proc = None
+
+
+worker = TclshWorker()
+
+
+def translate(args, env):
+    return worker.translate(args, env)
+
+
+def stop():
+    worker.stop()
+
+
+atexit.register(stop)
+
+
+class TclshWorkerError(Exception):
+    pass
@@ -1,7 +1,9 @@
 import os
 
+import pymod.config
 import pymod.module
 import pymod.environ
+from pymod.module.entry import ModuleEntry
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import working_dir
@@ -13,7 +15,40 @@ skip_dirs = (".git", ".svn", "CVS")
 
 
 def find_modules(directory):
-
+    """Find all of the modules in `directory` and below"""
+    directories = find_directories(directory)
+    if directories is None:
+        return None
+    return modules_from_directories(directories[0])
+
+
+def find_directories(directory, cached=None):
+    """Scan `directory` and all of its subdirectories for modulefiles
+
+    Parameters
+    ----------
+    directory : str
+        The MODULEPATH directory
+    cached : dict
+        Directory entries from a previous scan of `directory`
+
+    Returns
+    -------
+    directories : dict
+        directories[reldir] is the entry for the directory `reldir` (relative
+        to `directory`) returned by `read_directory`
+    modified : bool
+        Whether `directories` differs from `cached`
+
+    Notes
+    -----
+    Adding, removing, or renaming a file in a directory updates the
+    directory's modification time.  A cached entry is reused if the
+    directory's modification time is unchanged, otherwise the directory is
+    scanned again.  Validating the cache therefore costs one ``stat`` per
+    directory, and only the directories that changed are read.
+
+    """
     directory = os.path.expanduser(directory)
 
     if directory == "/":
@@ -29,43 +64,167 @@ def find_modules(directory):
         tty.verbose("{0!r} is not a directory".format(directory))
         return None
 
-    return _find(directory)
+    directory = os.path.abspath(directory)
+    cached = cached or {}
+    modified = not cached
+    directories = {}
+
+    # Directories are processed one level at a time so that the directories
+    # of a level (and then the files in them) can be read concurrently.
+    level = [""]
+    while level:
+        entries = parallel_map(lambda x: read_directory(directory, x, cached), level)
+        entries = dict([(r, e) for (r, e) in zip(level, entries) if e is not None])
+        if len(entries) != len(level):  # pragma: no cover
+            modified = True
+        files = []
+        for reldir in level:
+            entry = entries.get(reldir)
+            if entry is not None and "files" in entry:
+                modified = True
+                files.extend([(reldir, f) for f in entry.pop("files")])
+        modules = parallel_map(lambda x: read_module(directory, *x), files)
+        for ((reldir, _), ar) in zip(files, modules):
+            if ar is not None:
+                entries[reldir]["modules"].append(ar)
+
+        next_level = []
+        for reldir in level:
+            entry = entries.get(reldir)
+            if entry is None:  # pragma: no cover
+                continue
+            directories[reldir] = entry
+            next_level.extend(
+                [os.path.join(reldir, d) if reldir else d for d in entry["dirs"]]
+            )
+        level = next_level
 
+    if len(directories) != len(cached):
+        modified = True
 
-def _find(directory):
+    return directories, modified
 
-    defaults = {}
-    dir_modules = {}
-    directory = os.path.abspath(directory)
 
-    for (dirname, dirs, files) in os.walk(directory):
+def read_directory(directory, reldir, cached):
+    """Read the directory `reldir` (relative to `directory`)
 
-        if os.path.basename(dirname) in skip_dirs:
-            del dirs[:]
-            continue
+    If the `cached` entry for `reldir` is current it is returned.  Otherwise,
+    a new entry is returned with the modulefile candidates in "files"; the
+    modules are read by `read_module`.
 
-        explicit_default = pop_marked_default(dirname, files)
-        if explicit_default is not None:
-            key = dirname.replace(directory + os.path.sep, "")
-            defaults[key] = explicit_default
+    """
+    dirname = os.path.join(directory, reldir) if reldir else directory
+    try:
+        mtime = os.stat(dirname).st_mtime
+    except OSError:  # pragma: no cover
+        return None
+    entry = cached.get(reldir)
+    if entry is not None and entry["mtime"] == mtime:
+        return entry
 
-        modulefiles = []
-        for basename in files:
-            if basename.startswith("."):
-                continue
-            f = os.path.join(dirname, basename)
-            path = f.replace(directory + os.path.sep, "")
-            module = pymod.module.factory(directory, path)
-            if module is None:
-                continue
-            modulefiles.append(module)
+    tty.debug("Scanning {0}".format(dirname))
+    cached_modules = {}
+    if entry is not None:
+        cached_modules = dict([(m["file"], m) for m in entry["modules"]])
+
+    try:
+        basenames = sorted(os.listdir(dirname))
+    except OSError as e:
+        # Unreadable directories are skipped, like os.walk does
+        tty.debug("Skipping {0}: {1}".format(dirname, e))
+        return None
 
-        if not modulefiles:
+    files, dirs = [], []
+    for basename in basenames:
+        f = os.path.join(dirname, basename)
+        if not os.path.isdir(f):
+            files.append(basename)
+        elif basename not in skip_dirs and not os.path.islink(f):
+            dirs.append(basename)
+
+    explicit_default = pop_marked_default(dirname, files)
+    files = [
+        (f, cached_modules.get(os.path.join(dirname, f)))
+        for f in files
+        if not f.startswith(".")
+    ]
+
+    return {
+        "mtime": mtime,
+        "default": explicit_default,
+        "modules": [],
+        "dirs": dirs,
+        "files": files,
+    }
+
+
+def read_module(directory, reldir, file):
+    """Read the module in `file` (the basename and the cached module, if any)
+
+    The cached module is reused if the file's modification time has not
+    changed.
+
+    """
+    basename, ar = file
+    dirname = os.path.join(directory, reldir) if reldir else directory
+    f = os.path.join(dirname, basename)
+    try:
+        file_mtime = os.stat(f).st_mtime
+    except OSError:  # pragma: no cover
+        return None
+    if ar is None or ar.get("mtime") != file_mtime:
+        path = f.replace(directory + os.path.sep, "")
+        module = pymod.module.factory(directory, path)
+        if module is None:
+            return None
+        ar = pymod.module.as_dict(module)
+        ar["mtime"] = file_mtime
+    return ar
+
+
+_pool = None
+_pool_pid = None
+
+
+def parallel_map(fun, items):
+    """Map `fun` over `items` with the discovery thread pool.  The result is
+    in the same order as `items`."""
+    workers = pymod.config.get("discover_workers") or 1
+    if workers <= 1 or len(items) <= 1:
+        return [fun(item) for item in items]
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # Threads do not survive a fork, so a pool created in a parent process
+        # cannot be used
+        from multiprocessing.pool import ThreadPool
+
+        _pool = ThreadPool(workers)
+        _pool_pid = os.getpid()
+    return _pool.map(fun, items)
+
+
+def modules_from_directories(directories):
+    """Create the module entries found in `directories` (see
+    `find_directories`)"""
+    defaults = {}
+    dir_modules = {}
+    reldirs = [""]
+    while reldirs:
+        reldir = reldirs.pop()
+        entry = directories.get(reldir)
+        if entry is None:  # pragma: no cover
             continue
 
-        for module in modulefiles:
+        if entry["default"] is not None:
+            defaults[reldir] = entry["default"]
+
+        for ar in entry["modules"]:
+            module = ModuleEntry(ar["type"], ar["file"], ar["modulepath"])
             dir_modules.setdefault(module.name, []).append(module)
 
+        subdirs = [os.path.join(reldir, d) if reldir else d for d in entry["dirs"]]
+        reldirs.extend(subdirs[::-1])
+
     mark_explicit_defaults(dir_modules, defaults)
     modules = [m for (_, modules) in dir_modules.items() for m in modules] or None
     return modules
@@ -77,9 +236,15 @@ def mark_explicit_defaults(modules, defaults):
         if mods is None:
             tty.debug("There is no module named {0}".format(name))
             continue
-        for module in mods:
+        for (i, module) in enumerate(mods):
             if os.path.realpath(module.filename) == os.path.realpath(filename):
-                module.marked_as_default = True
+                # Entries are immutable, replace it with a marked entry
+                mods[i] = ModuleEntry(
+                    module.type,
+                    module.filename,
+                    module.modulepath,
+                    marked_as_default=True,
+                )
                 break
         else:
             tty.verbose("No matching module to mark default for {0}".format(name))
@@ -5,11 +5,9 @@ from six import StringIO
 
 import pymod.alias
 import pymod.names
-import pymod.module
 from pymod.modulepath.path import Path
 
 from pymod.util.lang import join
-from pymod.util.itertools import groupby
 
 import llnl.util.tty as tty
 from llnl.util.tty.color import colorize
@@ -19,16 +17,29 @@ from llnl.util.tty.colify import colified
 class Modulepath:
     def __init__(self, directories):
         self.path = []
+        # Indexes of the modules on the path, see `index_path`
+        self.paths_by_dirname = {}
+        self.modules_by_filename = {}
+        self.modules_by_fullname = {}
+        self.modules_by_name = {}
+        self.ranks = {}
+        # Full modules created from the entries on the path, see `promote`.
+        # A file below a nested MODULEPATH directory is a different module on
+        # each directory, so modules are keyed by (modulepath, filename)
+        self.promoted = {}
+        self.default_files = set()
         for directory in directories:
             path = Path(directory)
-            if not path.modules:
+            if not path.modules or path.path in self.paths_by_dirname:
                 continue
             self.path.append(path)
+            self.index_path(path)
+        self.rank_paths()
         self.defaults = {}
         self.assign_defaults()
 
     def __contains__(self, dirname):
-        return dirname in [p.path for p in self.path]
+        return dirname in self.paths_by_dirname
 
     def __iter__(self):
         return iter(self.path)
@@ -45,10 +56,62 @@ class Modulepath:
         return len(self)
 
     def index(self, dirname):
-        for (i, path) in enumerate(self.path):
-            if path.path == dirname:
-                return i
-        raise ValueError("{0} not in Modulepath".format(dirname))  # pragma: no cover
+        try:
+            return self.ranks[dirname]
+        except KeyError:  # pragma: no cover
+            raise ValueError("{0} not in Modulepath".format(dirname))
+
+    def index_path(self, path):
+        """Add the modules in `path` to the lookup tables.  Modules with the
+        same filename, fullname (or name) on different paths are kept in the
+        same bucket and ordered by `ranks` when looked up."""
+        self.paths_by_dirname[path.path] = path
+        for (i, module) in enumerate(path.modules):
+            entry = (path.path, i, module)
+            self.modules_by_filename.setdefault(module.filename, []).append(entry)
+            self.modules_by_fullname.setdefault(module.fullname, []).append(entry)
+            self.modules_by_name.setdefault(module.name, []).append(entry)
+
+    def unindex_path(self, path):
+        """Remove the modules in `path` from the lookup tables"""
+        self.paths_by_dirname.pop(path.path, None)
+        for module in path.modules:
+            self.promoted.pop(entry_key(module), None)
+            self.default_files.discard(entry_key(module))
+            for (key, table) in (
+                (module.filename, self.modules_by_filename),
+                (module.fullname, self.modules_by_fullname),
+                (module.name, self.modules_by_name),
+            ):
+                bucket = [x for x in table.get(key, []) if x[0] != path.path]
+                if bucket:
+                    table[key] = bucket
+                else:
+                    table.pop(key, None)
+
+    def rank_paths(self):
+        self.ranks = dict([(p.path, i) for (i, p) in enumerate(self.path)])
+
+    def promote(self, entry):
+        """The full Module for the ModuleEntry `entry`.  The same Module is
+        returned for an entry as long as its path is on the modulepath"""
+        if entry is None:
+            return None
+        key = entry_key(entry)
+        module = self.promoted.get(key)
+        if module is None:
+            module = self.promoted[key] = entry.promote()
+            module.is_default = key in self.default_files
+        return module
+
+    def is_default(self, entry):
+        return entry_key(entry) in self.default_files
+
+    def first_match(self, entries):
+        """The first of `entries` in MODULEPATH order"""
+        if not entries:
+            return None
+        return min(entries, key=lambda x: (self.ranks[x[0]], x[1]))[2]
 
     def clear(self):
         for path in self.path[::-1]:
@@ -74,19 +137,15 @@ class Modulepath:
         parts = key.split(os.path.sep)
         if len(parts) == 1:
             # with length of 1, it must be a name
-            module = self.defaults.get(key)
+            module = self.promote(self.defaults.get(key))
             if module is not None:
                 module.acquired_as = module.name
             return module
         else:
-            for path in self.path:
-                for module in path.modules:
-                    if module.fullname == key:
-                        module.acquired_as = key
-                        return module
-                    elif module.endswith(key):
-                        module.acquired_as = key
-                        return module
+            module = self.getby_fullname(key)
+            if module is not None:
+                module.acquired_as = key
+            return module
         return None
 
     def get(self, key, use_file_modulepath=False):
@@ -125,33 +184,47 @@ class Modulepath:
         return module
 
     def getby_dirname(self, dirname):
-        for path in self:
-            if path.path == dirname:
-                return path.modules
+        path = self.paths_by_dirname.get(dirname)
+        if path is not None:
+            return [self.promote(entry) for entry in path.modules]
+
+    def getby_fullname(self, key):
+        """Find the first module whose fullname is `key` or whose path ends
+        with `key`.  A module's path ends with its fullname, so only modules
+        whose fullname is a trailing part of `key` are candidates."""
+        parts = key.split(os.path.sep)
+        entries = []
+        for i in range(len(parts)):
+            fullname = os.path.sep.join(parts[i:])
+            for entry in self.modules_by_fullname.get(fullname, []):
+                module = entry[2]
+                if module.fullname == key or module.endswith(key):
+                    entries.append(entry)
+        return self.promote(self.first_match(entries))
 
     def getby_filename(self, filename, use_file_modulepath=False):
         tty.debug(filename)
         filename = os.path.abspath(filename)
-        for path in self.path:
-            tty.debug(path.path)
-            for module in path.modules:
-                if filename == module.filename:
-                    return module
+        module = self.first_match(self.modules_by_filename.get(filename))
+        if module is not None:
+            return self.promote(module)
 
         if not use_file_modulepath:
             return None
 
         # This file is not on the MODULEPATH, add it
         modules = self.append_path(os.path.dirname(filename))
-        for module in modules:
+        for module in modules or []:
             if filename == module.filename:
-                return module
+                return self.promote(module)
 
         # Hmmmm, how did we get this far???
         return None
 
-    def path_modified(self):
-        self.assign_defaults()
+    def path_modified(self, path):
+        """Only the defaults of modules with the same name as those in the
+        added or removed `path` can change"""
+        self.assign_defaults(names=set([m.name for m in path.modules]))
 
     def append_path(self, dirname):
         dirname = Path.expand_name(dirname)
@@ -162,7 +235,9 @@ class Modulepath:
             tty.verbose("No modules found in {0}".format(path.path))
             return
         self.path.append(path)
-        self.path_modified()
+        self.index_path(path)
+        self.ranks[path.path] = len(self.path) - 1
+        self.path_modified(path)
         return path.modules
 
     def prepend_path(self, dirname):
@@ -173,8 +248,10 @@ class Modulepath:
             path = Path(dirname)
             if not path.modules:
                 return None
+            self.index_path(path)
         self.path.insert(0, path)
-        self.path_modified()
+        self.rank_paths()
+        self.path_modified(path)
         return path.modules
 
     def remove_path(self, dirname):
@@ -196,14 +273,17 @@ class Modulepath:
             tty.warn("Modulepath: {0!r} is not in modulepath".format(dirname))
             return []
 
-        modules_in_dir = self.getby_dirname(dirname)
-        self.path.pop(self.index(dirname))
-        self.path_modified()
+        path = self.path.pop(self.index(dirname))
+        modules_in_dir = path.modules
+        self.unindex_path(path)
+        self.rank_paths()
+        self.path_modified(path)
 
         return modules_in_dir
 
-    def assign_defaults(self):
-        """Assign defaults to modules.
+    def assign_defaults(self, names=None):
+        """Assign defaults to modules with one of `names` (all modules, if
+        `names` is None).
         1. Look for an exact match in all MODULEPATH directories. Pick the
            first match.
         2. If the name doesn't contain a version, look for a marked default in
@@ -218,26 +298,42 @@ class Modulepath:
         to it (in the same directory) named 'default'
         """
 
-        def module_default_sort_key(module):
+        def module_default_sort_key(entry):
+            module = entry[2]
             sort_key = (
                 1 if module.marked_as_default else -1,
                 module.version,
                 module.variant,
-                -self.index(module.modulepath),
+                -self.ranks[entry[0]],
             )
             return sort_key
 
-        self.defaults = {}
-        grouped = groupby(
-            [module for path in self.path for module in path.modules], lambda x: x.name
-        )
-        for (_, modules) in grouped:
-            for module in modules:
-                module.is_default = False
-            if len(modules) > 1:
-                modules = sorted(modules, key=module_default_sort_key, reverse=True)
-                modules[0].is_default = True
-            self.defaults[modules[0].name] = modules[0]
+        if names is None:
+            self.defaults = {}
+            names = list(self.modules_by_name.keys())
+        for name in names:
+            entries = self.modules_by_name.get(name)
+            if not entries:
+                self.defaults.pop(name, None)
+                continue
+            # MODULEPATH order, so that ties go to the first module found
+            entries = sorted(entries, key=lambda x: (self.ranks[x[0]], x[1]))
+            for entry in entries:
+                self.set_default(entry[2], False)
+            if len(entries) > 1:
+                entries = sorted(entries, key=module_default_sort_key, reverse=True)
+                self.set_default(entries[0][2], True)
+            self.defaults[name] = entries[0][2]
+
+    def set_default(self, entry, is_default):
+        key = entry_key(entry)
+        if is_default:
+            self.default_files.add(key)
+        else:
+            self.default_files.discard(key)
+        module = self.promoted.get(key)
+        if module is not None:
+            module.is_default = is_default
 
     def filter_modules_by_regex(self, modules, regex):
         if regex:
@@ -258,6 +354,16 @@ class Modulepath:
     def sort_key(module):
         return (module.name, module.version)
 
+    def format_dl_status(self, entry):
+        is_default, is_loaded = self.is_default(entry), entry.is_loaded
+        if is_default and is_loaded:
+            return entry.fullname + " (D,L)"
+        elif is_default:  # pragma: no cover
+            return entry.fullname + " (D)"
+        elif is_loaded:
+            return entry.fullname + " (L)"
+        return entry.fullname
+
     def avail(self, terse=False, regex=None, long_format=False):
         if terse:
             return self.avail_terse(regex=regex)
@@ -282,7 +388,7 @@ class Modulepath:
                     continue
                 s = colorize("@r{(None)}".center(width))
             else:
-                modules = [self.colorize(m.format_dl_status()) for m in modules]
+                modules = [self.colorize(self.format_dl_status(m)) for m in modules]
                 aliases = pymod.alias.get(directory)
                 if aliases:  # pragma: no cover
                     for (alias, target) in aliases:
@@ -327,8 +433,13 @@ class Modulepath:
                     the_candidates.append(module)  # pragma: no cover
                 else:
                     f = module.filename
-                    if not isinstance(module, pymod.module.TclModule):
+                    if module.type != "TclModule":
                         f = os.path.splitext(f)[0]
                     if f.endswith(key):  # pragma: no cover
                         the_candidates.append(module)
-        return the_candidates
+        return [self.promote(module) for module in the_candidates]
+
+
+def entry_key(entry):
+    """Key of the module of `entry` in `Modulepath.promoted`"""
+    return (entry.modulepath, entry.filename)
@@ -4,7 +4,8 @@ import pymod.cache
 import pymod.names
 import pymod.config
 import pymod.module
-from pymod.modulepath.discover import find_modules
+import pymod.timer
+from pymod.modulepath.discover import find_directories, modules_from_directories
 
 
 class Path:
@@ -15,38 +16,25 @@ class Path:
         self.modules = self.find_modules()
 
     def find_modules(self):
-        cached_modules = self.get_cached_modules()
-        if cached_modules is not None:
-            return cached_modules
-        else:
-            modules = find_modules(self.path)
-            if modules:
-                self.cache_modules(modules)
-            return modules
-
-    def get_cached_modules(self):
+        with pymod.timer.span("discover", path=self.path):
+            cached = self.get_cached_directories()
+            found = find_directories(self.path, cached=cached)
+            if found is None:
+                return None
+            directories, modified = found
+            if modified:
+                self.cache_directories(directories)
+            return modules_from_directories(directories)
+
+    def get_cached_directories(self):
         if not pymod.config.get("use_modulepath_cache"):  # pragma: no cover
             return None
-        key = self.path
-        section = pymod.names.modulepath
-        cached = pymod.cache.get(section, key)
-        if cached is None:
-            return None
-
-        modules = [pymod.module.from_dict(m) for m in cached]
-        if any([m is None for m in modules]):
-            # A module was removed, the cache is invalid
-            pymod.cache.pop(section, key)
-            return None
-        return modules
+        return pymod.cache.get(pymod.names.modulepath, self.path)
 
-    def cache_modules(self, modules):
+    def cache_directories(self, directories):
         if not pymod.config.get("use_modulepath_cache"):  # pragma: no cover
             return
-        key = self.path
-        section = pymod.names.modulepath
-        data = [pymod.module.as_dict(m) for m in modules]
-        pymod.cache.set(section, key, data)
+        pymod.cache.set(pymod.names.modulepath, self.path, directories)
 
     @classmethod
     def expand_name(cls, dirname):
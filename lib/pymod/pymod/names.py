@@ -13,6 +13,7 @@ tutorial_save_env = "_LMT0_"
 tutorial_root_path = "PYMOD_TUTORIAL_ROOT_PATH"
 
 session_id = "PYMOD_SESSION_ID"
+initial_env_digest = "PYMOD_INITIAL_ENV_DIGEST"
 
 sourced_files = "PYMOD_SOURCED_FILES"
 loaded_collection = "PYMOD_LOADED_COLLECTION"
@@ -23,6 +24,7 @@ family_version = lambda key: "MODULE_FAMILY_{0}_VERSION".format(key.upper())
 default_user_collection = "default"
 
 config_file_basename = "config.yaml"
+config_snapshot_basename = "config"
 
 ld_preload = "LD_PRELOAD"
 ld_library_path = "LD_LIBRARY_PATH"
@@ -36,4 +38,6 @@ aliases_file_basename = "aliases.yaml"
 collections_file_basename = "collections.json"
 clones_file_basename = "clones.json"
 user_env_file_basename = "user.py"
-cache_file_basename = "cache.json"
+cache_file_basename = "cache.bin"
+server_socket_basename = "modulecmd.sock"
+initial_env_dirname = "environments"
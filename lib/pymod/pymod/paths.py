@@ -46,16 +46,23 @@ etc_path = os.path.join(prefix, "etc", "pymod")
 user_config_path = os.getenv("PYMOD_USER_CONFIG_PATH", os.path.expanduser("~/.pymod"))
 user_cache_path = os.getenv("PYMOD_USER_CACHE_PATH", os.path.expanduser("~/.pymod/cache"))
 
-if not os.path.isdir(user_config_path):  # pragma: no cover
-    os.makedirs(user_config_path)
+#: User directories known to exist -- see join_user
+_user_dirs = set()
 
-if not os.path.isdir(user_cache_path):  # pragma: no cover
-    os.makedirs(user_cache_path)
 
 def join_user(basename, cache=False):
-    if cache:
-        return os.path.join(user_cache_path, basename)
-    return os.path.join(user_config_path, basename)
+    """Join `basename` to the user config (or cache) directory.  The directory
+    is created on first use rather than when this module is imported."""
+    dirname = user_cache_path if cache else user_config_path
+    if dirname not in _user_dirs:
+        if not os.path.isdir(dirname):  # pragma: no cover
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        _user_dirs.add(dirname)
+    return os.path.join(dirname, basename)
 
 
 del sys
@@ -1,15 +1,62 @@
+"""Serialization of objects stored in environment variables.
+
+Two encodings are supported.  Both payloads are urlsafe base64, whose
+characters are safe in shell variables.  Version 2 payloads are prefixed with
+``~2``: ``~`` is not in the urlsafe base64 alphabet, so the prefix can never
+start a version 1 value and the encoding is detected on read:
+
+Version 1
+    JSON, optionally compressed with zlib, encoded with urlsafe base64.
+
+Version 2 (marked by the prefix ``~2``)
+    A binary layout in which each string is written once and referred to by
+    index afterwards, compressed with zlib using a preset dictionary of the
+    strings Modulecmd.py commonly stores (see ``zdict``), and encoded with
+    unpadded urlsafe base64.  A flags byte records whether the payload is
+    compressed.  Python 2 does not support preset dictionaries: it compresses
+    without one and reads payloads compressed with one by `_inflate_preset`,
+    so that variables written by either Python are read by the other.
+
+"""
 import json
 import zlib
 import base64
+import struct
 from textwrap import wrap
+from six import integer_types
 import pymod.config
 
 
+v2_marker = "~2"
+
+#: Preset dictionary for version 2 compression.  Changing it requires a new
+#: version marker, since values encoded with it must remain decodable
+zdict = (
+    b"fullnamefilenamefamilyoptsacquired_asrefcountmodulepathcountpriority"
+    b"MODULEPATHLOADEDMODULES_LMFILES__LMX0__LMX1__LMX2_PYMOD_SESSION_ID"
+    b"LD_LIBRARY_PATHDYLD_LIBRARY_PATHMANPATHPKG_CONFIG_PATHPYTHONPATH"
+    b"CPATHLIBRARY_PATHCMAKE_PREFIX_PATHINFOPATHHOMEUSERSHELLTERMPWD"
+    b"/usr/share/man:/usr/local/share/man/usr/lib64:/usr/lib:/lib64:/lib"
+    b"/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+)
+
+_none, _false, _true, _int, _float, _str, _ref, _list, _dict = range(9)
+_compressed = 0x01
+
+#: FDICT bit of the zlib header: the stream was compressed with a preset
+#: dictionary
+_fdict = 0x20
+
+
 def serialize(obj):
-    return _encode(json.dumps(obj))
+    if pymod.config.get("serialize_version", 2) == 1:
+        return _encode(json.dumps(obj))
+    return _encode_v2(obj)
 
 
 def deserialize(serialized):
+    if serialized.startswith(v2_marker):
+        return _decode_v2(serialized)
     string = _decode(serialized)
     return json.loads(string)
 
@@ -40,3 +87,163 @@ def _decode(item):
     if compress:
         encoded = zlib.decompress(encoded)
     return encoded.decode()
+
+
+def _encode_v2(obj):
+    payload = bytes(_pack(obj))
+    flags = 0
+    if pymod.config.get("compress_serialized_variables"):
+        compressor = _compressobj()
+        payload = compressor.compress(payload) + compressor.flush()
+        flags |= _compressed
+    encoded = base64.urlsafe_b64encode(struct.pack("B", flags) + payload)
+    return v2_marker + encoded.decode().rstrip("=")
+
+
+def _decode_v2(serialized):
+    encoded = str(serialized[len(v2_marker) :])
+    encoded += "=" * (-len(encoded) % 4)
+    data = base64.urlsafe_b64decode(encoded)
+    flags, payload = struct.unpack("B", data[:1])[0], data[1:]
+    if flags & _compressed:
+        payload = _decompress(payload)
+    obj, _ = _unpack(bytearray(payload), 0, [])
+    return obj
+
+
+def _compressobj():
+    try:
+        return zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9, 0, zdict)
+    except TypeError:  # pragma: no cover
+        # Python 2 does not support preset dictionaries
+        return zlib.compressobj(9)
+
+
+def _decompress(payload):
+    if not ord(payload[1:2]) & _fdict:
+        return zlib.decompress(payload)
+    try:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict)
+    except TypeError:  # pragma: no cover
+        return _inflate_preset(payload)
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+def _inflate_preset(payload):
+    """Decompress the zlib stream `payload`, compressed with the preset
+    dictionary `zdict`, without support for preset dictionaries.
+
+    The compressed blocks refer back into the dictionary as if it preceded the
+    data.  The dictionary is written before them as an uncompressed block of a
+    raw deflate stream, which is inflated and the dictionary is cut from the
+    result.  The zlib header (two bytes and the dictionary id) is skipped and
+    the trailing checksum is not verified.
+
+    """
+    n = len(zdict)
+    stored = struct.pack("<BHH", 0, n, n ^ 0xFFFF) + zdict
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    data = decompressor.decompress(stored + bytes(payload[6:]))
+    data += decompressor.flush()
+    return data[n:]
+
+
+def _pack(obj, buf=None, strings=None):
+    """Write `obj` to the bytearray `buf`.  Strings already written are
+    written as their index in `strings`"""
+    buf = bytearray() if buf is None else buf
+    strings = {} if strings is None else strings
+    if obj is None:
+        buf.append(_none)
+    elif obj is True:
+        buf.append(_true)
+    elif obj is False:
+        buf.append(_false)
+    elif isinstance(obj, integer_types):
+        buf.append(_int)
+        _pack_uint(buf, (obj << 1) if obj >= 0 else ((-obj << 1) - 1))
+    elif isinstance(obj, float):
+        buf.append(_float)
+        buf.extend(struct.pack("<d", obj))
+    elif isinstance(obj, (list, tuple)):
+        buf.append(_list)
+        _pack_uint(buf, len(obj))
+        for item in obj:
+            _pack(item, buf, strings)
+    elif isinstance(obj, dict):
+        buf.append(_dict)
+        _pack_uint(buf, len(obj))
+        for (key, val) in obj.items():
+            _pack(key, buf, strings)
+            _pack(val, buf, strings)
+    else:
+        string = obj if isinstance(obj, type(u"")) else str(obj)
+        if string in strings:
+            buf.append(_ref)
+            _pack_uint(buf, strings[string])
+        else:
+            strings[string] = len(strings)
+            encoded = string.encode("utf-8")
+            buf.append(_str)
+            _pack_uint(buf, len(encoded))
+            buf.extend(encoded)
+    return buf
+
+
+def _pack_uint(buf, n):
+    """Variable length (7 bits per byte) unsigned integer"""
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _unpack_uint(buf, i):
+    n, shift = 0, 0
+    while True:
+        byte = buf[i]
+        i += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, i
+        shift += 7
+
+
+def _unpack(buf, i, strings):
+    tag = buf[i]
+    i += 1
+    if tag == _none:
+        return None, i
+    elif tag == _true:
+        return True, i
+    elif tag == _false:
+        return False, i
+    elif tag == _int:
+        n, i = _unpack_uint(buf, i)
+        return ((n >> 1) if not n & 1 else -((n + 1) >> 1)), i
+    elif tag == _float:
+        return struct.unpack("<d", bytes(buf[i : i + 8]))[0], i + 8
+    elif tag == _str:
+        n, i = _unpack_uint(buf, i)
+        string = bytes(buf[i : i + n]).decode("utf-8")
+        strings.append(string)
+        return string, i + n
+    elif tag == _ref:
+        n, i = _unpack_uint(buf, i)
+        return strings[n], i
+    elif tag == _list:
+        n, i = _unpack_uint(buf, i)
+        items = []
+        for _ in range(n):
+            item, i = _unpack(buf, i, strings)
+            items.append(item)
+        return items, i
+    elif tag == _dict:
+        n, i = _unpack_uint(buf, i)
+        items = {}
+        for _ in range(n):
+            key, i = _unpack(buf, i, strings)
+            val, i = _unpack(buf, i, strings)
+            items[key] = val
+        return items, i
+    raise ValueError("Unknown tag {0} in serialized data".format(tag))
@@ -0,0 +1,357 @@
+"""Persistent Modulecmd.py server.
+
+Every ``module`` command normally starts a new Python interpreter, imports
+``pymod``, reads the configuration and rebuilds the ``Modulepath``.  The server
+does that work once and then waits for requests on a per-user Unix socket.  A
+thin client (``bin/modulecmd-client.py``) sends the command line arguments, the
+shell name, the working directory and the environment of the calling shell
+along with its standard file descriptors.  Each request is handled in a forked
+child that inherits the warm state of the server, so that state mutated by one
+``module`` command never leaks into the next.
+
+Before forking, the server checks the modification times of the directories on
+the requested ``MODULEPATH`` and of the directories below them found when the
+``Modulepath`` was built (recorded in the modulepath cache).  If any have
+changed, the cached modules of that ``MODULEPATH`` directory are dropped and
+the ``Modulepath`` rebuilt.
+
+The server requires Python 3.3 or newer (for passing file descriptors over the
+socket).  Clients running with older Pythons fall back to executing
+``modulecmd.py`` directly.
+"""
+import os
+import sys
+import json
+import array
+import errno
+import signal
+import socket
+import struct
+import traceback
+
+import pymod.main
+import pymod.names
+import pymod.paths
+import pymod.cache
+import pymod.config
+import pymod.modulepath
+from pymod.modulepath.path import Path
+
+from pymod.util.lang import split
+from llnl.util.lang import Singleton
+import llnl.util.tty as tty
+
+
+#: Header of each message: the length of the JSON payload that follows
+header = struct.Struct("!I")
+
+#: Number of file descriptors (stdin, stdout, stderr) sent with a request
+num_fds = 3
+
+
+def socket_file():
+    return pymod.paths.join_user(pymod.names.server_socket_basename, cache=True)
+
+
+def can_serve():
+    return hasattr(socket.socket, "sendmsg")
+
+
+def send_message(conn, payload, fds=None):
+    data = json.dumps(payload).encode("utf-8")
+    data = header.pack(len(data)) + data
+    if fds:
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))]
+        conn.sendmsg([data], ancillary)
+    else:
+        conn.sendall(data)
+
+
+def recv_message(conn):
+    """Receive a message, and any file descriptors sent with it"""
+    fds = array.array("i")
+    data, ancdata, _, _ = conn.recvmsg(
+        header.size, socket.CMSG_LEN(num_fds * fds.itemsize)
+    )
+    for (level, type, cmsg_data) in ancdata:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            n = len(cmsg_data) - (len(cmsg_data) % fds.itemsize)
+            fds.frombytes(cmsg_data[:n])
+    if len(data) < header.size:
+        return None, list(fds)
+    (length,) = header.unpack(data)
+    chunks = []
+    while length > 0:
+        chunk = conn.recv(min(length, 65536))
+        if not chunk:  # pragma: no cover
+            break
+        chunks.append(chunk)
+        length -= len(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8")), list(fds)
+
+
+def connect(filename=None):
+    filename = filename or socket_file()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(filename)
+    return conn
+
+
+def request(argv, shell="bash", env=None, cwd=None, fds=(0, 1, 2), filename=None):
+    """Run ``argv`` on the server and return its exit code."""
+    conn = connect(filename)
+    try:
+        payload = {
+            "argv": list(argv),
+            "shell": shell,
+            "env": dict(os.environ if env is None else env),
+            "cwd": cwd or os.getcwd(),
+        }
+        send_message(conn, payload, fds=list(fds))
+        reply, _ = recv_message(conn)
+    finally:
+        conn.close()
+    if reply is None:  # pragma: no cover
+        return 1
+    return reply.get("returncode", 1)
+
+
+def known_directories(dirnames):
+    """The directories `dirnames` and the directories below them found by the
+    last discovery, with the modification times it recorded (None if the
+    directory has not been discovered)"""
+    known = {}
+    for dirname in dirnames:
+        dirname = Path.expand_name(dirname)
+        known[dirname] = None
+        directories = pymod.cache.get(pymod.names.modulepath, dirname) or {}
+        for (reldir, entry) in directories.items():
+            path = os.path.join(dirname, reldir) if reldir else dirname
+            known[path] = entry["mtime"]
+    return known
+
+
+def directory_stamps(dirnames):
+    """Modification times of the directories `dirnames`"""
+    stamps = {}
+    for dirname in dirnames:
+        try:
+            stamps[dirname] = os.stat(dirname).st_mtime
+        except OSError:
+            continue
+    return stamps
+
+
+class Server(object):
+    def __init__(self, filename=None):
+        self.filename = filename or socket_file()
+        self.pid = os.getpid()
+        self.modulepath = None
+        self.modulepath_value = None
+        self.stamps = {}
+        self.cache_stamp = None
+        self.config_env = self.environment_config(os.environ)
+
+    @staticmethod
+    def environment_config(env):
+        return dict([(k, v) for (k, v) in env.items() if k.startswith("PYMOD_")])
+
+    def cache_file_stamp(self):
+        try:
+            return os.stat(pymod.cache.cache.filename).st_mtime
+        except OSError:
+            return None
+
+    def refresh(self, modulepath_value):
+        """Make sure the warm state is valid for `modulepath_value`"""
+        dirnames = split(modulepath_value, os.pathsep)
+        if self.cache_file_stamp() != self.cache_stamp:
+            # A request (running in a child process) updated the cache
+            pymod.cache.cache = Singleton(pymod.cache.factory)
+            self.modulepath = None
+
+        # Adding or removing a directory changes the modification time of its
+        # parent, so only the directories already discovered are checked,
+        # against the modification times recorded when they were discovered
+        # or, if not cached, on a previous request
+        known = known_directories(dirnames)
+        stamps = directory_stamps(known)
+        seen = dict(self.stamps)
+        seen.update([(d, m) for (d, m) in known.items() if m is not None])
+        stale = [d for d in stamps if d in seen and stamps[d] != seen[d]]
+        if stale:
+            tty.debug("Server: stale modulepath directories {0}".format(stale))
+            for dirname in dirnames:
+                dirname = Path.expand_name(dirname)
+                if any([d.startswith(dirname) for d in stale]):
+                    pymod.cache.pop(pymod.names.modulepath, dirname)
+            self.modulepath = None
+
+        if self.modulepath is None or modulepath_value != self.modulepath_value:
+            self.modulepath = pymod.modulepath.Modulepath(dirnames)
+            self.modulepath_value = modulepath_value
+            pymod.cache.dump_cache_if_modified()
+
+        self.stamps.update(stamps)
+        self.cache_stamp = self.cache_file_stamp()
+
+    def serve_forever(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.filename)
+        os.chmod(self.filename, 0o600)
+        sock.listen(16)
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            while True:
+                conn, _ = sock.accept()
+                self.reap()
+                try:
+                    message, fds = recv_message(conn)
+                except (OSError, ValueError):  # pragma: no cover
+                    conn.close()
+                    continue
+                if message is None:  # pragma: no cover
+                    conn.close()
+                    continue
+                elif message.get("command") == "stop":
+                    send_message(conn, {"returncode": 0})
+                    conn.close()
+                    break
+                elif message.get("command") == "ping":
+                    send_message(conn, {"returncode": 0, "pid": self.pid})
+                    conn.close()
+                    continue
+                self.dispatch(sock, conn, message, fds)
+        finally:
+            sock.close()
+            if os.getpid() == self.pid and os.path.exists(self.filename):
+                os.remove(self.filename)
+
+    def dispatch(self, sock, conn, message, fds):
+        env = message.get("env", {})
+        try:
+            self.refresh(env.get(pymod.names.modulepath))
+        except Exception as e:  # pragma: no cover
+            tty.debug("Server: failed to refresh state: {0}".format(e))
+            self.modulepath = None
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            self.handle(conn, message, fds)
+        conn.close()
+        for fd in fds:
+            os.close(fd)
+
+    def handle(self, conn, message, fds):
+        """Run the request in the (forked) child process.  Never returns"""
+        returncode = 1
+        try:
+            for (i, fd) in enumerate(fds[:num_fds]):
+                os.dup2(fd, i)
+                os.close(fd)
+            sys.stdin = os.fdopen(0, "r", closefd=False)
+            sys.stdout = os.fdopen(1, "w", closefd=False)
+            sys.stderr = os.fdopen(2, "w", closefd=False)
+            env = message["env"]
+            os.environ.clear()
+            os.environ.update(env)
+            try:
+                os.chdir(message["cwd"])
+            except OSError:  # pragma: no cover
+                pass
+            if self.environment_config(env) != self.config_env:
+                pymod.config.config = Singleton(pymod.config.factory)
+            if self.modulepath is not None and (
+                env.get(pymod.names.modulepath) == self.modulepath_value
+            ):
+                pymod.modulepath.set_path(self.modulepath)
+            else:
+                pymod.modulepath.set_path(Singleton(pymod.modulepath.factory))
+            argv = [message["shell"]] + list(message["argv"])
+            returncode = pymod.main.main(argv)
+        except SystemExit as e:
+            returncode = e.code
+        except BaseException:  # pragma: no cover
+            sys.stderr.write(traceback.format_exc())
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pymod.cache.dump_cache_if_modified()
+                send_message(conn, {"returncode": returncode or 0})
+            finally:
+                os._exit(0)
+
+    @staticmethod
+    def reap():
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    break
+                raise  # pragma: no cover
+            if pid == 0:
+                break
+
+
+def is_running(filename=None):
+    try:
+        conn = connect(filename)
+    except (OSError, socket.error):
+        return False
+    try:
+        send_message(conn, {"command": "ping"})
+        reply, _ = recv_message(conn)
+    except (OSError, socket.error):
+        return False
+    finally:
+        conn.close()
+    return reply is not None
+
+
+def daemonize():  # pragma: no cover
+    """Detach from the controlling terminal (double fork)"""
+    if os.fork() > 0:
+        return False
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    return True
+
+
+def start(foreground=False, filename=None):  # pragma: no cover
+    if not can_serve():
+        raise ServerError("The modulecmd server requires Python 3.3 or newer")
+    if is_running(filename):
+        tty.info("The modulecmd server is already running")
+        return
+    if foreground:
+        Server(filename).serve_forever()
+    elif daemonize():
+        try:
+            Server(filename).serve_forever()
+        finally:
+            os._exit(0)
+
+
+def stop(filename=None):
+    if not is_running(filename):
+        tty.info("The modulecmd server is not running")
+        return
+    conn = connect(filename)
+    try:
+        send_message(conn, {"command": "stop"})
+        recv_message(conn)
+    finally:
+        conn.close()
+
+
+class ServerError(Exception):
+    pass
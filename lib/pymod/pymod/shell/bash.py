@@ -11,6 +11,11 @@ class Bash(Shell):
             return "unset {0};".format(key)
         return '{0}="{1}";\nexport {0};'.format(key, val)
 
+    def format_environment_variable_minimal(self, key, val=None):
+        if val is None:
+            return "unset {0};".format(key)
+        return 'export {0}="{1}";'.format(key, val)
+
     def format_shell_function(self, key, val=None):
         # Define or undefine a bash shell function.
         # Modify module definition of function so that there is
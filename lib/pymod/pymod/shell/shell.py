@@ -1,5 +1,8 @@
+import os
 from six import StringIO
 
+import pymod.config
+
 
 class Shell(object):
     name = None
@@ -7,6 +10,11 @@ class Shell(object):
     def format_environment_variable(self, key, val=None):  # pragma: no cover
         raise NotImplementedError
 
+    def format_environment_variable_minimal(self, key, val=None):
+        """Shortest form of defining the variable.  Used when only changes to
+        the environment are output"""
+        return self.format_environment_variable(key, val)
+
     def format_shell_function(self, key, val=None):  # pragma: no cover
         raise NotImplementedError
 
@@ -29,8 +37,12 @@ class Shell(object):
     ):
         sio = StringIO()
 
-        for (envar, defn) in environ.items():
-            sio.write(self.format_environment_variable(envar, defn) + "\n")
+        if pymod.config.get("minimal_shell_output"):
+            for (envar, defn) in self.changed_variables(environ).items():
+                sio.write(self.format_environment_variable_minimal(envar, defn) + "\n")
+        else:
+            for (envar, defn) in environ.items():
+                sio.write(self.format_environment_variable(envar, defn) + "\n")
 
         if aliases is not None:
             for (alias, defn) in aliases.items():
@@ -51,6 +63,19 @@ class Shell(object):
 
         return sio.getvalue()
 
+    @staticmethod
+    def changed_variables(environ, initial=None):
+        """The variables in `environ` whose values differ from `initial`
+        (os.environ, by default).  Setting a variable to its current value, or
+        unsetting a variable that is not set, is a no-op and is dropped."""
+        initial = os.environ if initial is None else initial
+        changed = dict()
+        for (key, val) in environ.items():
+            if initial.get(key) == val:
+                continue
+            changed[key] = val
+        return changed
+
     def filter_env(self, environ):
         env = dict()
         for (key, val) in environ.items():
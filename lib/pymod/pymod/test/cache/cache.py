@@ -1,3 +1,4 @@
+import os
 import pytest
 import pymod.cache
 
@@ -31,3 +32,64 @@ def test_cache_remove(tmpdir, mock_modulepath):
     # this will create the cache
     pymod.modulepath.avail()
     pymod.cache.remove()
+
+
+def test_cache_picks_up_new_modules(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    assert pymod.modulepath.get("b") is None
+    tmpdir.join("b.py").write("")
+    os.utime(tmpdir.strpath, (0, 0))
+    mock_modulepath(tmpdir.strpath)
+    assert pymod.modulepath.get("b") is not None
+
+
+def test_cache_binary_roundtrip(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    tmpdir.join("b").mkdir()
+    tmpdir.join("b", "1.0.py").write("")
+    tmpdir.join("b", "2.0.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    pymod.cache.set("other", "key", {"x": [1, 2]})
+    pymod.cache.write()
+    new_cache = pymod.cache.Cache(pymod.cache.cache.filename)
+    assert new_cache.get(pymod.names.modulepath, tmpdir.strpath) == pymod.cache.get(
+        pymod.names.modulepath, tmpdir.strpath
+    )
+    assert new_cache.get("other", "key") == {"x": [1, 2]}
+    assert new_cache.get(pymod.names.modulepath, "/does/not/exist") is None
+
+
+def test_cache_version_mismatch(tmpdir):
+    filename = tmpdir.join("cache.bin").strpath
+    with open(filename, "w") as fh:
+        fh.write("{}" * 64)
+    cache = pymod.cache.Cache(filename)
+    assert cache.get(pymod.names.modulepath, tmpdir.strpath) is None
+    assert cache.modified
+
+
+def test_cache_truncated(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    pymod.cache.write()
+    filename = pymod.cache.cache.filename
+    with open(filename, "rb") as fh:
+        contents = fh.read()
+    with open(filename, "wb") as fh:
+        fh.write(contents[:-8])
+    cache = pymod.cache.Cache(filename)
+    assert cache.get(pymod.names.modulepath, tmpdir.strpath) is None
+    assert cache.modified
+
+
+def test_cache_write_removes_json(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    dirname = os.path.dirname(pymod.cache.cache.filename)
+    legacy = os.path.join(dirname, pymod.cache.legacy_basename)
+    with open(legacy, "w") as fh:
+        fh.write("{}")
+    pymod.cache.write()
+    assert not os.path.exists(legacy)
+    assert not [f for f in os.listdir(dirname) if f.startswith(".cache")]
@@ -0,0 +1,30 @@
+import json
+
+import pymod.bench
+import pymod.environ
+import pymod.modulepath
+from pymod.main import PymodCommand
+
+
+def test_command_bench(tmpdir):
+    environ, modulepath = pymod.environ.environ, pymod.modulepath._path
+    output = tmpdir.join("bench.json")
+    bench = PymodCommand("bench")
+    bench(
+        "--dirs=2",
+        "--modules=3",
+        "--depth=2",
+        "--libs=2",
+        "--repeat=1",
+        "-o",
+        output.strpath,
+    )
+    results = json.load(open(output.strpath))
+    assert sorted(results["phases"]) == sorted(pymod.bench.phases)
+    assert results["parameters"]["dirs"] == 2
+    for phase in pymod.bench.phases:
+        assert len(results["phases"][phase]["times"]) == 1
+
+    # The benchmarks do not modify the current state
+    assert pymod.environ.environ is environ
+    assert pymod.modulepath._path is modulepath
@@ -1,6 +1,7 @@
 import os
 import pytest
 import pymod.names
+import pymod.mc
 import pymod.environ
 from pymod.util.lang import boolean
 
@@ -156,3 +157,131 @@ def test_environ_ld_library_path():
     key = "CRAY_LD_LIBRARY_PATH"
     fixed = pymod.environ.environ.fix_ld_library_path(key)
     assert fixed == key
+
+
+def test_environ_defer():
+    calls = []
+
+    def writer(env):
+        calls.append(1)
+        env.set("DEFERRED_A", "a")
+        env.set("DEFERRED_B", "b")
+
+    pymod.environ.defer("deferred", writer, ("DEFERRED_A", "DEFERRED_B"))
+    pymod.environ.defer("deferred", writer, ("DEFERRED_A", "DEFERRED_B"))
+    assert not calls
+    assert pymod.environ.get("OTHER") is None
+    assert not calls
+    assert pymod.environ.get("DEFERRED_B") == "b"
+    assert pymod.environ.get("DEFERRED_A") == "a"
+    assert len(calls) == 1
+
+    pymod.environ.defer("deferred", writer, ("DEFERRED_A", "DEFERRED_B"))
+    env = pymod.environ.copy()
+    assert env["DEFERRED_A"] == "a"
+    assert len(calls) == 2
+
+
+def test_environ_loaded_modules_deferred(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    tmpdir.join("b.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    for name in "ab":
+        module = pymod.modulepath.get(name)
+        pymod.mc.register_module(module)
+    assert pymod.names.loaded_modules not in dict.keys(pymod.environ.environ)
+    assert pymod.environ.get(pymod.names.loaded_modules) == "a:b"
+    cellar = pymod.environ.get(pymod.names.loaded_module_cellar, serialized=True)
+    assert [ar["fullname"] for ar in cellar] == ["a", "b"]
+
+
+def test_environ_path_encoded_once(monkeypatch):
+    calls = []
+    serialize = pymod.environ.serialize
+
+    def counting_serialize(obj):
+        calls.append(obj)
+        return serialize(obj)
+
+    monkeypatch.setattr(pymod.environ, "serialize", counting_serialize)
+    for i in range(10):
+        pymod.environ.prepend_path("BATCHED", "dir{0}".format(i))
+    pymod.environ.remove_path("BATCHED", "dir0")
+    assert not calls
+    value = pymod.environ.get("BATCHED")
+    assert value == ":".join(["dir{0}".format(i) for i in range(9, 0, -1)])
+    assert len(calls) == 1
+
+    # Setting the variable directly replaces the decoded path
+    pymod.environ.set("BATCHED", "a:b")
+    pymod.environ.append_path("BATCHED", "c")
+    assert pymod.environ.get("BATCHED") == "a:b:c"
+
+
+def test_environ_pathlist():
+    path = pymod.environ.PathList(["a", "b", "a"])
+    assert list(path) == ["a", "b", "a"]
+    assert "a" in path and "c" not in path
+    assert path.count("a") == 2 and len(path) == 3
+    path.prepend("c")
+    path.append("d")
+    path.remove("a")
+    assert list(path) == ["c", "b", "a", "d"]
+    path.remove("x")
+    for x in "abcd":
+        path.remove(x)
+    assert not path and list(path) == []
+
+
+def test_environ_serialize_versions(mock_config):
+    import pymod.serialize
+
+    obj = {
+        "loaded": [
+            {"fullname": "a/1.0", "filename": "/p/a/1.0.py", "refcount": 1},
+            {"fullname": "b/2.0", "filename": "/p/b/2.0.py", "refcount": -2},
+        ],
+        "env": {"PATH": "/usr/local/bin:/usr/bin:/bin", "X": None, "Y": 1.5},
+        "flag": True,
+    }
+    compact = pymod.serialize.serialize(obj)
+    assert compact.startswith(pymod.serialize.v2_marker)
+    assert pymod.serialize.deserialize(compact) == obj
+
+    # Values written with the old encoding are still read
+    mock_config.set("serialize_version", 1)
+    try:
+        legacy = pymod.serialize.serialize(obj)
+    finally:
+        mock_config.set("serialize_version", 2)
+    assert not legacy.startswith(pymod.serialize.v2_marker)
+    assert pymod.serialize.deserialize(legacy) == obj
+    assert len(compact) < len(legacy)
+
+    # The encoding does not depend on compression being enabled when read
+    mock_config.set("compress_serialized_variables", False)
+    try:
+        uncompressed = pymod.serialize.serialize(obj)
+    finally:
+        mock_config.set("compress_serialized_variables", True)
+    assert pymod.serialize.deserialize(uncompressed) == obj
+
+
+def test_environ_serialize_python2(mock_config):
+    import zlib
+    import pymod.serialize
+
+    # Written by Python 3, compressed with the preset dictionary.  Python 2
+    # reads it without support for preset dictionaries
+    serialized = "~2AXj57g-DKONgZuVIg8YCK2uivqGeAVAAGh2s3PoF-mAxvYJKVg5YRDAzAQB7sQ5w"
+    obj = {"fullname": "a/1.0", "filename": "/p/a/1.0.py", "refcount": 1}
+    assert pymod.serialize.deserialize(serialized) == obj
+    payload = pymod.serialize.base64.urlsafe_b64decode(serialized[2:] + "==")[1:]
+    data = pymod.serialize._inflate_preset(payload)
+    assert pymod.serialize._unpack(bytearray(data), 0, [])[0] == obj
+
+    # Python 2 compresses without the preset dictionary
+    assert pymod.serialize._decompress(zlib.compress(data, 9)) == data
+
+    obj = {"big": 2 ** 70, "small": -(2 ** 40)}
+    assert pymod.serialize.deserialize(pymod.serialize.serialize(obj)) == obj
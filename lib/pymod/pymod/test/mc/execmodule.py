@@ -1,4 +1,5 @@
 import os
+import sys
 import pytest
 
 import pymod.mc
@@ -174,3 +175,88 @@ def test_mc_execmodule_stop(tmpdir, mock_modulepath):
     pymod.mc.load("a")
     assert pymod.environ.get("a") == "baz"
     assert pymod.environ.get("b") is None
+
+
+def test_mc_execmodule_bytecode_cache(tmpdir, mock_modulepath, monkeypatch):
+    # pymod.mc.execmodule is shadowed by the function of the same name
+    em = sys.modules["pymod.mc.execmodule"]
+
+    tmpdir.join("a.py").write('setenv("foo", "bar")\n')
+    mock_modulepath(tmpdir.strpath)
+    monkeypatch.setattr(em, "_code_cache", {})
+
+    a = pymod.mc.load("a")
+    assert pymod.environ.get("foo") == "bar"
+    assert len(em._code_cache) == 1
+    pymod.mc.unload("a")
+
+    # The code is read from the disk cache, not compiled again
+    em._code_cache.clear()
+
+    def no_read(*args):
+        assert False, "modulefile should not be read"
+
+    monkeypatch.setattr(pymod.module.PyModule, "read", no_read)
+    pymod.mc.load("a")
+    assert pymod.environ.get("foo") == "bar"
+    pymod.mc.unload("a")
+    monkeypatch.undo()
+
+    # Modifying the modulefile invalidates the cache
+    monkeypatch.setattr(em, "_code_cache", {})
+    tmpdir.join("a.py").write('setenv("foo", "bazz")\n')
+    pymod.mc.load("a")
+    assert pymod.environ.get("foo") == "bazz"
+
+
+def test_mc_execmodule_sandbox(tmpdir, mock_modulepath):
+    em = sys.modules["pymod.mc.execmodule"]
+    tmpdir.join("a.py").write(
+        'setenv("foo", "bar")\n'
+        'setenv("baz", str(env.get("foo")) + "-" + self.name)\n'
+        'env["spam"] = "eggs"\n'
+        'setenv("ham", env.get("spam"))\n'
+    )
+    tmpdir.join("b.py").write('setenv("b", env.get("foo", "unset") + self.name)\n')
+    mock_modulepath(tmpdir.strpath)
+
+    # env is the environment before the module is executed and values set on
+    # env stay in env
+    pymod.mc.load("a")
+    assert pymod.environ.get("baz") == "None-a"
+    assert pymod.environ.get("ham") == "eggs"
+    assert pymod.environ.get("spam") is None
+
+    # The callbacks are shared by modules executed in the same mode
+    template = em.sandbox_template(pymod.modes.load)
+    assert em.sandbox_template(pymod.modes.load) is template
+    b = pymod.modulepath.get("b")
+    ns = em.module_exec_sandbox(b, pymod.modes.load)
+    assert ns["setenv"] is template["setenv"]
+    assert ns["self"] is b
+    pymod.mc.load("b")
+    assert pymod.environ.get("b") == "barb"
+
+
+def test_mc_execmodule_sandbox_unload(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write(
+        'setenv("FOO", "x")\n' 'setenv("BAR", env["FOO"] + "/y")\n'
+    )
+    tmpdir.join("b.py").write(
+        'setenv("FOO", "x")\n' 'setenv("BAR", env.get("FOO", "none") + "/y")\n'
+    )
+    mock_modulepath(tmpdir.strpath)
+
+    # env holds the values from before the module is unloaded
+    pymod.mc.load("b")
+    assert pymod.environ.get("BAR") == "none/y"
+    pymod.mc.unload("b")
+    assert pymod.environ.get("FOO") is None
+    assert pymod.environ.get("BAR") is None
+
+    pymod.environ.set("FOO", "x")
+    pymod.mc.load("a")
+    assert pymod.environ.get("BAR") == "x/y"
+    pymod.mc.unload("a")
+    assert pymod.environ.get("FOO") is None
+    assert pymod.environ.get("BAR") is None
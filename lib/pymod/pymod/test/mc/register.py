@@ -66,3 +66,27 @@ def test_mc_refcount(tmpdir, mock_modulepath):
     with pytest.raises(ValueError):
         # This will put the reference count < 0
         pymod.mc.decrement_refcount(a)
+
+
+def test_mc_register_unregister_loaded_state(tmpdir, mock_modulepath):
+    tmpdir.join("a.py").write("")
+    tmpdir.join("b.py").write("")
+    mock_modulepath(tmpdir.strpath)
+    a = pymod.modulepath.get("a")
+    b = pymod.modulepath.get("b")
+    pymod.mc.register_module(a)
+    pymod.mc.register_module(b)
+    assert a.is_loaded and b.is_loaded
+    assert pymod.mc.filename_is_loaded(a.filename)
+    with pytest.raises(pymod.mc._mc.ModuleRegisteredError):
+        pymod.mc.register_module(a)
+
+    pymod.mc.unregister_module(a)
+    assert not a.is_loaded and b.is_loaded
+    assert [m.filename for m in pymod.mc.get_loaded_modules()] == [b.filename]
+    with pytest.raises(pymod.mc._mc.ModuleNotRegisteredError):
+        pymod.mc.unregister_module(a)
+
+    # Replacing the list of loaded modules updates the loaded state
+    pymod.mc.set_loaded_modules([a])
+    assert a.is_loaded and not b.is_loaded
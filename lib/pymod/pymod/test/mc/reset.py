@@ -1,6 +1,8 @@
+import os
 import pymod.mc
 import pymod.environ
 import pymod.names
+from pymod.mc.init import save_initial_env, load_initial_env, initial_env_file
 
 
 def test_mc_reset(tmpdir, mock_modulepath):
@@ -17,3 +19,54 @@ def test_mc_reset(tmpdir, mock_modulepath):
         reset_val = env.pop(key)
         assert reset_val == val
     assert len(env.keys()) == 0
+
+
+def test_mc_reset_initial_env_in_file(tmpdir, mock_modulepath, mock_config):
+    initial_env = pymod.environ.copy(include_os=True)
+    mock_config.set("initial_env_in_file", True)
+    try:
+        save_initial_env(initial_env)
+    finally:
+        mock_config.set("initial_env_in_file", False)
+    digest = pymod.environ.get(pymod.names.initial_env_digest)
+    session_id = pymod.environ.get(pymod.names.session_id)
+    assert digest is not None and session_id is not None
+    assert pymod.environ.get(pymod.names.initial_env, serialized=True) is None
+    filename = initial_env_file(session_id, digest)
+    assert os.path.isfile(filename)
+    assert load_initial_env() == initial_env
+
+    # Falls back to the inline snapshot if the file is gone
+    os.remove(filename)
+    pymod.environ.set(pymod.names.initial_env, {"A": "a"}, serialize=True)
+    assert load_initial_env() == {"A": "a"}
+
+
+def test_mc_reset_initial_env_in_file_init_twice(
+    tmpdir, mock_modulepath, mock_config, monkeypatch
+):
+    mock_config.set("initial_env_in_file", True)
+    try:
+        initial_env = pymod.environ.copy(include_os=True)
+        save_initial_env(initial_env)
+        session_id = pymod.environ.get(pymod.names.session_id)
+        first = pymod.environ.get(pymod.names.initial_env_digest)
+
+        # Run init again in a new process started from the updated environment
+        monkeypatch.setenv(pymod.names.session_id, session_id)
+        monkeypatch.setenv(pymod.names.initial_env_digest, first)
+        pymod.environ.set_env(pymod.environ.Environ())
+        initial_env = pymod.environ.copy(include_os=True)
+        initial_env["INIT_TWICE"] = "yes"
+        save_initial_env(initial_env)
+    finally:
+        mock_config.set("initial_env_in_file", False)
+
+    digest = pymod.environ.get(pymod.names.initial_env_digest)
+    assert digest is not None and digest != first
+    assert not os.path.exists(initial_env_file(session_id, first))
+    assert os.path.isfile(initial_env_file(session_id, digest))
+
+    env = pymod.mc.reset()
+    assert env["INIT_TWICE"] == "yes"
+    assert pymod.environ.get("INIT_TWICE") == "yes"
@@ -226,3 +226,55 @@ def test_mc_swap_use_5(tmpdir, mock_modulepath):
     baz_a = pymod.modulepath.get("a/1.0")
     assert baz_a.modulepath == baz.strpath
     assert baz_a.is_loaded
+
+
+def test_mc_swap_replay(tmpdir, mock_modulepath, mock_config):
+    log = tmpdir.join("log")
+    record = "with open({0!r}, 'a') as fh:\n    fh.write(self.name + ' ')\n".format(
+        log.strpath
+    )
+    a = tmpdir.mkdir("a")
+    a.join("1.0.py").write(record + 'setenv("A", "1.0")\n')
+    a.join("2.0.py").write(record + 'setenv("A", "2.0")\n')
+    tmpdir.join("b.py").write(
+        record
+        + 'setenv("B", "b")\n'
+        + 'prepend_path("PATH", "/b/bin")\n'
+        + 'set_alias("b", "echo b")\n'
+        + 'setenv("B_SEES_X", str(is_loaded("x")))\n'
+    )
+    tmpdir.join("c.py").write(record + 'setenv("C", str(is_loaded("a/1.0")))\n')
+    tmpdir.join("d.py").write(record + 'setenv("D", env["A"])\n')
+    mock_modulepath(tmpdir.strpath)
+
+    for name in ("a/1.0", "b", "c", "d"):
+        pymod.mc.load(name)
+    log.write("")
+
+    # The modules are executed when unloaded.  When loaded again, b does not
+    # depend on a and is replayed; c and d are executed
+    pymod.mc.swap("a/1.0", "a/2.0")
+    assert log.read().split() == ["d", "c", "b", "a", "a", "c", "d"]
+    assert pymod.environ.get("A") == "2.0"
+    assert pymod.environ.get("B") == "b"
+    assert pymod.environ.get("B_SEES_X") == "None"
+    assert pymod.environ.get_path("PATH")[0] == "/b/bin"
+    assert pymod.environ.environ.aliases["b"] == "echo b"
+    assert pymod.environ.get("C") == "False"
+    assert pymod.environ.get("D") == "2.0"
+    loaded = [m.fullname for m in pymod.mc.get_loaded_modules()]
+    assert loaded == ["a/2.0", "b", "c", "d"]
+
+    # The reloaded module is executed
+    log.write("")
+    pymod.mc.reload("b")
+    assert log.read().split() == ["d", "c", "b", "b"]
+
+    mock_config.set("replay_modules", False)
+    try:
+        log.write("")
+        pymod.mc.swap("a/2.0", "a/1.0")
+        assert log.read().split() == ["d", "c", "b", "a", "a", "b", "c", "d"]
+        assert pymod.environ.get("D") == "1.0"
+    finally:
+        mock_config.set("replay_modules", True)
@@ -84,3 +84,18 @@ def test_module_bad_opts(tmpdir, mock_modulepath):
 
     with pytest.raises(SystemExit):
         pymod.mc.load("a", opts={"y": True})
+
+
+def test_module_lazy_metadata(tmpdir):
+    f = tmpdir.join("a.py")
+    f.write("# pymod: enable_if=False\n")
+    a = pymod.module.factory(tmpdir.strpath, "a.py")
+    assert a._metadata is None
+    assert not a.is_enabled
+    f.write("# pymod: enable_if=True\n")
+    os.utime(f.strpath, (0, 0))
+    assert a.is_enabled
+
+    b = pymod.module.from_dict(pymod.module.as_dict(a))
+    assert b._metadata is None
+    assert b.is_enabled
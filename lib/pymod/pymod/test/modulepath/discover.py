@@ -1,5 +1,6 @@
 import os
 import pytest
+import pymod.config
 import pymod.modulepath
 
 
@@ -91,3 +92,84 @@ def test_modulepath_discover_versioned_default(tmpdir):
     assert pymod.modulepath.discover.pop_versioned_default(
         a.strpath, ["1.0", ".version"]
     ) == os.path.join(a.strpath, "1.0")
+
+
+def test_modulepath_discover_cached_directories(tmpdir):
+    a = tmpdir.mkdir("a")
+    a.join("1.0.py").write("")
+    b = tmpdir.mkdir("b")
+    b.join("1.0.py").write("")
+    os.symlink(b.join("1.0.py").strpath, os.path.join(b.strpath, "default"))
+    directories, modified = pymod.modulepath.discover.find_directories(tmpdir.strpath)
+    assert modified
+    assert sorted(directories.keys()) == ["", "a", "b"]
+
+    # Nothing changed, the cached entries are reused
+    cached, modified = pymod.modulepath.discover.find_directories(
+        tmpdir.strpath, cached=directories
+    )
+    assert not modified
+    assert all(cached[key] is directories[key] for key in directories)
+
+    # A new version is picked up, only the changed directory is rescanned
+    a.join("2.0.py").write("")
+    os.utime(a.strpath, (0, 0))
+    cached, modified = pymod.modulepath.discover.find_directories(
+        tmpdir.strpath, cached=directories
+    )
+    assert modified
+    assert cached["b"] is directories["b"]
+    assert len(cached["a"]["modules"]) == 2
+
+    modules = pymod.modulepath.discover.modules_from_directories(cached)
+    x = sorted([(m.name, m.version.string, m.marked_as_default) for m in modules])
+    assert x == [("a", "1.0", False), ("a", "2.0", False), ("b", "1.0", True)]
+
+    # A removed directory is dropped
+    b.remove()
+    cached, modified = pymod.modulepath.discover.find_directories(
+        tmpdir.strpath, cached=cached
+    )
+    assert modified
+    assert sorted(cached.keys()) == ["", "a"]
+
+
+def test_modulepath_discover_parallel(tmpdir):
+    for name in "abcdef":
+        d = tmpdir.mkdir(name)
+        for version in ("1.0", "2.0", "3.0"):
+            d.join(version + ".py").write("")
+        d.mkdir("x").join("1.0").write("#%Module1.0\n")
+    workers = pymod.config.get("discover_workers")
+    try:
+        pymod.config.set("discover_workers", 1)
+        serial = pymod.modulepath.discover.find_modules(tmpdir.strpath)
+        pymod.config.set("discover_workers", 4)
+        parallel = pymod.modulepath.discover.find_modules(tmpdir.strpath)
+    finally:
+        pymod.config.set("discover_workers", workers)
+    assert len(serial) == 6 * 4
+    assert [m.filename for m in serial] == [m.filename for m in parallel]
+
+
+def test_modulepath_discover_unreadable(tmpdir, monkeypatch):
+    for name in "abcd":
+        d = tmpdir.mkdir(name)
+        d.join("1.0.py").write("")
+    unreadable = tmpdir.join("c").strpath
+    listdir = os.listdir
+
+    def mock_listdir(dirname):
+        if dirname == unreadable:
+            raise OSError(13, "Permission denied", dirname)
+        return listdir(dirname)
+
+    monkeypatch.setattr(os, "listdir", mock_listdir)
+    workers = pymod.config.get("discover_workers")
+    try:
+        for n in (1, 4):
+            pymod.config.set("discover_workers", n)
+            modules = pymod.modulepath.discover.find_modules(tmpdir.strpath)
+            assert sorted([m.name for m in modules]) == ["a", "b", "d"]
+    finally:
+        pymod.config.set("discover_workers", workers)
@@ -274,6 +274,51 @@ def test_modulepath_prepend_path(dirtrees, mock_modulepath):
     assert a is None
 
 
+def test_modulepath_get_by_path_suffix(dirtrees, mock_modulepath):
+    d1 = dirtrees.join("1").strpath
+    d2 = dirtrees.join("2").strpath
+    mock_modulepath([d1, d2])
+
+    # Suffixes longer than the fullname select the MODULEPATH directory
+    module = pymod.modulepath.get("2/ucc/1.0.0")
+    assert module.filename == os.path.join(d2, "ucc/1.0.0.py")
+    module = pymod.modulepath.get("1/ucc/1.0.0")
+    assert module.filename == os.path.join(d1, "ucc/1.0.0.py")
+    assert pymod.modulepath.get("3/ucc/1.0.0") is None
+
+    # The indexes follow the modulepath
+    pymod.modulepath.prepend_path(d2)
+    module = pymod.modulepath.get("ucc/1.0.0")
+    assert module.filename == os.path.join(d2, "ucc/1.0.0.py")
+    pymod.modulepath.remove_path(d2)
+    assert pymod.modulepath.get("xxx/1.0.0") is None
+    assert pymod.modulepath.get("2/ucc/1.0.0") is None
+    module = pymod.modulepath.get("ucc/1.0.0")
+    assert module.filename == os.path.join(d1, "ucc/1.0.0.py")
+
+
+def test_modulepath_incremental_defaults(dirtrees, mock_modulepath):
+    d1 = dirtrees.join("1").strpath
+    d2 = dirtrees.join("2").strpath
+    mock_modulepath(d1)
+    mp = pymod.modulepath._path
+    py = mp.defaults["py"]
+    assert "xxx" not in mp.defaults
+
+    pymod.modulepath.prepend_path(d2)
+    assert mp.defaults["py"] is py and mp.is_default(py)
+    assert mp.defaults["xxx"].fullname == "xxx/1.0.0"
+    assert mp.defaults["ucc"].fullname == "ucc/4.0.0"
+    ucc = pymod.modulepath.get("ucc")
+    assert ucc.is_default
+
+    pymod.modulepath.remove_path(d2)
+    assert "xxx" not in mp.defaults
+    assert mp.defaults["ucc"].fullname == "ucc/2.0.0"
+    assert mp.is_default(mp.defaults["ucc"])
+    assert pymod.modulepath.get("ucc").is_default
+
+
 def test_modulepath_auto_bump(dirtrees, mock_modulepath):
 
     d1 = dirtrees.join("1").strpath
@@ -345,3 +390,56 @@ def test_modulepath_no_value(tmpdir, mock_modulepath):
     env = pymod.environ.copy()
     if is_in:
         assert env[pymod.names.modulepath] is None
+
+
+def test_modulepath_promote(dirtrees, mock_modulepath):
+    d1 = dirtrees.join("1").strpath
+    mock_modulepath(d1)
+    mp = pymod.modulepath._path
+    entry = mp.defaults["py"]
+    assert isinstance(entry, pymod.module.ModuleEntry)
+    with pytest.raises(AttributeError):
+        entry.name = "spam"
+    module = pymod.modulepath.get("py")
+    assert isinstance(module, pymod.module.PyModule)
+    assert module.filename == entry.filename
+    assert module.is_default and module.marked_as_default
+    # The promoted module is reused
+    assert pymod.modulepath.get("py/2.0.0") is module
+    # Versions are shared between entries
+    entries = mp.modules_by_fullname["ucc/2.0.0"] + mp.modules_by_fullname["py/2.0.0"]
+    assert entries[0][2].version is entries[1][2].version
+
+
+def test_modulepath_promote_nested(tmpdir, mock_modulepath):
+    tmpdir.mkdir("a").join("1.0.py").write("")
+    outer, inner = tmpdir.strpath, tmpdir.join("a").strpath
+    mp = mock_modulepath([outer, inner])
+    # The file is a different module on each MODULEPATH directory
+    inner_module = mp.get("1.0")
+    assert inner_module.fullname == "1.0" and inner_module.modulepath == inner
+    module = mp.get("a/1.0")
+    assert module.fullname == "a/1.0" and module.modulepath == outer
+    assert mp.get("1.0") is inner_module
+
+
+def test_modulepath_getby_filename_nested(tmpdir, mock_modulepath):
+    tmpdir.mkdir("a").join("1.0.py").write("")
+    outer, inner = tmpdir.strpath, tmpdir.join("a").strpath
+    filename = tmpdir.join("a", "1.0.py").strpath
+    mp = mock_modulepath([outer, inner])
+    # The module on the first MODULEPATH directory providing the file
+    assert mp.get(filename).fullname == "a/1.0"
+    mp.remove_path(outer)
+    assert mp.get(filename).fullname == "1.0"
+    mp.append_path(outer)
+    mp.remove_path(inner)
+    assert mp.get(filename).fullname == "a/1.0"
+
+
+def test_modulepath_entry_unicode():
+    modulepath = u"/opt/modulefiles"
+    filename = os.path.join(modulepath, u"caf\xe9", u"1.0.py")
+    entry = pymod.module.ModuleEntry("PyModule", filename, modulepath)
+    assert entry.name == u"caf\xe9"
+    assert entry.fullname == os.path.join(u"caf\xe9", u"1.0")
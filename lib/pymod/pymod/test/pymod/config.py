@@ -2,6 +2,7 @@ import os
 import pytest
 import pymod.names
 import pymod.paths
+import pymod.config
 
 from pymod.config import Configuration, load_config
 
@@ -59,3 +60,36 @@ def test_config_user_bad_var_type(mock_test_config):
     d["default_shell"] = True
     with pytest.raises(ValueError):
         cfg.push_scope("user", d)
+
+
+def test_config_snapshot(tmpdir, monkeypatch):
+    etc = tmpdir.mkdir("etc")
+    etc.mkdir("defaults").join("config.yaml").write(
+        "config:\n  debug: false\n  editor: vi\n  load_after_purge: []\n"
+    )
+    user = tmpdir.mkdir("user")
+    user.join("config.yaml").write("config:\n  editor: emacs\n")
+    monkeypatch.setattr(pymod.paths, "etc_path", etc.strpath)
+    monkeypatch.setattr(pymod.paths, "user_config_path", user.strpath)
+    monkeypatch.setattr(pymod.paths, "user_cache_path", tmpdir.mkdir("cache").strpath)
+
+    cfg = pymod.config.factory()
+    assert cfg.get("editor") == "emacs"
+    assert cfg.get("editor", scope="defaults") == "vi"
+    assert os.path.isfile(
+        pymod.paths.join_user(pymod.config.snapshot_basename, cache=True)
+    )
+
+    # The config files are not read again while they are unchanged
+    def no_load(filename):
+        assert False, "config file should not be read"
+
+    monkeypatch.setattr(pymod.config, "load_config", no_load)
+    cfg = pymod.config.factory()
+    assert cfg.get("editor") == "emacs"
+    assert cfg.get("load_after_purge") == []
+
+    monkeypatch.setattr(pymod.config, "load_config", load_config)
+    user.join("config.yaml").write("config:\n  editor: nano\n")
+    cfg = pymod.config.factory()
+    assert cfg.get("editor") == "nano"
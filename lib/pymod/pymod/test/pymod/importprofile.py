@@ -0,0 +1,25 @@
+import sys
+
+import pymod.util.importprofile as importprofile
+
+
+def test_importprofile(tmpdir, monkeypatch):
+    tmpdir.join("spam.py").write("import eggs\n")
+    tmpdir.join("eggs.py").write("x = 1\n")
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    monkeypatch.setattr(importprofile, "records", [])
+    importprofile.start(report_on_exit=False)
+    try:
+        import spam
+    finally:
+        importprofile.stop()
+    sys.modules.pop("spam", None)
+    sys.modules.pop("eggs", None)
+
+    names = [(name, depth) for (name, depth, _, _) in importprofile.records]
+    assert names == [("spam", 0), ("eggs", 1)]
+    for (_, _, self_time, cumulative) in importprofile.records:
+        assert 0 <= self_time <= cumulative
+    report = importprofile.format_report()
+    assert report.split("\n")[1].endswith("| spam")
+    assert report.split("\n")[2].endswith("|   eggs")
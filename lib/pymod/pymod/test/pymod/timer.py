@@ -0,0 +1,41 @@
+import json
+import time
+
+import pymod.timer
+
+
+def test_timer(tmpdir):
+    @pymod.timer.timed("inner")
+    def inner():
+        time.sleep(0.001)
+
+    # Nothing is recorded until the timer is enabled
+    with pymod.timer.span("outer"):
+        inner()
+    assert pymod.timer.spans == []
+
+    pymod.timer.enable()
+    try:
+        with pymod.timer.span("outer", key="value"):
+            inner()
+            inner()
+        spans = list(pymod.timer.spans)
+        totals = pymod.timer.breakdown()
+        report = pymod.timer.format_breakdown()
+        filename = tmpdir.join("trace.json").strpath
+        pymod.timer.write_trace(filename)
+    finally:
+        pymod.timer.disable()
+        pymod.timer.reset()
+
+    assert [(s[0], s[4]) for s in spans] == [("inner", 1), ("inner", 1), ("outer", 0)]
+    outer, inner = totals["outer"], totals["inner"]
+    assert inner[2] == 2 and outer[2] == 1
+    assert abs(outer[1] - (outer[0] - inner[0])) < 1e-9
+    assert "outer" in report and "inner" in report
+
+    trace = json.load(open(filename))
+    events = trace["traceEvents"]
+    assert [e["name"] for e in events] == ["outer", "inner", "inner"]
+    assert events[0]["args"] == {"key": "value"}
+    assert all(e["ph"] == "X" for e in events)
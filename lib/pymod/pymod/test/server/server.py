@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import signal
+import pytest
+
+import pymod.mc
+import pymod.names
+import pymod.server
+
+
+pytestmark = pytest.mark.skipif(
+    not pymod.server.can_serve(), reason="Server requires Python 3.3 or newer"
+)
+
+
+@pytest.fixture()
+def server(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "s.sock")
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # Undo the no_dump fixture, the output is what is being tested
+            pymod.mc.dump = sys.modules["pymod.mc.dump"].dump
+            pymod.server.Server(filename).serve_forever()
+        finally:
+            os._exit(0)
+    for i in range(100):
+        if os.path.exists(filename):
+            break
+        time.sleep(0.05)
+    yield filename
+    if pymod.server.is_running(filename):
+        pymod.server.stop(filename)
+    os.waitpid(pid, 0)
+
+
+def run(server, argv, env):
+    r, w = os.pipe()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        returncode = pymod.server.request(
+            argv, env=env, fds=(devnull, w, devnull), filename=server
+        )
+    finally:
+        os.close(w)
+        os.close(devnull)
+    with os.fdopen(r) as fh:
+        return returncode, fh.read()
+
+
+def test_server_request(tmpdir, server):
+    modules = tmpdir.mkdir("modules")
+    modules.join("a.py").write("setenv('SERVER_A', 'a')\n")
+    env = dict(os.environ)
+    env[pymod.names.modulepath] = modules.strpath
+    assert pymod.server.is_running(server)
+    returncode, output = run(server, ["load", "a"], env)
+    assert returncode == 0
+    assert 'SERVER_A="a"' in output
+
+    # New modules are picked up on the next request
+    time.sleep(0.01)
+    modules.join("b.py").write("setenv('SERVER_B', 'b')\n")
+    os.utime(modules.strpath, None)
+    returncode, output = run(server, ["load", "b"], env)
+    assert returncode == 0
+    assert 'SERVER_B="b"' in output
+
+    returncode, output = run(server, ["load", "c"], env)
+    assert returncode != 0
+
+
+def test_server_refresh_subdirectory(tmpdir):
+    modules = tmpdir.mkdir("modules")
+    modules.mkdir("a").join("1.0.py").write("")
+    server = pymod.server.Server(tmpdir.join("s.sock").strpath)
+    server.refresh(modules.strpath)
+    modulepath = server.modulepath
+    server.refresh(modules.strpath)
+    assert server.modulepath is modulepath
+
+    # A module added to a discovered subdirectory is picked up
+    time.sleep(0.01)
+    modules.join("a", "2.0.py").write("")
+    os.utime(modules.join("a").strpath, None)
+    server.refresh(modules.strpath)
+    assert server.modulepath is not modulepath
+    assert server.modulepath.get("a/2.0") is not None
+
+
+def test_server_known_directories(tmpdir, mock_modulepath):
+    modules = tmpdir.mkdir("modules")
+    modules.join("a.py").write("")
+    modules.mkdir("b").join("1.0.py").write("")
+    other = tmpdir.mkdir("other")
+    other.mkdir("c").join("1.0.py").write("")
+    mock_modulepath(modules.strpath)
+    known = pymod.server.known_directories([modules.strpath, other.strpath])
+    assert sorted(known) == sorted(
+        [modules.strpath, modules.join("b").strpath, other.strpath]
+    )
+    assert known[modules.join("b").strpath] == os.stat(modules.join("b").strpath).st_mtime
+    # Directories that have not been discovered are not walked
+    assert known[other.strpath] is None
+
+
+def test_server_stop(server):
+    assert pymod.server.is_running(server)
+    pymod.server.stop(server)
+    assert not pymod.server.is_running(server)
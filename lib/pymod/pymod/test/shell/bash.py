@@ -2,6 +2,7 @@ import sys
 import pytest
 
 import pymod.shell
+import pymod.config
 from pymod.environ import Environ
 
 
@@ -65,6 +66,24 @@ def test_shell_bash_format_output(shell):
     assert sorted(s) == sorted(s_expected)
 
 
+def test_shell_bash_format_output_minimal(shell, monkeypatch):
+    monkeypatch.setenv("VAR_SAME", "SAME")
+    monkeypatch.setenv("VAR_SET", "OLD")
+    monkeypatch.delenv("VAR_NOT_SET", raising=False)
+    environ = Environ()
+    environ.update(
+        {"VAR_SAME": "SAME", "VAR_SET": "NEW", "VAR_NOT_SET": None, "VAR_NEW": "X"}
+    )
+    minimal = pymod.config.get("minimal_shell_output")
+    pymod.config.set("minimal_shell_output", True)
+    try:
+        s = pymod.shell.format_output(environ)
+    finally:
+        pymod.config.set("minimal_shell_output", minimal)
+    s = [_ for _ in s.split("\n") if _.split()]
+    assert sorted(s) == ['export VAR_NEW="X";', 'export VAR_SET="NEW";']
+
+
 def test_shell_bash_filter_env(shell):
     env = {"foo": "bar", "BASH_FUNC%%": "baz"}
     d = pymod.shell.filter_env(env)
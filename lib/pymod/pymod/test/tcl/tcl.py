@@ -1,3 +1,4 @@
+import os
 import pytest
 
 import pymod.names
@@ -7,7 +8,7 @@ import pymod.module
 import pymod.modulepath
 from pymod.module.tcl2py import tcl2py
 
-pytestmark = pytest.mark.skipif(not pymod.config.has_tclsh, reason="No tclsh")
+pytestmark = pytest.mark.skipif(not pymod.config.has_tclsh(), reason="No tclsh")
 
 py_content = '''\
 whatis("""adds `.' to your PATH environment variable """)
@@ -266,3 +267,167 @@ setenv BAZ SPAM"""
     assert pymod.environ.get("foo") == "BAR"
     assert pymod.environ.get("BAZ") is None
     assert m.is_loaded
+
+
+native_content = r"""#%Module1.0
+proc helper {a {b 2}} {
+    global env
+    if {[info exists env(FOO)]} { return $env(FOO)$a }
+    return [expr {$a + $b}]
+}
+if { [module-info mode load] } {
+    setenv MODE "loading [module-info name]"
+} elseif {[module-info mode] eq "unload"} {
+    setenv MODE unloading
+}
+foreach p {a b {c d}} { append-path LIST /opt/$p }
+prepend-path --delim=, CSV "x"
+setenv -r RESP val
+setenv HELPER [helper 1]
+if {[is-loaded b] && ![info exists env(NOPE)]} { setenv B_LOADED 1 }
+module load "a b" c
+module swap c d
+module use --append /some/path
+conflict e
+prereq f
+family compiler
+module-whatis "what" "is"
+puts stderr "message with \"quotes\""
+"""
+
+
+@pytest.mark.tcl
+def test_tcl_native(tmpdir, mock_modulepath, mock_config):
+    from pymod.module.tclinterp import translate
+
+    tmpdir.join("f").write(native_content)
+    mock_modulepath(tmpdir.strpath)
+    module = pymod.modulepath.get("f")
+    pymod.environ.set("FOO", "BAR")
+    env = pymod.environ.filtered(include_os=True)
+    assert translate(module.filename, "load", "f", "f", [], env)
+    for mode in (pymod.modes.load, pymod.modes.unload, pymod.modes.show):
+        native = tcl2py(module, mode)
+        mock_config.set("native_tcl", False)
+        try:
+            assert native == tcl2py(module, mode)
+        finally:
+            mock_config.set("native_tcl", True)
+
+
+@pytest.mark.tcl
+def test_tcl_native_unsetenv(tmpdir, mock_modulepath, mock_config):
+    from pymod.module.tclinterp import translate, TclUnsupportedError
+
+    tmpdir.join("f").write(
+        "#%Module1.0\n"
+        "unsetenv MYV\n"
+        "if {[info exists env(MYV)]} { setenv A yes } else { setenv A no }\n"
+    )
+    mock_modulepath(tmpdir.strpath)
+    module = pymod.modulepath.get("f")
+    pymod.environ.set("MYV", "1")
+    env = pymod.environ.filtered(include_os=True)
+    with pytest.raises(TclUnsupportedError):
+        translate(module.filename, "load", "f", "f", [], env)
+    for mode in (pymod.modes.load, pymod.modes.unload):
+        native = tcl2py(module, mode)
+        mock_config.set("native_tcl", False)
+        try:
+            assert native == tcl2py(module, mode)
+        finally:
+            mock_config.set("native_tcl", True)
+
+@pytest.mark.tcl
+def test_tcl_native_fallback(tmpdir, mock_modulepath):
+    from pymod.module.tclinterp import translate, TclUnsupportedError
+
+    tmpdir.join("f").write("#%Module1.0\nsetenv foo [exec echo BAR]\n")
+    mock_modulepath(tmpdir.strpath)
+    module = pymod.modulepath.get("f")
+    with pytest.raises(TclUnsupportedError):
+        translate(module.filename, "load", module.fullname, module.name, [], {})
+    assert tcl2py(module, pymod.modes.load) == 'setenv("foo","BAR")\n'
+
+
+@pytest.mark.tcl
+def test_tcl_translation_cache(tmpdir, mock_modulepath, monkeypatch):
+    import pymod.module.tcl2py as t
+
+    # `string map` is not translated natively, so tclsh translates the module
+    tmpdir.join("f").write(
+        "#%Module1.0\nsetenv foo [string map {a b} $env(FOO)]\n"
+    )
+    tmpdir.join("g").write("#%Module1.0\nsetenv foo [exec echo BAR]\n")
+    mock_modulepath(tmpdir.strpath)
+    f = pymod.modulepath.get("f")
+    g = pymod.modulepath.get("g")
+    env = {"FOO": "aaa"}
+    assert t.translation_key(g, "load", [], env) is None
+    key = t.translation_key(f, "load", [], env)
+    assert key is not None
+    assert key != t.translation_key(f, "unload", [], env)
+    assert key != t.translation_key(f, "load", [], {"FOO": "bbb"})
+    assert key == t.translation_key(f, "load", ["x"], dict(env, BAR="baz"))
+    # f reads the environment, so its translation is not replayed
+    assert t.replay_key(f) is None
+    # The modulefile is scanned once per modification
+    assert t.scan(f.filename) is t.scan(f.filename)
+
+    pymod.environ.set("FOO", "aaa")
+    assert tcl2py(f, pymod.modes.load) == 'setenv("foo","bbb")\n'
+
+    def no_tclsh(*args):
+        assert False, "tclsh should not be run"
+
+    monkeypatch.setattr(t, "tclsh_tcl2py", no_tclsh)
+    assert tcl2py(f, pymod.modes.load) == 'setenv("foo","bbb")\n'
+
+
+def test_tcl_prune_translations(tmpdir, mock_config):
+    import pymod.module.tcl2py as t
+
+    tmpdir.join("old").write("")
+    tmpdir.join("new").write("")
+    os.utime(tmpdir.join("old").strpath, (0, 0))
+    mock_config.set("tcl_translation_cache_days", 0)
+    try:
+        t.prune_translations(tmpdir.strpath)
+        assert sorted(os.listdir(tmpdir.strpath)) == ["new", "old"]
+    finally:
+        mock_config.set("tcl_translation_cache_days", 30)
+    t.prune_translations(tmpdir.strpath)
+    assert os.listdir(tmpdir.strpath) == ["new"]
+@pytest.mark.tcl
+def test_tcl_tclsh_worker(tmpdir, mock_modulepath, mock_config):
+    import pymod.module.tclworker as w
+
+    # `string map` is not translated natively, so tclsh translates the modules
+    for name in "abc":
+        tmpdir.join(name).write(
+            "#%Module1.0\nsetenv {0} [string map {{a b}} $env(FOO)]\n".format(name)
+        )
+    mock_modulepath(tmpdir.strpath)
+    pymod.environ.set("FOO", "aaa")
+    mock_config.set("tcl_translation_cache", False)
+    try:
+        pids = []
+        for name in "abc":
+            module = pymod.modulepath.get(name)
+            output = tcl2py(module, pymod.modes.load)
+            assert output == 'setenv("{0}","bbb")\n'.format(name)
+            pids.append(w.worker.proc.pid)
+        assert len(set(pids)) == 1
+
+        # A stopped worker is restarted
+        w.worker.proc.kill()
+        w.worker.proc.wait()
+        assert tcl2py(module, pymod.modes.load) == 'setenv("c","bbb")\n'
+        assert w.worker.proc.pid != pids[0]
+
+        # Errors are reported by tcl2py.tcl
+        with pytest.raises(w.TclshWorkerError):
+            w.translate(["-x", module.filename], {})
+    finally:
+        mock_config.set("tcl_translation_cache", True)
+        w.stop()
@@ -0,0 +1,25 @@
+import os
+from pymod.util.filesystem import write_atomic
+
+
+def test_util_filesystem_write_atomic(tmpdir):
+    filename = tmpdir.join("a", "b", "text").strpath
+    assert write_atomic(filename, "text")
+    with open(filename) as fh:
+        assert fh.read() == "text"
+    filename = tmpdir.join("a", "bytes").strpath
+    assert write_atomic(filename, b"\0bytes")
+    with open(filename, "rb") as fh:
+        assert fh.read() == b"\0bytes"
+    assert sorted(os.listdir(tmpdir.join("a").strpath)) == ["b", "bytes"]
+
+
+def test_util_filesystem_write_atomic_fails(tmpdir):
+    # The directory cannot be created: a file is in the way
+    tmpdir.join("a").write("")
+    filename = tmpdir.join("a", "text").strpath
+    assert not write_atomic(filename, "text")
+    # A directory is in the way of the rename
+    tmpdir.mkdir("b")
+    assert not write_atomic(tmpdir.join("b").strpath, "text")
+    assert sorted(os.listdir(tmpdir.strpath)) == ["a", "b"]
@@ -0,0 +1,169 @@
+"""Spans timing the phases of a Modulecmd.py command.
+
+Code on the hot path marks its phases with ``span``::
+
+    with pymod.timer.span("tcl2py", module=module.fullname):
+        ...
+
+or, for a whole function, with the ``timed`` decorator.  Spans are only
+recorded after ``enable`` is called by ``--time`` or ``--trace``; otherwise
+``span`` returns a shared object that does nothing.  ``format_breakdown``
+summarizes the recorded spans by name (``--time``) and ``write_trace`` writes
+them as a Chrome trace (``--trace``) that can be opened in chrome://tracing or
+https://ui.perfetto.dev.
+"""
+import os
+import time
+import functools
+
+
+#: Whether spans are recorded
+enabled = False
+
+#: Recorded spans, as [name, category, start, duration, depth, args]
+spans = []
+
+_depth = 0
+_origin = None
+
+
+class Span(object):
+    __slots__ = ("record",)
+
+    def __init__(self, name, category, args):
+        self.record = [name, category, None, None, None, args]
+
+    def __enter__(self):
+        global _depth
+        self.record[4] = _depth
+        _depth += 1
+        self.record[2] = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        global _depth
+        self.record[3] = time.time() - self.record[2]
+        _depth -= 1
+        spans.append(self.record)
+        return False
+
+
+class NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = NullSpan()
+
+
+def span(name, category="pymod", **args):
+    """Time the enclosed block as the span `name`.  Keyword arguments are
+    shown with the span in the trace"""
+    if not enabled:
+        return _null_span
+    return Span(name, category, args)
+
+
+def timed(name, category="pymod"):
+    """Decorator timing each call of the function as the span `name`"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Span(name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable():
+    global enabled, _origin
+    enabled = True
+    if _origin is None:
+        _origin = time.time()
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    global _depth, _origin
+    del spans[:]
+    _depth = 0
+    _origin = time.time() if enabled else None
+
+
+def breakdown():
+    """Total and self time, and number of calls, of each span name.  The self
+    time of a span excludes the time of the spans it encloses."""
+    totals = {}
+    # Spans are recorded as they end, so the spans enclosed by a span are
+    # recorded before it
+    children = [0.0]
+    for (name, category, start, duration, depth, args) in spans:
+        while len(children) <= depth + 1:
+            children.append(0.0)
+        child_time = children[depth + 1]
+        children[depth + 1] = 0.0
+        children[depth] += duration
+        total = totals.setdefault(name, [0.0, 0.0, 0])
+        total[0] += duration
+        total[1] += duration - child_time
+        total[2] += 1
+    return totals
+
+
+def format_breakdown():
+    totals = breakdown()
+    wall = sum([s[3] for s in spans if s[4] == 0])
+    lines = [
+        "{0:<28} {1:>10} {2:>10} {3:>7}".format("phase", "total", "self", "calls")
+    ]
+    items = sorted(totals.items(), key=lambda x: x[1][0], reverse=True)
+    for (name, (total, self_time, calls)) in items:
+        lines.append(
+            "{0:<28} {1:>8.2f}ms {2:>8.2f}ms {3:>7}".format(
+                name, total * 1e3, self_time * 1e3, calls
+            )
+        )
+    lines.append("{0:<28} {1:>8.2f}ms".format("total", wall * 1e3))
+    return "\n".join(lines) + "\n"
+
+
+def trace_events():
+    pid = os.getpid()
+    events = []
+    for (name, category, start, duration, depth, args) in spans:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - _origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": pid,
+            "tid": 0,
+        }
+        if args:
+            event["args"] = dict((k, str(v)) for (k, v) in args.items())
+        events.append(event)
+    events.sort(key=lambda e: e["ts"])
+    return events
+
+
+def write_trace(filename):
+    """Write the recorded spans to `filename` in the Chrome trace format"""
+    import json
+
+    with open(filename, "w") as fh:
+        json.dump({"traceEvents": trace_events(), "displayTimeUnit": "ms"}, fh)
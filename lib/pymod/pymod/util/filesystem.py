@@ -0,0 +1,40 @@
+import os
+
+import llnl.util.tty as tty
+
+
+def write_atomic(filename, contents):
+    """Write `contents` to `filename`, creating its directory if needed.
+
+    The file is written under a temporary name and renamed, so that readers
+    (possibly other ``module`` commands) never see a partially written file.
+    Failures are reported with ``tty.debug``: the files written this way are
+    caches that are rebuilt when missing.
+
+    Returns
+    -------
+    written : bool
+        Whether `filename` was written
+
+    """
+    tmp = "{0}.{1}".format(filename, os.getpid())
+    try:
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Created by another process since
+                if not os.path.isdir(dirname):
+                    raise
+        try:
+            with open(tmp, "wb" if isinstance(contents, bytes) else "w") as fh:
+                fh.write(contents)
+            os.rename(tmp, filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    except (IOError, OSError) as e:
+        tty.debug("Failed to write {0}: {1}".format(filename, e))
+        return False
+    return True
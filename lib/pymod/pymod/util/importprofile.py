@@ -0,0 +1,95 @@
+"""Report the time spent importing each module.
+
+``bin/modulecmd.py`` calls ``start`` before importing ``pymod.main`` when
+``--import-profile`` is on the command line, so that the report covers every
+module imported by the command.  The report is written to stderr when
+``modulecmd.py`` exits, in the format of ``python -X importtime``: the time
+spent importing each module by itself and with the modules it imports, in
+microseconds.
+"""
+import sys
+import time
+import atexit
+
+try:
+    import builtins
+except ImportError:  # pragma: no cover
+    import __builtin__ as builtins
+
+
+#: (name, depth, self time, cumulative time) of each module, in import order
+records = []
+
+_import = None
+_stack = []
+
+
+def absolute_name(name, globals, level):
+    if level == 0 or not globals:
+        return name
+    package = globals.get("__package__")
+    if not package:
+        package = globals.get("__name__", "")
+        if "__path__" not in globals:
+            package = package.rpartition(".")[0]
+    if level > 1:
+        package = package.rsplit(".", level - 1)[0]
+    return "{0}.{1}".format(package, name) if name else package
+
+
+def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    fullname = absolute_name(name, globals, level)
+    if fullname in sys.modules:
+        return _import(name, globals, locals, fromlist, level)
+    record = [fullname, len(_stack), 0.0, 0.0]
+    records.append(record)
+    _stack.append(record)
+    start = time.time()
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        _stack.pop()
+        record[2] += elapsed
+        record[3] = elapsed
+        if _stack:
+            _stack[-1][2] -= elapsed
+
+
+def start(report_on_exit=True):
+    global _import
+    if _import is not None:
+        return
+    _import = builtins.__import__
+    builtins.__import__ = timed_import
+    if report_on_exit:
+        atexit.register(report)
+
+
+def stop():
+    global _import
+    if _import is None:
+        return
+    builtins.__import__ = _import
+    _import = None
+
+
+def format_report():
+    lines = ["import time: self [us] | cumulative | imported package"]
+    total = 0
+    for (name, depth, self_time, cumulative) in records:
+        self_us, cumulative_us = int(self_time * 1e6), int(cumulative * 1e6)
+        lines.append(
+            "import time: {0:>9} | {1:>10} | {2}{3}".format(
+                self_us, cumulative_us, "  " * depth, name
+            )
+        )
+        if depth == 0:
+            total += cumulative_us
+    lines.append("import time: {0:>9} | {1:>10} | total".format("", total))
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    stop()
+    sys.stderr.write(format_report())
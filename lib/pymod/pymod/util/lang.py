@@ -3,9 +3,7 @@ import re
 import sys
 import getpass
 import textwrap
-import subprocess
 from llnl.util.tty import terminal_size
-from spack.util.executable import Executable
 
 __all__ = [
     "split",
@@ -77,6 +75,8 @@ def strip_quotes(item):
 
 def check_output(command, shell=True):
     """Implementation of subprocess's check_output"""
+    import subprocess
+
     with open(os.devnull, "a") as fh:
         p = subprocess.Popen(command, shell=shell, stdout=subprocess.PIPE, stderr=fh)
         out, err = p.communicate()
@@ -117,6 +117,8 @@ def textfill(string, width=None, indent=None, **kwds):
 
 
 def get_system_manpath():
+    from spack.util.executable import Executable
+
     for x in ("/usr/bin/manpath", "/bin/manpath"):
         if os.path.isfile(x):
             manpath = Executable(x)
@@ -15,10 +15,12 @@ DIR="$( cd -P "$( dirname "$SOURCE" )"/.. >/dev/null && cd .. && pwd )"
 PYMOD_DIR="${DIR}"
 PYMOD_PKG_DIR="${PYMOD_DIR}"/lib/pymod/pymod
 PYMOD_CMD="${PYMOD_DIR}"/bin/modulecmd.py
+PYMOD_CLIENT="${PYMOD_DIR}"/bin/modulecmd-client.py
 PYMOD_SESSION_ID=$$
 MODULESHOME="${DIR}"
 export PYMOD_PKG_DIR
 export PYMOD_CMD
+export PYMOD_CLIENT
 export PYMOD_DIR
 export PYMOD_SESSION_ID
 export MODULESHOME
@@ -28,10 +30,21 @@ export MODULESHOME
 #  to generate text:
 #      export PATH="..."
 #  then the "eval" converts the text into changes in the current shell.
+#
+#  If PYMOD_USE_SERVER is set, the command is sent to the persistent
+#  modulecmd server (started with "module server start"), falling back to
+#  running modulecmd.py directly if the server is not running.
+if [ -n "${PYMOD_USE_SERVER:-}" ]; then
+module()
+{
+  eval $(python -E -S $PYMOD_CLIENT bash "$@")
+}
+else
 module()
 {
   eval $(python -E $PYMOD_CMD bash "$@")
 }
+fi
 
 PYMOD_VERSION="3.0.5"
 export PYMOD_VERSION